@@ -1,15 +1,35 @@
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks
-from fastapi.responses import StreamingResponse
-from typing import List
+from src.startup import startup
+from fastapi import FastAPI, UploadFile, File, Request, Response, HTTPException, Query
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from typing import List, Optional
 from pathlib import Path
-import shutil
+import asyncio
+import hashlib
+import json
+import os
 from contextlib import asynccontextmanager
 
-from src.chroma_handler import check_if_already_embedded, embed_document
+from src.chroma_handler import chroma, check_if_already_embedded
+from src.job_queue import job_queue, PRIORITY_UPLOAD, PRIORITY_ADMIN, PRIORITY_STARTUP
+from src.leader import leader_lock
+from src.retrieval import load_index, watch_collection
+from src.uploads import store_upload, UploadTooLargeError, UploadLimitMiddleware
+from src.batch_qa import parse_batch, answer_batch, BatchInputError
+from src.hybrid_index import hybrid_index
+from src.llm_limiter import llm_limiter, LLMOverloadedError
+from src.semantic_cache import semantic_cache
+from src.embeddings import embedding_service
+from src.reranker import reranker
 from src.chatbot import (
     ask_with_context,
     stream_response,
+    get_llm,
+    history,
+    context_builder,
+    conversation_memory,
+    history_writer,
     get_chat_history,
+    get_chat_version,
     list_user_chats,
     delete_chat
 )
@@ -18,40 +38,135 @@ from src.schemas import (
     SchemaFileUploadStatus,
     SchemaAskRequest,
     SchemaAskResponse,
-    SchemaChatMessage
+    SchemaChatHistoryPage,
+    SchemaChatList,
+    SchemaStreamFormat,
+    SchemaJob
 )
-from src.config import PDF_INPUT_DIR
+from src.config import (
+    PDF_INPUT_DIR,
+    JOB_WORKER_EMBEDDED,
+    JOB_WORKER_CONCURRENCY,
+    BATCH_CONCURRENCY,
+    MAX_UPLOAD_REQUEST_BYTES,
+    METRICS_DIR,
+    METRICS_PUBLISH_SECS,
+    WEB_WORKERS
+)
+from src.logging_config import configure_logging, get_logger
+from src.metrics import registry
+from src.request_context import RequestContextMiddleware
+
+configure_logging()
+logger = get_logger("app")
+startup.mark("imports", "ready", seconds=startup.elapsed())
+
+async def lead(stop: asyncio.Event):
+    """Once-per-deployment startup work, done by whichever web process wins the leader lock.
+
+    Followers keep waiting, so one of them takes over if the leader exits.
+    """
+    await leader_lock.wait()
+    # serve traffic right away; the worker process scans and embeds PDFs
+    logger.info("Queueing a scan for unembedded PDFs")
+    await asyncio.to_thread(
+        job_queue.enqueue,
+        "scan_directory",
+        {"directory": str(PDF_INPUT_DIR)},
+        PRIORITY_STARTUP,
+        "scan_directory"
+    )
+    if JOB_WORKER_EMBEDDED:
+        # single-container setups run the job loop in the leading web process;
+        # the ingestion pipeline is only imported here, and docling only in its pool
+        from src.job_worker import JobWorker
+        await JobWorker(job_queue, JOB_WORKER_CONCURRENCY).run(stop)
+
+async def warm_up():
+    """Load what the chat path can do without, after the app already serves requests."""
+    async def reranker_step():
+        if not reranker.enabled:
+            startup.mark("reranker", "disabled")
+            return
+        async with startup.step("reranker"):
+            await reranker.load()
+        if not reranker.enabled:
+            startup.mark("reranker", "disabled")
+
+    async def embeddings_step():
+        async with startup.step("embeddings"):
+            await embedding_service.load()
+
+    async def index_step():
+        async with startup.step("hybrid_index"):
+            await load_index()
+
+    async def llm_step():
+        async with startup.step("llm"):
+            await asyncio.to_thread(get_llm)
+
+    await asyncio.gather(embeddings_step(), index_step(), llm_step(), reranker_step())
+    startup.log_report()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("🔄 Checking for unembedded PDFs on startup...")
-    for file in PDF_INPUT_DIR.glob("*.pdf"):
-        print(f"🔍 Scanning file: {file.name}")
-        doc_hash = await check_if_already_embedded(file)
-        if doc_hash:
-            print(f"📥 Embedding {file.name}...")
-            await embed_document(file, doc_hash)
-        else:
-            print(f"✅ Already embedded: {file.name}")
+    for name in ("embeddings", "hybrid_index", "llm", "reranker"):
+        startup.register(name)
+    # the only thing chat cannot do without
+    async with startup.step("chroma", required=True):
+        await chroma.connect()
+    warming = asyncio.create_task(warm_up())
+    watcher = asyncio.create_task(watch_collection())
+    stop_worker = asyncio.Event()
+    leader = asyncio.create_task(lead(stop_worker))
+    publisher = asyncio.create_task(registry.publish(METRICS_DIR, METRICS_PUBLISH_SECS)) if WEB_WORKERS > 1 else None
+    startup.serving()
     yield
-    print("🛑 App is shutting down.")
+    warming.cancel()
+    stop_worker.set()
+    if leader_lock.is_leader:
+        # lets an embedded job worker finish its running jobs
+        await leader
+    else:
+        leader.cancel()
+    leader_lock.release()
+    watcher.cancel()
+    # queued turns first: storing them schedules summary updates
+    await history_writer.shutdown()
+    await conversation_memory.shutdown()
+    await chroma.close()
+    history.close()
+    if publisher is not None:
+        publisher.cancel()
+        # counts of the last few seconds stay in the totals
+        await asyncio.to_thread(registry.write_snapshot, METRICS_DIR)
+    logger.info("App is shutting down")
 
 app = FastAPI(lifespan=lifespan)
+# added first so it runs inside the request logging and its 413s are logged
+app.add_middleware(UploadLimitMiddleware, paths={"/api/upload"}, max_bytes=MAX_UPLOAD_REQUEST_BYTES)
+app.add_middleware(RequestContextMiddleware)
+
+
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloadedError):
+    logger.warning("Rejected request, LLM overloaded", extra={"path": request.url.path, "reason": str(exc)})
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 
 @app.post("/api/upload", response_model=SchemaUploadResponse)
-async def upload_pdfs(
-    files: List[UploadFile] = File(...),
-    background_tasks: BackgroundTasks = None
-):
-    print("📤 Upload endpoint hit with", len(files), "file(s)")
+async def upload_pdfs(files: List[UploadFile] = File(...)):
+    logger.info("Upload received", extra={"files": len(files)})
     responses: List[SchemaFileUploadStatus] = []
 
     for file in files:
-        print(f"📂 Processing upload: {file.filename}")
 
         if not file.filename.endswith(".pdf"):
-            print(f"❌ Skipped {file.filename} (invalid type)")
+            logger.info("Skipped upload with invalid type", extra={"upload": file.filename})
             responses.append(SchemaFileUploadStatus(
                 filename=file.filename,
                 status="skipped",
@@ -59,69 +174,275 @@ async def upload_pdfs(
             ))
             continue
 
-        file_path = PDF_INPUT_DIR / file.filename
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        print(f"✅ Saved {file.filename} to {file_path}")
+        try:
+            stored = await store_upload(file, PDF_INPUT_DIR)
+        except UploadTooLargeError as e:
+            logger.info("Rejected oversized upload", extra={"upload": file.filename, "max_bytes": e.max_bytes})
+            responses.append(SchemaFileUploadStatus(
+                filename=file.filename,
+                status="rejected",
+                message=str(e)
+            ))
+            continue
 
-        doc_hash = await check_if_already_embedded(file_path)
+        file_path = stored["path"]
+        if stored["embedded_as"] is not None:
+            logger.info("Skipped upload, already embedded", extra={"upload": file.filename, "embedded_as": stored["embedded_as"]})
+            responses.append(SchemaFileUploadStatus(
+                filename=file.filename,
+                status="skipped",
+                message=f"File already embedded as {stored['embedded_as']} based on content hash.",
+                stored_as=stored["embedded_as"]
+            ))
+            continue
+        logger.info("Saved upload", extra={
+            "upload": file.filename,
+            "path": str(file_path),
+            "source_file": stored["source_file"],
+            "bytes": stored["size"],
+            "already_stored": stored["already_stored"],
+            "superseded": stored["superseded"],
+        })
+
+        doc_hash = await check_if_already_embedded(file_path, stored["file_hash"])
         if doc_hash is None:
-            print(f"⚠️ Skipping {file.filename}, already embedded")
+            logger.info("Skipped upload, already embedded", extra={"upload": file.filename})
             responses.append(SchemaFileUploadStatus(
                 filename=file.filename,
                 status="skipped",
-                message="File already embedded based on content hash."
+                message="File already embedded based on content hash.",
+                stored_as=file_path.name
             ))
         else:
-            print(f"🚀 Starting embedding for {file.filename}")
-            background_tasks.add_task(embed_document, file_path, doc_hash)
+            job = await asyncio.to_thread(
+                job_queue.enqueue,
+                "ingest",
+                {"path": str(file_path), "file_hash": doc_hash},
+                PRIORITY_UPLOAD,
+                f"ingest:{file_path.name}"
+            )
+            logger.info("Queued upload for embedding", extra={"upload": file.filename, "job_id": job["id"]})
             responses.append(SchemaFileUploadStatus(
                 filename=file.filename,
-                status="started",
-                message="File is being processed and embedded in the background."
+                status="queued",
+                message="File is queued for processing and embedding.",
+                stored_as=file_path.name,
+                job_id=job["id"]
             ))
 
-    print("📤 Upload response:", responses)
     return SchemaUploadResponse(results=responses)
 
 
 @app.post("/api/chat", response_model=SchemaAskResponse)
 async def chat(request: SchemaAskRequest):
-    print(f"💬 Received chat message from user {request.user_id}, chat {request.chat_id}")
+    logger.info("Chat request", extra={"user_id": request.user_id, "chat_id": request.chat_id})
     result = await ask_with_context(
         user_id=request.user_id,
         chat_id=request.chat_id,
         question=request.question
     )
-    print("🤖 Chatbot response generated.")
     return SchemaAskResponse(**result)
 
 
+STREAM_MEDIA_TYPES = {
+    "text": "text/plain",
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
 @app.post("/api/chat/stream")
-async def stream_chat(request: SchemaAskRequest):
-    print(f"🌊 Streaming chat for user {request.user_id}, chat {request.chat_id}")
+async def stream_chat(request: SchemaAskRequest, format: SchemaStreamFormat = "text"):
+    logger.info("Streaming chat request", extra={"user_id": request.user_id, "chat_id": request.chat_id, "format": format})
+    # reject before the 200 goes out; the generator itself queues for a slot
+    llm_limiter.check_capacity()
     stream = stream_response(
         user_id=request.user_id,
         chat_id=request.chat_id,
-        question=request.question
+        question=request.question,
+        stream_format=format
     )
-    return StreamingResponse(stream, media_type="text/plain")
+    return StreamingResponse(
+        stream,
+        media_type=STREAM_MEDIA_TYPES[format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/chat/batch")
+async def batch_chat(
+    file: UploadFile = File(...),
+    user_id: str = "batch",
+    concurrency: int = BATCH_CONCURRENCY,
+    save_history: bool = False
+):
+    """Answer a JSONL file of questions; results stream back as JSONL in completion order."""
+    try:
+        items = parse_batch((await file.read()).decode("utf-8").splitlines())
+    except (BatchInputError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    concurrency = max(1, min(concurrency, llm_limiter.max_concurrency))
+    logger.info("Batch chat request", extra={"user_id": user_id, "items": len(items), "concurrency": concurrency, "save_history": save_history})
+
+    async def results():
+        async for result in answer_batch(items, user_id, concurrency, save_history):
+            yield json.dumps(result) + "\n"
 
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
-@app.get("/api/history/{user_id}/{chat_id}", response_model=List[SchemaChatMessage])
-async def get_history(user_id: str, chat_id: str):
-    print(f"📜 Fetching history for user {user_id}, chat {chat_id}")
-    return get_chat_history(user_id, chat_id)
 
+def make_etag(*parts) -> str:
+    return 'W/"' + hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()[:24] + '"'
 
-@app.get("/api/user/{user_id}/chats", response_model=List[str])
-async def get_user_chats(user_id: str):
-    print(f"📁 Listing chats for user {user_id}")
-    return list_user_chats(user_id)
+
+def not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    return header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")]
+
+
+# clients may keep the body but must revalidate with If-None-Match
+HISTORY_CACHE_HEADERS = {"Cache-Control": "private, no-cache"}
+
+
+@app.get("/api/history/{user_id}/{chat_id}", response_model=SchemaChatHistoryPage)
+async def get_history(
+    user_id: str,
+    chat_id: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None
+):
+    # the chat's version changes on every write, so an unchanged chat is answered without reading it;
+    # its creation time keeps a chat recreated under a deleted chat's id from matching old ETags
+    version = await get_chat_version(user_id, chat_id)
+    etag = make_etag("history", user_id, chat_id, version, limit, cursor)
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, **HISTORY_CACHE_HEADERS})
+    try:
+        page = await get_chat_history(user_id, chat_id, limit, cursor) if version is not None else {"messages": []}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers.update({"ETag": etag, **HISTORY_CACHE_HEADERS})
+    return page
+
+
+@app.get("/api/user/{user_id}/chats", response_model=SchemaChatList)
+async def get_user_chats(
+    user_id: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None
+):
+    try:
+        page = await list_user_chats(user_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    etag = make_etag("chats", user_id, [(chat["chat_id"], chat["created_at"], chat["version"]) for chat in page["chats"]], page["next_cursor"])
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, **HISTORY_CACHE_HEADERS})
+    response.headers.update({"ETag": etag, **HISTORY_CACHE_HEADERS})
+    return page
 
 
 @app.delete("/api/history/{user_id}/{chat_id}")
 async def delete_chat_history(user_id: str, chat_id: str):
-    print(f"🗑️ Deleting chat history for user {user_id}, chat {chat_id}")
-    delete_chat(user_id, chat_id)
+    logger.info("Deleting chat history", extra={"user_id": user_id, "chat_id": chat_id})
+    await delete_chat(user_id, chat_id)
     return {"status": "deleted"}
+
+
+# the admin stats describe the web process that answered the request; /metrics has the totals
+@app.get("/api/admin/chroma/stats")
+async def chroma_stats():
+    return chroma.stats()
+
+
+@app.get("/api/admin/llm/stats")
+async def llm_stats():
+    return llm_limiter.stats()
+
+
+@app.get("/api/admin/cache/stats")
+async def cache_stats():
+    return semantic_cache.stats()
+
+
+@app.get("/api/jobs/{job_id}", response_model=SchemaJob)
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/api/jobs", response_model=List[SchemaJob])
+async def list_jobs(status: Optional[str] = None, limit: int = 50):
+    return await asyncio.to_thread(job_queue.list, status, min(limit, 500))
+
+
+@app.get("/api/ingestion/status")
+async def ingestion_status():
+    return {
+        "jobs": await asyncio.to_thread(job_queue.counts),
+        "collection_version": await asyncio.to_thread(job_queue.collection_version),
+    }
+
+
+@app.post("/api/admin/rebuild", response_model=SchemaJob)
+async def rebuild_collection():
+    logger.info("Rebuild from conversion cache requested")
+    return await asyncio.to_thread(job_queue.enqueue, "rebuild", {}, PRIORITY_ADMIN, "rebuild")
+
+
+@app.get("/api/admin/embeddings/stats")
+async def embeddings_stats():
+    return embedding_service.stats()
+
+
+@app.get("/api/admin/reranker/stats")
+async def reranker_stats():
+    return reranker.stats()
+
+
+@app.get("/api/admin/index/stats")
+async def index_stats():
+    return hybrid_index.stats()
+
+
+@app.get("/api/admin/history/stats")
+async def history_stats():
+    return history_writer.stats()
+
+
+@app.get("/api/admin/context/stats")
+async def context_stats():
+    return context_builder.stats()
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and its event loop responds."""
+    return {"status": "ok", "uptime": startup.elapsed()}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness of every subsystem; 503 until the required ones are up."""
+    report = startup.report()
+    report["subsystems"]["chroma"] = {**report["subsystems"].get("chroma", {}), "connected": chroma.stats()["connected"]}
+    ready = report["ready"] and report["subsystems"]["chroma"]["connected"]
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={**report, "ready": ready, "leader": leader_lock.is_leader, "pid": os.getpid()}
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # summed over all web processes, unlike the per-process /api/admin/*/stats
+    text = await asyncio.to_thread(registry.render_all, METRICS_DIR) if WEB_WORKERS > 1 else registry.render()
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
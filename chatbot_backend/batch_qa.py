@@ -0,0 +1,51 @@
+# Batch question answering from the command line:
+#   python batch_qa.py questions.jsonl -o results.jsonl --concurrency 4 [--save-history]
+# Each input line is {"question": ..., "id"?: ..., "chat_id"?: ...} or a bare JSON string.
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+from src.batch_qa import parse_batch, answer_batch
+from src.chatbot import history
+from src.chroma_handler import chroma
+from src.embeddings import embedding_service
+from src.config import BATCH_CONCURRENCY, BATCH_QUERY_SIZE
+from src.logging_config import configure_logging
+from src.retrieval import load_index
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions.")
+    parser.add_argument("input", type=Path, help="JSONL file of questions")
+    parser.add_argument("-o", "--output", type=Path, help="JSONL results file (default: stdout)")
+    parser.add_argument("--user-id", default="batch", help="user the chats are saved under")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="concurrent LLM calls")
+    parser.add_argument("--query-size", type=int, default=BATCH_QUERY_SIZE, help="questions per retrieval query")
+    parser.add_argument("--save-history", action="store_true", help="store every answer as a chat turn")
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace):
+    configure_logging()
+    with args.input.open(encoding="utf-8") as file:
+        items = parse_batch(file)
+
+    await embedding_service.load()
+    await chroma.connect()
+    await load_index()
+    output = args.output.open("w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        async for result in answer_batch(items, args.user_id, args.concurrency, args.save_history, args.query_size):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        await chroma.close()
+        history.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,50 @@
+# The backend app with benchmark stubs, for serving from several processes:
+#
+#   uvicorn benchmarks.bench_app:app --workers 4
+#
+# `python -m benchmarks.run scaling` starts it with the environment below set.
+# Every worker process installs its own stubs and seeds its own in-process
+# Chroma on startup; history and caches are shared through the files in the
+# benchmark workdir, as they would be in a multi-worker deployment.
+import argparse
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+# Each worker's Chroma is its own, so its manifests must be too: with shared
+# ones every worker after the first would find the documents up to date and
+# seed nothing. Set before app is imported, since config reads env at import.
+for name, default in (("MANIFEST_DIR", "./documents/manifests"), ("CHECKPOINT_DIR", "./documents/checkpoints")):
+    os.environ[name] = str(Path(os.getenv(name, default)) / f"worker-{os.getpid()}")
+
+from app import app
+from benchmarks.run import install_stubs, seed_collection
+
+
+def stub_args() -> argparse.Namespace:
+    return argparse.Namespace(
+        embedding=os.getenv("BENCH_EMBEDDING", "hash"),
+        ttft=float(os.getenv("BENCH_TTFT", "0.3")),
+        inter_token=float(os.getenv("BENCH_INTER_TOKEN", "0.002")),
+        tokens=int(os.getenv("BENCH_TOKENS", "256")),
+    )
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    from src.chatbot import history, history_writer
+
+    await install_stubs(stub_args())
+    await seed_collection()
+    yield
+    await history_writer.shutdown()
+    history.close()
+
+
+app.router.lifespan_context = lifespan
+
+
+@app.get("/bench/pid")
+async def pid():
+    # lets the benchmark wait until every worker process is serving
+    return {"pid": os.getpid()}
@@ -0,0 +1,467 @@
+# Offline benchmark suite for the chat, retrieval and ingestion paths.
+#
+#   cd chatbot_backend
+#   uv run python -m benchmarks.run all --users 16 --requests 5 --output bench.json
+#   uv run python -m benchmarks.run scaling --workers 1,2,4,6 --users 64 --ttft 0.05
+#
+# Chroma runs in-process, the LLM is a stub with Groq-like token timing, and
+# history / caches live in a throwaway directory, so nothing here needs the
+# docker stack or network access. Results are written as JSON for comparison.
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+QUESTIONS = [
+    "What does Article {n} of the Constitution say?",
+    "Who can become a citizen of Uganda by registration?",
+    "What are the functions of the Electoral Commission?",
+    "How is the President of Uganda elected?",
+    "What rights does an arrested person have?",
+    "How can the Constitution be amended?",
+    "What are the powers of Parliament?",
+    "Who appoints the Chief Justice?",
+    "What is the role of the Inspectorate of Government?",
+    "How is land ownership regulated?",
+    "What does the Constitution say about freedom of expression?",
+    "What is the term of office of a Member of Parliament?",
+]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the chatbot backend offline.")
+    parser.add_argument("suite", choices=["chat", "ingestion", "chunker", "scaling", "all"])
+    parser.add_argument("--users", type=int, default=8, help="concurrent chat users")
+    parser.add_argument("--requests", type=int, default=5, help="requests per user and endpoint")
+    parser.add_argument("--ttft", type=float, default=0.3, help="stub LLM time to first token (s)")
+    parser.add_argument("--inter-token", type=float, default=0.002, help="stub LLM delay between tokens (s)")
+    parser.add_argument("--tokens", type=int, default=256, help="stub LLM tokens per answer")
+    parser.add_argument("--cache", action="store_true", help="keep the semantic answer cache enabled")
+    parser.add_argument("--embedding", choices=["hash", "default"], default="hash",
+                        help="hash: offline hashing embedding; default: chroma's ONNX MiniLM")
+    parser.add_argument("--url", help="benchmark an already running backend instead of an in-process one")
+    parser.add_argument("--chunker-rounds", type=int, default=5)
+    parser.add_argument("--workers", default="1,2,4,6",
+                        help="comma-separated web worker counts for the scaling suite")
+    parser.add_argument("--workdir", help="directory for history db and caches (default: a temp dir)")
+    parser.add_argument("--output", help="write results JSON here instead of stdout")
+    return parser.parse_args()
+
+
+def configure_environment(args: argparse.Namespace) -> Path:
+    # must run before anything under src/ is imported, since config reads env at import
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="chatbot-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    os.environ.setdefault("HISTORY_DB_PATH", str(workdir / "chat_history.db"))
+    os.environ.setdefault("CHECKPOINT_DIR", str(workdir / "checkpoints"))
+    os.environ.setdefault("MANIFEST_DIR", str(workdir / "manifests"))
+    os.environ.setdefault("CONVERSION_CACHE_DIR", str(workdir / "conversion_cache"))
+    os.environ.setdefault("JOBS_DB_PATH", str(workdir / "jobs.db"))
+    os.environ.setdefault("LEADER_LOCK_PATH", str(workdir / "leader.lock"))
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "1" if args.cache else "0"
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+    return workdir
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def percentile(p: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+        return ordered[index]
+
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered) * 1000, 3),
+        "p50": round(percentile(50) * 1000, 3),
+        "p95": round(percentile(95) * 1000, 3),
+        "p99": round(percentile(99) * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def install_stubs(args: argparse.Namespace):
+    from benchmarks.stubs import AsyncEphemeralClient, HashEmbeddingFunction, StubGroqChat
+    from src import chatbot
+    from src.chroma_handler import chroma
+    from src.embeddings import embedding_service
+
+    embedding_function = None
+    if args.embedding == "hash":
+        embedding_function = HashEmbeddingFunction()
+        embedding_service.use(embedding_function, "benchmark-hash@1")
+    await embedding_service.load()
+    await chroma.attach(AsyncEphemeralClient(embedding_function))
+    chatbot.llm = StubGroqChat(ttft=args.ttft, inter_token=args.inter_token, tokens=args.tokens)
+
+
+async def seed_collection() -> int:
+    from src.chroma_handler import store_chunks
+    from src.chunking import split_structured_text
+    from src.config import TEXT_OUTPUT_DIR
+    from src.ingestion_state import clear_all
+    from src.retrieval import load_index
+
+    # the ephemeral collection starts empty, so manifests left in the workdir are stale
+    clear_all()
+    total = 0
+    for text_file in sorted(TEXT_OUTPUT_DIR.glob("*.txt")):
+        text = text_file.read_text(encoding="utf-8")
+        chunks = split_structured_text(text)
+        doc_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        await store_chunks(f"{text_file.stem}.pdf", doc_hash, chunks)
+        total += len(chunks)
+    await load_index()
+    return total
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def chat_user(client, endpoint: str, user: int, args: argparse.Namespace, results: dict):
+    import httpx
+
+    chat_id = None
+    for i in range(args.requests):
+        template = QUESTIONS[(user + i) % len(QUESTIONS)]
+        # make every question unique unless we want to exercise the semantic cache
+        question = template.format(n=1 + (user * 7 + i) % 288)
+        if not args.cache:
+            question = f"{question} (user {user}, turn {i})"
+        payload = {"user_id": f"bench-user-{user}", "chat_id": chat_id, "question": question}
+
+        start = time.perf_counter()
+        try:
+            if endpoint == "/api/chat":
+                response = await client.post(endpoint, json=payload)
+                if response.status_code != 200:
+                    results["status"][str(response.status_code)] = results["status"].get(str(response.status_code), 0) + 1
+                    continue
+                chat_id = response.json()["chat_id"]
+            else:
+                first_token = None
+                failed = False
+                async with client.stream("POST", endpoint, params={"format": "ndjson"}, json=payload) as response:
+                    if response.status_code != 200:
+                        results["status"][str(response.status_code)] = results["status"].get(str(response.status_code), 0) + 1
+                        continue
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        if event["type"] == "start":
+                            chat_id = event["chat_id"]
+                        elif event["type"] == "token" and first_token is None:
+                            first_token = time.perf_counter() - start
+                        elif event["type"] == "error":
+                            failed = True
+                if failed:
+                    results["errors"] += 1
+                    continue
+                if first_token is not None:
+                    results["ttft"].append(first_token)
+        except httpx.HTTPError:
+            results["errors"] += 1
+            continue
+        results["latency"].append(time.perf_counter() - start)
+        results["status"]["200"] = results["status"].get("200", 0) + 1
+
+
+async def run_chat_load(base_url: str, args: argparse.Namespace) -> dict:
+    import httpx
+
+    report = {}
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        for endpoint in ("/api/chat", "/api/chat/stream"):
+            results = {"latency": [], "ttft": [], "errors": 0, "status": {}}
+            started = time.perf_counter()
+            await asyncio.gather(*(chat_user(client, endpoint, user, args, results) for user in range(args.users)))
+            elapsed = time.perf_counter() - started
+            report[endpoint] = {
+                "wall_seconds": round(elapsed, 3),
+                "throughput_rps": round(len(results["latency"]) / elapsed, 3) if elapsed else None,
+                "errors": results["errors"],
+                "status_codes": results["status"],
+                "latency_ms": summarize(results["latency"]),
+            }
+            if endpoint == "/api/chat/stream":
+                report[endpoint]["ttft_ms"] = summarize(results["ttft"])
+    return report
+
+
+async def bench_retrieval(args: argparse.Namespace) -> dict:
+    from src.retrieval import retrieve
+
+    latencies = []
+
+    async def worker(user: int):
+        for i in range(args.requests):
+            question = QUESTIONS[(user + i) % len(QUESTIONS)].format(n=1 + (user * 7 + i) % 288)
+            start = time.perf_counter()
+            await retrieve(question, top_k=5)
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(user) for user in range(args.users)))
+    elapsed = time.perf_counter() - started
+    return {
+        "throughput_qps": round(len(latencies) / elapsed, 3) if elapsed else None,
+        "latency_ms": summarize(latencies),
+    }
+
+
+async def bench_chat(args: argparse.Namespace) -> dict:
+    report = {"users": args.users, "requests_per_user": args.requests}
+    if args.url:
+        report["target"] = args.url
+        report.update(await run_chat_load(args.url, args))
+        return report
+
+    import uvicorn
+    from app import app
+
+    await install_stubs(args)
+    report["seeded_chunks"] = await seed_collection()
+    report["llm_stub"] = {"ttft": args.ttft, "inter_token": args.inter_token, "tokens": args.tokens}
+    report["retrieval"] = await bench_retrieval(args)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        report.update(await run_chat_load(f"http://127.0.0.1:{port}", args))
+    finally:
+        server.should_exit = True
+        await serve_task
+    from src.chatbot import history_writer
+    from src.metrics import CHAT_STAGE_SECONDS
+
+    await history_writer.shutdown()
+    report["history_writer"] = history_writer.stats()
+    # stages overlap, so they add up to more than pre_llm_critical_path
+    report["stages_ms"] = {
+        stage: {"count": values["count"], "mean": round(values["mean"] * 1000, 3)}
+        for stage, values in sorted(CHAT_STAGE_SECONDS.means("stage").items())
+    }
+    return report
+
+
+async def wait_for_workers(base_url: str, workers: int, process: subprocess.Popen, timeout: float = 300) -> int:
+    """Wait until `workers` distinct processes have answered, or the server gave up."""
+    import httpx
+
+    seen = set()
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=5) as client:
+        while len(seen) < workers and time.monotonic() < deadline and process.poll() is None:
+            try:
+                # fresh connections, so the kernel can hand them to any worker
+                response = await client.get("/bench/pid", headers={"Connection": "close"})
+                seen.add(response.json()["pid"])
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    return len(seen)
+
+
+async def bench_scaling(args: argparse.Namespace) -> dict:
+    """Chat throughput of the stubbed app served by 1..N uvicorn worker processes."""
+    counts = [int(count) for count in args.workers.split(",")]
+    report = {"users": args.users, "requests_per_user": args.requests, "runs": {}}
+    env = {
+        **os.environ,
+        "BENCH_EMBEDDING": args.embedding,
+        "BENCH_TTFT": str(args.ttft),
+        "BENCH_INTER_TOKEN": str(args.inter_token),
+        "BENCH_TOKENS": str(args.tokens),
+        # measure the web processes, not the LLM limiter
+        "LLM_MAX_CONCURRENCY": str(args.users * max(counts)),
+        "LLM_MAX_QUEUE": str(args.users * max(counts)),
+    }
+    baseline = None
+    for workers in counts:
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "benchmarks.bench_app:app", "--host", "127.0.0.1",
+             "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+            env={**env, "WEB_WORKERS": str(workers)}
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            serving = await wait_for_workers(base_url, workers, process)
+            if serving < workers:
+                raise RuntimeError(f"only {serving} of {workers} workers came up")
+            run = await run_chat_load(base_url, args)
+        finally:
+            process.terminate()
+            process.wait(timeout=60)
+        throughput = run["/api/chat"]["throughput_rps"]
+        baseline = baseline or throughput
+        run["speedup"] = round(throughput / baseline, 2) if baseline and throughput else None
+        report["runs"][str(workers)] = run
+    return report
+
+
+def count_pages(pdf: Path) -> int:
+    import pypdfium2
+
+    document = pypdfium2.PdfDocument(str(pdf))
+    try:
+        return len(document)
+    finally:
+        document.close()
+
+
+async def bench_ingestion(args: argparse.Namespace) -> dict:
+    from src.chroma_handler import compute_file_hash
+    from src.config import PDF_INPUT_DIR
+    from src.ingestion import pipeline
+
+    await install_stubs(args)
+    pdfs = sorted(PDF_INPUT_DIR.glob("*.pdf"))
+    pages = {pdf.name: count_pages(pdf) for pdf in pdfs}
+
+    started = time.perf_counter()
+    await asyncio.gather(*(pipeline.ingest(pdf, compute_file_hash(pdf)) for pdf in pdfs), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    await pipeline.shutdown()
+
+    files = pipeline.status()["files"]
+    total_pages = sum(pages.values())
+    return {
+        "workers": pipeline.workers,
+        "documents": len(pdfs),
+        "pages": total_pages,
+        "wall_seconds": round(elapsed, 3),
+        "pages_per_second": round(total_pages / elapsed, 3) if elapsed else None,
+        "failed": [entry["file"] for entry in files if entry["status"] == "failed"],
+        "files": [
+            {
+                "file": entry["file"],
+                "pages": pages.get(entry["file"]),
+                "status": entry["status"],
+                "seconds": entry.get("seconds"),
+                "chunks": entry.get("chunks"),
+            }
+            for entry in files
+        ],
+    }
+
+
+def legacy_split(text: str) -> list:
+    """The recursive character splitter the structured chunker replaced, kept as a baseline."""
+    import re
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    matches = list(re.finditer(r"^##\s+\d+\. .+$", text, flags=re.MULTILINE))
+    chunks = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        section = text[match.start():end].strip()
+        if section:
+            chunks.extend(splitter.split_text(section))
+    return chunks
+
+
+def time_chunker(split, texts: list, rounds: int) -> dict:
+    timings = []
+    chunks = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        chunks = sum(len(split(text)) for text in texts)
+        timings.append(time.perf_counter() - start)
+    characters = sum(len(text) for text in texts)
+    best = min(timings)
+    return {
+        "chunks": chunks,
+        "seconds_ms": summarize(timings),
+        "chars_per_second": round(characters / best, 1),
+        "chunks_per_second": round(chunks / best, 1),
+    }
+
+
+def bench_chunker(args: argparse.Namespace) -> dict:
+    from src.chunking import split_structured_text
+    from src.config import TEXT_OUTPUT_DIR
+
+    texts = [path.read_text(encoding="utf-8") for path in sorted(TEXT_OUTPUT_DIR.glob("*.txt"))]
+    results = {
+        "documents": len(texts),
+        "characters": sum(len(text) for text in texts),
+        "rounds": args.chunker_rounds,
+        "structured": time_chunker(split_structured_text, texts, args.chunker_rounds),
+    }
+    try:
+        results["legacy"] = time_chunker(legacy_split, texts, args.chunker_rounds)
+    except ImportError:
+        results["legacy"] = None
+    else:
+        results["speedup"] = round(
+            results["structured"]["chars_per_second"] / results["legacy"]["chars_per_second"], 2
+        )
+    return results
+
+
+async def main():
+    args = parse_args()
+    workdir = configure_environment(args)
+
+    results = {
+        "meta": {
+            "suite": args.suite,
+            "timestamp": time.time(),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedding": args.embedding,
+            "semantic_cache": args.cache,
+            "workdir": str(workdir),
+        }
+    }
+    if args.suite in ("chunker", "all"):
+        results["chunker"] = bench_chunker(args)
+    if args.suite in ("chat", "all"):
+        results["chat"] = await bench_chat(args)
+    if args.suite in ("ingestion", "all"):
+        results["ingestion"] = await bench_ingestion(args)
+    if args.suite in ("scaling", "all"):
+        results["scaling"] = await bench_scaling(args)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+        print(f"📊 Benchmark results written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+# Offline stand-ins for the services the backend talks to: an in-process Chroma
+# wrapped in the async collection API, a hashing embedding function, and a chat
+# model that replays Groq-like token timing.
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any, AsyncIterator, List, Optional
+
+import chromadb
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.config import Settings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+EMBEDDING_DIM = 384
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class HashEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Deterministic bag-of-words hashing embedding, no model download needed."""
+
+    def __init__(self):
+        pass
+
+    def __call__(self, input: Documents) -> Embeddings:
+        vectors = []
+        for text in input:
+            vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+            for token in TOKEN_PATTERN.findall(text.lower()):
+                digest = hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest()
+                vector[int.from_bytes(digest, "little") % EMBEDDING_DIM] += 1.0
+            norm = np.linalg.norm(vector)
+            vectors.append(vector / norm if norm else vector)
+        return vectors
+
+    @staticmethod
+    def name() -> str:
+        return "benchmark-hash"
+
+    def get_config(self) -> dict:
+        return {}
+
+    @staticmethod
+    def build_from_config(config: dict) -> "HashEmbeddingFunction":
+        return HashEmbeddingFunction()
+
+
+class AsyncCollection:
+    """Async facade over a synchronous in-process collection."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    @property
+    def metadata(self):
+        return self._collection.metadata
+
+    async def query(self, **kwargs):
+        return await asyncio.to_thread(self._collection.query, **kwargs)
+
+    async def get(self, **kwargs):
+        return await asyncio.to_thread(self._collection.get, **kwargs)
+
+    async def upsert(self, **kwargs):
+        return await asyncio.to_thread(self._collection.upsert, **kwargs)
+
+    async def update(self, **kwargs):
+        return await asyncio.to_thread(self._collection.update, **kwargs)
+
+    async def delete(self, **kwargs):
+        return await asyncio.to_thread(self._collection.delete, **kwargs)
+
+    async def count(self):
+        return await asyncio.to_thread(self._collection.count)
+
+
+class AsyncEphemeralClient:
+    """Just enough of chromadb's AsyncClientAPI on top of EphemeralClient."""
+
+    def __init__(self, embedding_function: Optional[EmbeddingFunction] = None):
+        self._client = chromadb.EphemeralClient(settings=Settings(anonymized_telemetry=False, allow_reset=True))
+        self._embedding_function = embedding_function
+
+    async def get_or_create_collection(self, name: str, metadata: Optional[dict] = None):
+        kwargs = {"embedding_function": self._embedding_function} if self._embedding_function else {}
+        collection = await asyncio.to_thread(self._client.get_or_create_collection, name=name, metadata=metadata, **kwargs)
+        return AsyncCollection(collection)
+
+    async def delete_collection(self, name: str):
+        await asyncio.to_thread(self._client.delete_collection, name=name)
+
+    async def get_max_batch_size(self) -> int:
+        return self._client.get_max_batch_size()
+
+
+class StubGroqChat(BaseChatModel):
+    """Chat model that waits like Groq does: time to first token, then a steady token rate."""
+
+    ttft: float = 0.3
+    inter_token: float = 0.002
+    tokens: int = 256
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-groq"
+
+    def _token(self, i: int) -> str:
+        return f"tok{i} "
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        time.sleep(self.ttft + self.inter_token * (self.tokens - 1))
+        text = "".join(self._token(i) for i in range(self.tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.ttft + self.inter_token * (self.tokens - 1))
+        text = "".join(self._token(i) for i in range(self.tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.ttft)
+        for i in range(self.tokens):
+            if i:
+                await asyncio.sleep(self.inter_token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=self._token(i)))
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import AsyncGenerator, Dict, Iterable, List
+
+from src.chatbot import (
+    SYSTEM_PROMPT,
+    build_context,
+    candidate_depth,
+    generate_tokens,
+    history,
+    now
+)
+from src.config import BATCH_QUERY_SIZE, BATCH_CONCURRENCY, BATCH_MAX_ITEMS
+from src.logging_config import get_logger
+from src.metrics import request_spans, CHAT_REQUESTS
+from src.retrieval import retrieve_many
+
+logger = get_logger("batch")
+
+EMPTY_MEMORY = {"summary": "", "recent": []}
+
+
+class BatchInputError(ValueError):
+    pass
+
+
+def parse_batch(lines: Iterable[str], max_items: int = BATCH_MAX_ITEMS) -> List[Dict]:
+    """Read JSONL items of the form {"question": ..., "id"?: ..., "chat_id"?: ...}."""
+    items = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise BatchInputError(f"Line {number}: invalid JSON ({e.msg})")
+        if isinstance(item, str):
+            item = {"question": item}
+        if not isinstance(item, dict) or not str(item.get("question", "")).strip():
+            raise BatchInputError(f"Line {number}: expected an object with a non-empty \"question\"")
+        items.append({**item, "line": number})
+        if len(items) > max_items:
+            raise BatchInputError(f"Batch exceeds the limit of {max_items} questions")
+    return items
+
+
+def chunk_items(items: List[Dict], size: int) -> List[List[Dict]]:
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+async def answer_batch(
+    items: List[Dict],
+    user_id: str,
+    concurrency: int = BATCH_CONCURRENCY,
+    save_history: bool = False,
+    query_size: int = BATCH_QUERY_SIZE
+) -> AsyncGenerator[Dict, None]:
+    """Answer `items`, yielding one result per item as soon as it is ready.
+
+    Retrieval goes out as one multi-query request per `query_size` questions,
+    prefetched while the previous group is still with the LLM. At most
+    `concurrency` completions run at once, on top of the shared LLM limiter.
+    Items are answered independently: no memory, rewriting or semantic cache.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    groups = chunk_items(items, query_size)
+
+    async def retrieve_group(group: List[Dict]):
+        started = time.perf_counter()
+        results = await retrieve_many([item["question"] for item in group], top_k=candidate_depth())
+        # one round trip serves the whole group, so each item carries its share
+        return results, (time.perf_counter() - started) * 1000 / len(group)
+
+    async def answer(item: Dict, results: dict, retrieval_ms: float) -> Dict:
+        async with slots:
+            spans = {}
+            request_spans.set(spans)
+            started = time.perf_counter()
+            asked_at = now()
+            output = {"id": item.get("id", item["line"]), "question": item["question"], "chat_id": item.get("chat_id")}
+            try:
+                context, _, results = await build_context(item["question"], results)
+                output["answer"] = "".join([token async for token in generate_tokens(EMPTY_MEMORY, context, item["question"])])
+                output["sources"] = [
+                    {"source_file": metadata.get("source_file"), "chunk": metadata.get("chunk")}
+                    for metadata in results["metadatas"][0]
+                ]
+                CHAT_REQUESTS.inc(endpoint="batch", outcome="answered")
+            except Exception as e:
+                output["error"] = str(e)
+                CHAT_REQUESTS.inc(endpoint="batch", outcome="error")
+                logger.warning("Batch item failed", extra={"item": output["id"], "error": repr(e)})
+            output["asked_at"] = asked_at
+            output["timings_ms"] = {
+                "retrieval": round(retrieval_ms, 3),
+                "rerank": spans.get("rerank"),
+                "llm_queue": spans.get("llm_queue"),
+                "llm_ttft": spans.get("llm_ttft"),
+                "llm_total": spans.get("llm_total"),
+                "total": round(retrieval_ms + (time.perf_counter() - started) * 1000, 3),
+            }
+            return output
+
+    started = time.perf_counter()
+    answered = failed = 0
+    prefetch = asyncio.create_task(retrieve_group(groups[0])) if groups else None
+    try:
+        for number, group in enumerate(groups):
+            results, retrieval_ms = await prefetch
+            prefetch = asyncio.create_task(retrieve_group(groups[number + 1])) if number + 1 < len(groups) else None
+
+            tasks = [
+                asyncio.create_task(answer(item, result, retrieval_ms))
+                for item, result in zip(group, results)
+            ]
+            turns = []
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    output = await finished
+                    if "error" in output:
+                        failed += 1
+                    else:
+                        answered += 1
+                        if save_history:
+                            output["chat_id"] = output["chat_id"] or str(uuid.uuid4())
+                            turns.append((
+                                user_id,
+                                output["chat_id"],
+                                [("human", output["question"], output["asked_at"]), ("ai", output["answer"], now())]
+                            ))
+                    yield output
+            finally:
+                for task in tasks:
+                    task.cancel()
+            if turns:
+                # one transaction for the whole group instead of one per question
+                await history.save_turns(turns, system_prompt=SYSTEM_PROMPT)
+    finally:
+        if prefetch is not None:
+            prefetch.cancel()
+        logger.info("Batch finished", extra={
+            "items": len(items),
+            "answered": answered,
+            "failed": failed,
+            "seconds": round(time.perf_counter() - started, 2),
+        })
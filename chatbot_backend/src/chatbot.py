@@ -1,114 +1,295 @@
+import asyncio
 import uuid
-import sqlite3
 import os
+import json
+import time
+from contextlib import aclosing
 from datetime import datetime
-from pathlib import Path
-from typing import List, Dict, Optional, AsyncGenerator
+from typing import TYPE_CHECKING, List, Dict, Optional, AsyncGenerator, Tuple
 
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-from src.chroma_handler import query_documents
+import numpy as np
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from src.retrieval import retrieve
+from src.llm_limiter import llm_limiter, LLMOverloadedError
+from src.history_store import HistoryStore, encode_cursor, decode_cursor
+from src.history_writer import HistoryWriter
+from src.semantic_cache import semantic_cache, CacheEntry
+from src.context_builder import ContextBuilder
+from src.reranker import reranker
+from src.memory import ConversationMemory
+from src.metrics import span, record_span, CHAT_STAGE_SECONDS, CHAT_REQUESTS, SPECULATIVE_RETRIEVALS
+from src.logging_config import get_logger
+from src.config import (
+    HISTORY_DB_PATH,
+    HISTORY_POOL_SIZE,
+    HISTORY_WRITE_BATCH,
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_CANDIDATES,
+    MEMORY_RECENT_TURNS,
+    MEMORY_MESSAGE_MAX_CHARS,
+    MEMORY_REWRITE_QUERIES
+)
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from langchain_groq import ChatGroq
+
 load_dotenv()
-DB_PATH = Path("chat_history.db")
-
-# setup the DB and initialise it
-def init_db():
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS chat_history (
-                id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                chat_id TEXT NOT NULL,
-                role TEXT NOT NULL CHECK(role IN ('system', 'human', 'ai')),
-                message TEXT NOT NULL,
-                timestamp TEXT NOT NULL
-            )
-        ''')
-        conn.execute('''
-            CREATE INDEX IF NOT EXISTS idx_user_chat ON chat_history(user_id, chat_id)
-        ''')
-
-def save_message(user_id: str, chat_id: str, role: str, message: str):
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            '''INSERT INTO chat_history (id, user_id, chat_id, role, message, timestamp)
-               VALUES (?, ?, ?, ?, ?, ?)''',
-            (str(uuid.uuid4()), user_id, chat_id, role, message, datetime.now().isoformat())
-        )
+logger = get_logger("chatbot")
 
-def has_existing_chat(user_id: str, chat_id: str) -> bool:
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.execute(
-            '''SELECT 1 FROM chat_history WHERE user_id = ? AND chat_id = ? LIMIT 1''',
-            (user_id, chat_id)
-        )
-        return cursor.fetchone() is not None
-
-def get_chat_history(user_id: str, chat_id: str) -> List[Dict]:
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.execute(
-            '''SELECT role, message, timestamp FROM chat_history
-               WHERE user_id = ? AND chat_id = ?
-               ORDER BY timestamp ASC''',
-            (user_id, chat_id)
-        )
-        return [
-            {"role": row[0], "message": row[1], "timestamp": row[2]}
-            for row in cursor.fetchall()
-        ]
-
-def list_user_chats(user_id: str) -> List[str]:
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.execute(
-            '''SELECT DISTINCT chat_id FROM chat_history WHERE user_id = ?''',
-            (user_id,)
-        )
-        return [row[0] for row in cursor.fetchall()]
+history = HistoryStore(HISTORY_DB_PATH, pool_size=HISTORY_POOL_SIZE)
+context_builder = ContextBuilder(CONTEXT_TOKEN_BUDGET)
 
-def delete_chat(user_id: str, chat_id: str):
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            '''DELETE FROM chat_history WHERE user_id = ? AND chat_id = ?''',
-            (user_id, chat_id)
-        )
+def now() -> str:
+    return datetime.now().isoformat()
 
+async def get_chat_history(user_id: str, chat_id: str, limit: int, cursor: Optional[str] = None) -> Dict:
+    after = decode_cursor(cursor)
+    if after is not None and not isinstance(after, int):
+        raise ValueError("Invalid cursor")
+    await history_writer.wait(user_id, chat_id)
+    messages, next_position = await history.get_chat_history(user_id, chat_id, limit, after)
+    return {"messages": messages, "next_cursor": encode_cursor(next_position)}
 
+async def get_chat_version(user_id: str, chat_id: str) -> Optional[Tuple[str, int]]:
+    await history_writer.wait(user_id, chat_id)
+    return await history.get_chat_version(user_id, chat_id)
 
-# Initialise message History DB
-init_db()
+async def list_user_chats(user_id: str, limit: int, cursor: Optional[str] = None) -> Dict:
+    before = decode_cursor(cursor)
+    if before is not None and not (isinstance(before, list) and len(before) == 2):
+        raise ValueError("Invalid cursor")
+    await history_writer.wait(user_id)
+    chats, next_position = await history.list_user_chats(user_id, limit, before and tuple(before))
+    return {"chats": chats, "next_cursor": encode_cursor(next_position)}
+
+async def delete_chat(user_id: str, chat_id: str):
+    # a queued turn written after the delete would bring the chat back
+    await history_writer.wait(user_id, chat_id)
+    await history.delete_chat(user_id, chat_id)
 
 SYSTEM_PROMPT = "You are a helpful legal assistant. Use the provided legal context to answer questions clearly."
 
-llm = ChatGroq(
-    model="meta-llama/llama-4-scout-17b-16e-instruct",
-    temperature=0.3,
-    max_tokens=1024,
-    groq_api_key=os.getenv("GROQ_API_KEY")
-)
+# built on first use so each web worker process gets its own HTTP client,
+# and importing the app doesn't pay for the Groq SDK
+llm: Optional["ChatGroq"] = None
 
-async def ask_with_context(user_id: str, chat_id: Optional[str], question: str) -> Dict[str, str]:
-    if not chat_id:
-        chat_id = str(uuid.uuid4())
+def get_llm() -> "ChatGroq":
+    global llm
+    if llm is None:
+        from langchain_groq import ChatGroq
+        llm = ChatGroq(
+            model="meta-llama/llama-4-scout-17b-16e-instruct",
+            temperature=0.3,
+            max_tokens=1024,
+            groq_api_key=os.getenv("GROQ_API_KEY")
+        )
+    return llm
 
-    if not has_existing_chat(user_id, chat_id):
-        save_message(user_id, chat_id, "system", SYSTEM_PROMPT)
-    save_message(user_id, chat_id, "human", question)
+conversation_memory = ConversationMemory(
+    history,
+    get_llm,
+    recent_turns=MEMORY_RECENT_TURNS,
+    max_chars=MEMORY_MESSAGE_MAX_CHARS,
+    rewrite_queries=MEMORY_REWRITE_QUERIES
+)
 
-    results = await query_documents(question, top_k=5)
-    context = "\n\n".join(results["documents"][0])
+# the summary update needs the turn in the database, so it follows the write
+history_writer = HistoryWriter(history, SYSTEM_PROMPT, HISTORY_WRITE_BATCH, on_saved=conversation_memory.schedule_update)
 
+def build_chain():
     prompt = ChatPromptTemplate.from_messages([
         ("system", SYSTEM_PROMPT),
+        MessagesPlaceholder("history", optional=True),
         ("human", "Context:\n{context}\n\nQuestion: {question}")
     ])
-    chain = prompt | llm
-    response = chain.invoke({"context": context, "question": question})
-    
-    save_message(user_id, chat_id, "ai", str(response.content))
-    return {"user_id": user_id, "chat_id": chat_id, "answer": response.content}
-
-async def stream_response(user_id: str, chat_id: Optional[str], question: str) -> AsyncGenerator[str, None]:
-    result = await ask_with_context(user_id, chat_id, question)
-    yield result["answer"]
+    return prompt | get_llm()
+
+async def plan_turn(user_id: str, chat_id: str, question: str) -> Tuple[Dict, str]:
+    """Load the chat's bounded memory and turn a follow-up into a standalone search question."""
+    with span("history_read"):
+        await history_writer.wait(user_id, chat_id)
+        memory = await conversation_memory.load(user_id, chat_id)
+    with span("query_rewrite"):
+        search_question = await conversation_memory.rewrite_question(question, memory)
+    if search_question != question:
+        logger.info("Rewrote follow-up question", extra={"chat_id": chat_id, "search_question": search_question})
+    return memory, search_question
+
+def candidate_depth() -> int:
+    # the reranker needs a wider net; it narrows the set back down itself
+    return max(CONTEXT_CANDIDATES, reranker.max_candidates) if reranker.enabled else CONTEXT_CANDIDATES
+
+async def build_context(question: str, results: dict) -> Tuple[str, Dict[str, int], dict]:
+    """Prompt context from one question's query result, reranked first when enabled.
+
+    Also returns the context stats and the results the context was built from.
+    """
+    candidates = len(results["ids"][0])
+    if reranker.enabled:
+        with span("rerank"):
+            results = await reranker.rerank(question, results)
+    with span("context_build"):
+        context, stats = context_builder.build(results["documents"][0], results["metadatas"][0])
+    return context, {**stats, "candidates": candidates}, results
+
+async def retrieve_context(question: str) -> str:
+    with span("retrieval"):
+        results = await retrieve(question, top_k=candidate_depth())
+    context, stats, _ = await build_context(question, results)
+    logger.info("Built prompt context", extra=stats)
+    return context
+
+def discard(task: asyncio.Task):
+    task.cancel()
+    # a failure of work nobody needs any more isn't worth a warning
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+async def lookup_and_retrieve(search_question: str) -> Tuple[Optional[CacheEntry], Optional[np.ndarray], Optional[str]]:
+    """Semantic cache lookup and retrieval side by side; the retrieval is dropped on a cache hit."""
+    retrieval = asyncio.create_task(retrieve_context(search_question))
+    try:
+        with span("cache_lookup"):
+            cached, vector = await semantic_cache.lookup(search_question)
+    except BaseException:
+        discard(retrieval)
+        raise
+    if cached is not None:
+        discard(retrieval)
+        return cached, vector, None
+    return None, vector, await retrieval
+
+async def prepare_turn(
+    user_id: str,
+    chat_id: str,
+    question: str
+) -> Tuple[Dict, str, Optional[CacheEntry], Optional[np.ndarray], Optional[str]]:
+    """Everything a turn needs before the LLM: memory, search question, and a cached answer or prompt context.
+
+    The question as asked is also the search question unless a follow-up gets
+    rewritten, so its cache lookup and retrieval start right away, alongside
+    the history read and rewrite. Only a rewrite throws that work away.
+    """
+    started = time.perf_counter()
+    speculative = asyncio.create_task(lookup_and_retrieve(question))
+    try:
+        memory, search_question = await plan_turn(user_id, chat_id, question)
+    except BaseException:
+        discard(speculative)
+        raise
+    if search_question == question:
+        SPECULATIVE_RETRIEVALS.inc(outcome="used")
+        cached, vector, context = await speculative
+    else:
+        SPECULATIVE_RETRIEVALS.inc(outcome="discarded")
+        discard(speculative)
+        cached, vector, context = await lookup_and_retrieve(search_question)
+    record_span(CHAT_STAGE_SECONDS, "pre_llm_critical_path", time.perf_counter() - started)
+    return memory, search_question, cached, vector, context
+
+async def generate_tokens(memory: Dict, context: str, question: str) -> AsyncGenerator[str, None]:
+    chain = build_chain()
+    queued = time.perf_counter()
+    async with llm_limiter.slot():
+        started = time.perf_counter()
+        record_span(CHAT_STAGE_SECONDS, "llm_queue", started - queued)
+        first = True
+        async for chunk in chain.astream({
+            "history": conversation_memory.as_messages(memory),
+            "context": context,
+            "question": question
+        }):
+            token = str(chunk.content)
+            if not token:
+                continue
+            if first:
+                record_span(CHAT_STAGE_SECONDS, "llm_ttft", time.perf_counter() - started)
+                first = False
+            yield token
+        record_span(CHAT_STAGE_SECONDS, "llm_total", time.perf_counter() - started)
+
+def queue_turn(user_id: str, chat_id: str, question: str, asked_at: str, answer: str) -> asyncio.Future:
+    # system (for new chats), human and ai rows go in one transaction, batched with other chats' turns
+    return history_writer.submit(user_id, chat_id, [("human", question, asked_at), ("ai", answer, now())])
+
+async def persist_turn(user_id: str, chat_id: str, question: str, asked_at: str, answer: str):
+    # the turn is stored before the response completes: the queue only covers this process,
+    # so a history read served by another web worker would otherwise miss it
+    await asyncio.shield(queue_turn(user_id, chat_id, question, asked_at, answer))
+
+async def ask_with_context(user_id: str, chat_id: Optional[str], question: str) -> Dict[str, str]:
+    chat_id = chat_id or str(uuid.uuid4())
+    asked_at = now()
+    generation = semantic_cache.generation
+    memory, search_question, cached, vector, context = await prepare_turn(user_id, chat_id, question)
+
+    if cached is not None:
+        answer = cached.answer
+        CHAT_REQUESTS.inc(endpoint="chat", outcome="cache_hit")
+    else:
+        llm_limiter.check_capacity()
+        answer = "".join([token async for token in generate_tokens(memory, context, question)])
+        semantic_cache.put(vector, search_question, answer, context, generation)
+        CHAT_REQUESTS.inc(endpoint="chat", outcome="answered")
+
+    await persist_turn(user_id, chat_id, question, asked_at, answer)
+    return {"user_id": user_id, "chat_id": chat_id, "answer": answer}
+
+def format_stream_event(event: Dict[str, str], stream_format: str) -> str:
+    if stream_format == "ndjson":
+        return json.dumps(event) + "\n"
+    if stream_format == "sse":
+        return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    # plain text only carries the answer tokens themselves
+    return event.get("content", "") if event["type"] == "token" else ""
+
+async def stream_response(
+    user_id: str,
+    chat_id: Optional[str],
+    question: str,
+    stream_format: str = "text"
+) -> AsyncGenerator[str, None]:
+    chat_id = chat_id or str(uuid.uuid4())
+    asked_at = now()
+    generation = semantic_cache.generation
+    yield format_stream_event({"type": "start", "chat_id": chat_id}, stream_format)
+
+    parts: List[str] = []
+    persisted = False
+    try:
+        # inside the try: once "start" is out, a failed retrieval must still end the turn with an error event
+        memory, search_question, cached, vector, context = await prepare_turn(user_id, chat_id, question)
+
+        if cached is not None:
+            yield format_stream_event({"type": "token", "content": cached.answer}, stream_format)
+            persisted = True
+            await persist_turn(user_id, chat_id, question, asked_at, cached.answer)
+            CHAT_REQUESTS.inc(endpoint="stream", outcome="cache_hit")
+            yield format_stream_event({"type": "done", "chat_id": chat_id}, stream_format)
+            return
+
+        # aclosing releases the LLM slot promptly if the client goes away mid-stream
+        async with aclosing(generate_tokens(memory, context, question)) as tokens:
+            async for token in tokens:
+                parts.append(token)
+                yield format_stream_event({"type": "token", "content": token}, stream_format)
+        # stored before "done", so a history fetch on any worker afterwards sees it
+        persisted = True
+        await persist_turn(user_id, chat_id, question, asked_at, "".join(parts))
+    except LLMOverloadedError as e:
+        CHAT_REQUESTS.inc(endpoint="stream", outcome="rejected")
+        yield format_stream_event({"type": "error", "message": str(e)}, stream_format)
+        return
+    except Exception as e:
+        CHAT_REQUESTS.inc(endpoint="stream", outcome="error")
+        logger.exception("Streaming failed", extra={"chat_id": chat_id})
+        yield format_stream_event({"type": "error", "message": str(e)}, stream_format)
+        return
+    finally:
+        # keep whatever was generated when an error or a disconnect cut the answer short
+        if parts and not persisted:
+            queue_turn(user_id, chat_id, question, asked_at, "".join(parts))
+
+    semantic_cache.put(vector, search_question, "".join(parts), context, generation)
+    CHAT_REQUESTS.inc(endpoint="stream", outcome="answered")
+    yield format_stream_event({"type": "done", "chat_id": chat_id}, stream_format)
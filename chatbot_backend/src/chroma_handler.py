@@ -1,97 +1,392 @@
+import asyncio
 import hashlib
-import re
+import time
 from pathlib import Path
-from docling.document_converter import DocumentConverter
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import Awaitable, Callable, Iterator, List, Optional, Tuple, TypeVar
 import chromadb
+import httpx
+from chromadb.api.client import SharedSystemClient
+from chromadb.config import Settings
+from chromadb.errors import NotFoundError
 
+from src.semantic_cache import semantic_cache
+from src.embeddings import embedding_service
+from src.chunking import Chunk, CHUNKER_VERSION
+from src.hybrid_index import hybrid_index
+from src.logging_config import get_logger
+from src.metrics import ingestion_span, INGESTED_CHUNKS
+from src.ingestion_state import (
+    checkpoint_path,
+    clear_all,
+    load_checkpoint,
+    save_checkpoint,
+    load_manifest,
+    save_manifest,
+    manifest_embedding_model,
+    manifest_chunker,
+    source_name,
+    LEGACY_EMBEDDING_MODEL
+)
 from src.config import (
     CHROMA_HOST,
     CHROMA_PORT,
     COLLECTION_NAME,
-    TEXT_OUTPUT_DIR
+    CHROMA_MAX_CONNECTIONS,
+    CHROMA_MAX_KEEPALIVE_CONNECTIONS,
+    CHROMA_KEEPALIVE_SECS,
+    INGESTION_BATCH_SIZE
 )
 
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
+T = TypeVar("T")
+logger = get_logger("chroma")
 
+# errors that mean the vector-db went away (container restart, wiped volume)
+RECONNECT_ERRORS = (httpx.TransportError, NotFoundError)
 
-def compute_file_hash(file_path: Path) -> str:
-    return hashlib.sha256(file_path.read_bytes()).hexdigest()
 
+class ChromaManager:
+    """Process-wide Chroma client and collection handle.
 
-def split_structured_text(text: str) -> list[str]:
-    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
-    heading_pattern = r"^##\s+\d+\. .+$"
-    heading_regex = re.compile(heading_pattern, flags=re.MULTILINE)
+    Built once in the FastAPI lifespan and shared by every request so the
+    keep-alive pool is reused instead of reconnecting per call. Operations that
+    fail because the server restarted are retried once on a fresh client.
+    """
 
-    matches = list(heading_regex.finditer(text))
-    sections = []
+    def __init__(self, host: str, port: int, collection_name: str):
+        self.host = host
+        self.port = port
+        self.collection_name = collection_name
+        self._client = None
+        self._collection = None
+        self._max_batch_size = None
+        self._lock = asyncio.Lock()
+        self._in_flight = 0
+        self._stats = {
+            "connects": 0,
+            "reconnects": 0,
+            "requests": 0,
+            "errors": 0,
+            "peak_in_flight": 0,
+            "last_error": None,
+            "connected_at": None,
+        }
 
-    for i, match in enumerate(matches):
-        start = match.start()
-        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
-        section = text[start:end].strip()
-        if section:
-            split_chunks = splitter.split_text(section)
-            sections.extend(split_chunks)
+    async def connect(self):
+        async with self._lock:
+            if self._collection is None:
+                await self._connect()
+        return self._collection
 
-    return sections
+    async def _connect(self):
+        settings = Settings(
+            anonymized_telemetry=False,
+            chroma_http_keepalive_secs=CHROMA_KEEPALIVE_SECS,
+            chroma_http_max_connections=CHROMA_MAX_CONNECTIONS,
+            chroma_http_max_keepalive_connections=CHROMA_MAX_KEEPALIVE_CONNECTIONS,
+        )
+        self._client = await chromadb.AsyncHttpClient(host=self.host, port=self.port, settings=settings)
+        self._collection = await self._open_collection()
+        self._stats["connects"] += 1
+        self._stats["connected_at"] = time.time()
+        logger.info("Connected to Chroma", extra={"host": self.host, "port": self.port, "collection": self.collection_name})
 
+    async def attach(self, client):
+        """Use an already-built async client, e.g. an in-process Chroma in benchmarks."""
+        async with self._lock:
+            self._client = client
+            self._collection = await self._open_collection()
+            self._stats["connects"] += 1
+            self._stats["connected_at"] = time.time()
 
-async def check_if_already_embedded(file_path: Path) -> str | None:
-    doc_hash = compute_file_hash(file_path)
-    client = await chromadb.AsyncHttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
-    collection = await client.get_or_create_collection(name=COLLECTION_NAME)
+    async def _open_collection(self):
+        collection = await self._client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={"embedding_model": embedding_service.version}
+        )
+        stored = (collection.metadata or {}).get("embedding_model", LEGACY_EMBEDDING_MODEL)
+        if stored == embedding_service.version:
+            return collection
+        # vectors of another model may not even have the same dimension, so
+        # every upsert and query would fail: start over with an empty collection
+        # and let the next directory scan re-embed every document
+        logger.warning("Collection was created with another embedding model, recreating it", extra={
+            "collection_model": stored,
+            "model": embedding_service.version,
+        })
+        try:
+            await self._client.delete_collection(name=self.collection_name)
+        except NotFoundError:
+            # another process got there first
+            pass
+        await asyncio.to_thread(clear_all)
+        semantic_cache.invalidate()
+        hybrid_index.clear()
+        return await self._client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={"embedding_model": embedding_service.version}
+        )
 
-    try:
-        existing = await collection.get(ids=[f"{doc_hash}-0"])
-        if existing["ids"]:
-            return None
-    except Exception:
-        pass
+    async def get_collection(self):
+        if self._collection is None:
+            return await self.connect()
+        return self._collection
+
+    async def reset(self):
+        async with self._lock:
+            self._client = None
+            self._collection = None
+            # drop the cached system so the next connect builds a new http pool
+            SharedSystemClient.clear_system_cache()
+        self._stats["reconnects"] += 1
+
+    async def run(self, operation: Callable[..., Awaitable[T]]) -> T:
+        """Run `operation(collection)` on the shared handle, reconnecting once on failure."""
+        self._in_flight += 1
+        self._stats["requests"] += 1
+        self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._in_flight)
+        try:
+            collection = await self.get_collection()
+            try:
+                return await operation(collection)
+            except RECONNECT_ERRORS as e:
+                logger.warning("Chroma connection lost, reconnecting", extra={"error": repr(e)})
+                self._stats["last_error"] = repr(e)
+                await self.reset()
+                collection = await self.get_collection()
+                return await operation(collection)
+        except Exception as e:
+            self._stats["errors"] += 1
+            self._stats["last_error"] = repr(e)
+            raise
+        finally:
+            self._in_flight -= 1
+
+    async def recreate_collection(self):
+        """Drop the collection and start over with an empty one."""
+        async with self._lock:
+            if self._client is None:
+                await self._connect()
+            try:
+                await self._client.delete_collection(name=self.collection_name)
+            except NotFoundError:
+                pass
+            self._collection = await self._open_collection()
+        semantic_cache.invalidate()
+        hybrid_index.clear()
+
+    async def max_batch_size(self) -> int:
+        if self._max_batch_size is None:
+            await self.get_collection()
+            self._max_batch_size = await self._client.get_max_batch_size()
+        return self._max_batch_size
+
+    async def close(self):
+        async with self._lock:
+            self._client = None
+            self._collection = None
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "connected": self._collection is not None,
+            "in_flight": self._in_flight,
+            "max_connections": CHROMA_MAX_CONNECTIONS,
+            "max_keepalive_connections": CHROMA_MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_secs": CHROMA_KEEPALIVE_SECS,
+        }
+
+
+chroma = ChromaManager(CHROMA_HOST, CHROMA_PORT, COLLECTION_NAME)
+
+
+def compute_file_hash(file_path: Path) -> str:
+    with file_path.open("rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def chunk_id(source_file: str, chunk: str) -> str:
+    return hashlib.sha256(f"{source_file}\0{chunk}".encode("utf-8")).hexdigest()[:32]
+
+
+async def check_if_already_embedded(file_path: Path, doc_hash: str | None = None) -> str | None:
+    if doc_hash is None:
+        with ingestion_span("hash"):
+            doc_hash = await asyncio.to_thread(compute_file_hash, file_path)
+
+    # a leftover checkpoint means a previous ingestion stopped part way
+    if checkpoint_path(doc_hash).exists():
+        return doc_hash
 
+    source_file = await asyncio.to_thread(source_name, file_path)
+    manifest = await asyncio.to_thread(load_manifest, source_file)
+    if manifest is not None:
+        up_to_date = (
+            manifest["file_hash"] == doc_hash
+            and manifest_embedding_model(manifest) == embedding_service.version
+            and manifest_chunker(manifest) == CHUNKER_VERSION
+        )
+        return None if up_to_date else doc_hash
+
+    # no manifest: never ingested, or ingested before manifests and the current chunker existed
     return doc_hash
 
 
-async def embed_document(file_path: Path, doc_hash: str) -> None:
+def iter_batches(items: list, batch_size: int) -> Iterator[list]:
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+async def existing_chunk_ids(source_file: str) -> Tuple[List[str], str]:
+    """Ids stored for this source and the embedding model their vectors came from."""
+    manifest = await asyncio.to_thread(load_manifest, source_file)
+    if manifest is not None:
+        return manifest["chunk_ids"], manifest_embedding_model(manifest)
+    # no manifest yet: diff against whatever the collection holds for this source
+    existing = await chroma.run(lambda collection: collection.get(
+        where={"source_file": source_file},
+        include=[]
+    ))
+    return existing["ids"], LEGACY_EMBEDDING_MODEL
+
+
+async def store_chunks(source_file: str, doc_hash: str, chunks: List[Chunk]) -> dict:
+    """Bring the collection in line with `chunks` for this source file.
+
+    Chunks are identified by a hash of their content, so only new or changed
+    chunks are embedded; chunks that disappeared are deleted and the rest only
+    get their position metadata refreshed. Embedding batch N+1 overlaps with
+    the upsert of batch N, and progress is checkpointed per batch. The
+    lexical index isn't touched: processes reload it once the job worker
+    bumps the collection version.
+    """
+    total = len(chunks)
+
+    # identical chunks within one document collapse onto the first occurrence
+    positions: dict[str, int] = {}
+    for i, chunk in enumerate(chunks):
+        positions.setdefault(chunk_id(source_file, chunk.text), i)
+    ids = list(positions)
+
+    stored_ids, stored_model = await existing_chunk_ids(source_file)
+    old_ids = set(stored_ids)
+    # vectors from another embedding model are not comparable: re-embed every chunk
+    reusable = old_ids if stored_model == embedding_service.version else set()
+    added = [positions[id_] for id_ in ids if id_ not in reusable]
+    kept = [positions[id_] for id_ in ids if id_ in reusable]
+    removed = sorted(old_ids - positions.keys())
+
+    def metadata(i: int) -> dict:
+        # chapter, article, clause and page come from the chunker
+        return {
+            "source_file": source_file,
+            "chunk": f"{i+1} of {total}",
+            "chunk_index": i,
+            **chunks[i].metadata
+        }
+
+    # chunks upserted by an interrupted run are content-addressed, so just skip them
+    upserted = load_checkpoint(doc_hash)
+    if upserted:
+        logger.info("Resuming ingestion", extra={"source_file": source_file, "already_upserted": len(upserted)})
+    upserted_ids = [id_ for id_ in ids if id_ in upserted]
+    pending_adds = [i for i in added if chunk_id(source_file, chunks[i].text) not in upserted]
+
+    batch_size = min(INGESTION_BATCH_SIZE, await chroma.max_batch_size())
+    batches = list(iter_batches(pending_adds, batch_size))
+
+    async def embed_batch(batch: List[int]) -> List[List[float]]:
+        with ingestion_span("embed"):
+            return await embedding_service.embed_documents([chunks[i].text for i in batch])
+
+    pending = asyncio.create_task(embed_batch(batches[0])) if batches else None
     try:
-        client = await chromadb.AsyncHttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
-        collection = await client.get_or_create_collection(name=COLLECTION_NAME)
+        for number, batch in enumerate(batches):
+            embeddings = await pending
+            pending = None
+            if number + 1 < len(batches):
+                pending = asyncio.create_task(embed_batch(batches[number + 1]))
+
+            documents = [chunks[i].text for i in batch]
+            batch_ids = [chunk_id(source_file, chunks[i].text) for i in batch]
+            metadatas = [metadata(i) for i in batch]
+            with ingestion_span("upsert"):
+                await chroma.run(lambda collection: collection.upsert(
+                    documents=documents,
+                    embeddings=embeddings,
+                    ids=batch_ids,
+                    metadatas=metadatas
+                ))
+            upserted_ids.extend(batch_ids)
+            await asyncio.to_thread(save_checkpoint, doc_hash, upserted_ids)
+    finally:
+        if pending is not None:
+            pending.cancel()
 
-        converter = DocumentConverter()
-        result = converter.convert(file_path)
-        extracted_text = result.document.export_to_text()
+    # unchanged chunks keep their vectors; only their position in the document may have moved
+    for batch in iter_batches(kept, batch_size):
+        batch_ids = [chunk_id(source_file, chunks[i].text) for i in batch]
+        metadatas = [metadata(i) for i in batch]
+        with ingestion_span("update_metadata"):
+            await chroma.run(lambda collection: collection.update(ids=batch_ids, metadatas=metadatas))
 
-        TEXT_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-        output_path = TEXT_OUTPUT_DIR / f"{file_path.stem}.txt"
-        output_path.write_text(extracted_text, encoding="utf-8")
+    for stale in iter_batches(removed, batch_size):
+        with ingestion_span("delete"):
+            await chroma.run(lambda collection: collection.delete(ids=stale))
 
-        chunks = split_structured_text(extracted_text)
-        total = len(chunks)
+    await asyncio.to_thread(save_manifest, source_file, doc_hash, ids, embedding_service.version, CHUNKER_VERSION)
+    checkpoint_path(doc_hash).unlink(missing_ok=True)
 
-        ids = [f"{doc_hash}-{i}" for i in range(total)]
-        metadatas = [
-            {
-                "source_file": file_path.name,
-                "chunk": f"{i+1} of {total}"
-            }
-            for i in range(total)
-        ]
+    if added or removed:
+        # cached answers may be stale now that the collection has new content
+        semantic_cache.invalidate()
+    INGESTED_CHUNKS.inc(len(added), change="added")
+    INGESTED_CHUNKS.inc(len(kept), change="unchanged")
+    INGESTED_CHUNKS.inc(len(removed), change="removed")
+    logger.info("Stored chunks", extra={"source_file": source_file, "added": len(added), "unchanged": len(kept), "removed": len(removed)})
+    return {"added": len(added), "unchanged": len(kept), "removed": len(removed)}
 
-        await collection.upsert(documents=chunks, ids=ids, metadatas=metadatas)
-        print(f"🐐 Embedding complete: {file_path.name}, your the 🐐")
 
-    except Exception as e:
-        print(f"😭 Failed embedding {file_path.name}: {e}")
+async def load_all_chunks(page_size: int = 1000) -> dict:
+    ids, documents, metadatas = [], [], []
+    offset = 0
+    while True:
+        page = await chroma.run(lambda collection: collection.get(
+            include=["documents", "metadatas"],
+            limit=page_size,
+            offset=offset
+        ))
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+        if len(page["ids"]) < page_size:
+            break
+        offset += page_size
+    return {"ids": ids, "documents": documents, "metadatas": metadatas}
 
 
-async def query_documents(question: str, top_k: int = 5) -> dict:
-    client = await chromadb.AsyncHttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
-    collection = await client.get_or_create_collection(name=COLLECTION_NAME)
+def where_clause(filters: dict) -> dict:
+    """Chroma `where` for equality filters such as {"chapter": 4} or {"source_file": ..., "article": 29}."""
+    if len(filters) == 1:
+        return dict(filters)
+    return {"$and": [{key: value} for key, value in filters.items()]}
+
+
+async def query_documents(question: str, top_k: int = 5, filters: Optional[dict] = None) -> dict:
+    query_embedding = await embedding_service.embed_query(question)
+    where = {"where": where_clause(filters)} if filters else {}
+    results = await chroma.run(lambda collection: collection.query(
+        query_embeddings=[query_embedding],
+        n_results=top_k,
+        **where
+    ))
+    return results
+
 
-    results = await collection.query(
-        query_texts=[question],
+async def query_documents_many(questions: List[str], top_k: int = 5) -> dict:
+    """One collection.query for several questions; row i of each field belongs to questions[i]."""
+    query_embeddings = await embedding_service.embed_queries(questions)
+    results = await chroma.run(lambda collection: collection.query(
+        query_embeddings=query_embeddings,
         n_results=top_k
-    )
+    ))
     return results
@@ -0,0 +1,289 @@
+import re
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# bump when chunk boundaries or metadata change so stored documents get re-chunked
+CHUNKER_VERSION = "structured-2"
+
+# (text, page number or None, is heading)
+Block = Tuple[str, Optional[int], bool]
+
+CHAPTER_REGEX = re.compile(r"^chapter\s+(\d+|[a-z]+)\b", flags=re.IGNORECASE)
+ARTICLE_REGEX = re.compile(r"^(\d+)([A-Z]?)\.\s")
+CLAUSE_REGEX = re.compile(r"^(?:-\s*)?\((\d+)\)")
+# "2. Amendment of article 5 of the Constitution", "5. Insertion of new article 178A"
+AMENDS_REGEX = re.compile(r"\barticle\s+(\d+)([A-Z]?)\b", flags=re.IGNORECASE)
+# the enacting formula only appears in Acts, e.g. the amendment Acts
+ENACTMENT_REGEX = re.compile(r"\bBE IT ENACTED\b|^An Act to\b")
+# an Act's enactment formula follows its arrangement of sections, well within this many blocks
+KIND_LOOKAHEAD_BLOCKS = 200
+SENTENCE_BREAK_REGEX = re.compile(r"(?<=[.;:])\s+")
+
+NUMBER_WORDS = {
+    word: number for number, word in enumerate(
+        "zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen "
+        "fifteen sixteen seventeen eighteen nineteen twenty".split()
+    )
+}
+
+
+class Chunk:
+    __slots__ = ("text", "metadata")
+
+    def __init__(self, text: str, metadata: dict):
+        self.text = text
+        self.metadata = metadata
+
+    def __repr__(self) -> str:
+        return f"Chunk({self.metadata!r}, {self.text[:40]!r})"
+
+
+def chapter_number(heading: str) -> Optional[int]:
+    match = CHAPTER_REGEX.match(heading)
+    if match is None:
+        return None
+    value = match.group(1).lower()
+    return int(value) if value.isdigit() else NUMBER_WORDS.get(value)
+
+
+def document_kind(texts: Iterable[str]) -> str:
+    """"act" for an Act of Parliament, whose numbered headings are sections; else "constitution"."""
+    return "act" if any(ENACTMENT_REGEX.search(text) for text in texts) else "constitution"
+
+
+def peek_kind(blocks: Iterator[Block], limit: int = KIND_LOOKAHEAD_BLOCKS) -> Tuple[str, Iterator[Block]]:
+    """`document_kind` from the first `limit` blocks at most, and all the blocks again from the start."""
+    head: List[Block] = []
+    for block in blocks:
+        head.append(block)
+        if ENACTMENT_REGEX.search(block[0]):
+            return "act", chain(head, blocks)
+        if len(head) >= limit:
+            break
+    return "constitution", chain(head, blocks)
+
+
+def blocks_from_text(text: str) -> Iterator[Block]:
+    """Blocks of docling's text export: paragraphs separated by blank lines, `## ` marks headings."""
+    for paragraph in text.split("\n\n"):
+        paragraph = paragraph.strip()
+        if paragraph:
+            yield paragraph, None, paragraph.startswith("## ")
+
+
+def blocks_from_docling(document: dict) -> Iterator[Block]:
+    """Blocks of a docling document dict in reading order, with the page each one starts on.
+
+    Page headers and footers are skipped; headings and list items are rendered
+    the way docling's text export renders them so both inputs chunk alike.
+    """
+    texts = document.get("texts", [])
+    groups = document.get("groups", [])
+
+    def walk(node: dict) -> Iterator[dict]:
+        for child in node.get("children", []):
+            kind, _, index = child.get("$ref", "").lstrip("#/").partition("/")
+            if kind == "texts":
+                item = texts[int(index)]
+                yield item
+                yield from walk(item)
+            elif kind == "groups":
+                yield from walk(groups[int(index)])
+
+    for item in walk(document.get("body", {})):
+        if item.get("content_layer", "body") != "body" or item.get("label") in ("page_header", "page_footer"):
+            continue
+        text = item.get("text", "").strip()
+        if not text:
+            continue
+        provenance = item.get("prov") or []
+        page = provenance[0].get("page_no") if provenance else None
+        label = item.get("label")
+        if label in ("section_header", "title"):
+            yield f"## {text}", page, True
+        elif label == "list_item":
+            yield f"- {text}", page, False
+        else:
+            yield text, page, False
+
+
+def split_long(text: str, size: int) -> Iterator[str]:
+    """Pieces of at most `size` characters, cut at sentence ends, else at spaces."""
+    if len(text) <= size:
+        yield text
+        return
+    piece = ""
+    for sentence in SENTENCE_BREAK_REGEX.split(text):
+        words = [sentence] if len(sentence) <= size else sentence.split(" ")
+        for word in words:
+            while len(word) > size:
+                if piece:
+                    yield piece
+                    piece = ""
+                yield word[:size]
+                word = word[size:]
+            if piece and len(piece) + 1 + len(word) > size:
+                yield piece
+                piece = word
+            else:
+                piece = f"{piece} {word}" if piece else word
+    if piece:
+        yield piece
+
+
+def overlap_tail(text: str, overlap: int) -> str:
+    if overlap <= 0 or len(text) <= overlap:
+        return ""
+    tail = text[-overlap:]
+    space = tail.find(" ")
+    return tail[space + 1:] if space != -1 else ""
+
+
+def chunk_blocks(
+    blocks: Iterable[Block],
+    chunk_size: int = CHUNK_SIZE,
+    overlap: int = CHUNK_OVERLAP,
+    kind: Optional[str] = None
+) -> Iterator[Chunk]:
+    """Single pass over the blocks of a document, tracking chapter, article and clause.
+
+    A chapter or numbered heading always starts a new chunk; within it blocks
+    are packed up to `chunk_size` characters and consecutive chunks share up
+    to `overlap` trailing characters. Text before the first heading is kept
+    as its own chunks. Every chunk carries the document kind, the hierarchy
+    position it starts in and the pages it spans, for use as Chroma metadata.
+
+    Numbered headings are articles only in the Constitution. In an Act they
+    are sections, with the article a section amends kept as `amends_article`;
+    a numbering restart inside a section about a schedule is recorded as
+    `paragraph` of that section.
+
+    Blocks are consumed lazily and chunks yielded as they fill up. Unless
+    `kind` is given, it is detected from the first blocks (`peek_kind`).
+    """
+    blocks = iter(blocks)
+    if kind is None:
+        kind, blocks = peek_kind(blocks)
+    # finished chunks, handed out after each block
+    chunks: List[Chunk] = []
+    chapter: Optional[int] = None
+    article: Optional[int] = None
+    article_label: Optional[str] = None
+    amends: Optional[Tuple[int, str]] = None
+    paragraph: Optional[int] = None
+    # the current section replaces or amends a schedule, which has its own numbering
+    in_schedule = False
+    clause: Optional[int] = None
+
+    parts: List[str] = []
+    length = 0
+    metadata: dict = {}
+    page: Optional[int] = None
+    end_page: Optional[int] = None
+
+    def position() -> dict:
+        meta = {"document_kind": kind}
+        if chapter is not None:
+            meta["chapter"] = chapter
+        if article is not None and kind == "act":
+            meta["section"] = article
+            meta["section_label"] = article_label
+            if amends is not None:
+                meta["amends_article"], meta["amends_article_label"] = amends
+            if paragraph is not None:
+                meta["paragraph"] = paragraph
+        elif article is not None:
+            meta["article"] = article
+            meta["article_label"] = article_label
+        if clause is not None:
+            meta["clause"] = clause
+        if page is not None:
+            meta["page"] = page
+        return meta
+
+    def flush(carry: bool):
+        nonlocal parts, length, metadata
+        if not parts:
+            return
+        text = "\n\n".join(parts)
+        if end_page is not None and "page" in metadata:
+            metadata["page_end"] = end_page
+        chunks.append(Chunk(text, metadata))
+        # the overlap repeats the end of this chunk, so the next one starts where it was
+        tail = overlap_tail(text, overlap) if carry else ""
+        parts = [tail] if tail else []
+        length = len(tail)
+        metadata = position()
+
+    for text, block_page, heading in blocks:
+        if heading:
+            title = text[2:].strip()
+            number = chapter_number(title)
+            match = ARTICLE_REGEX.match(title) if number is None else None
+            if number is not None or match is not None:
+                flush(carry=False)
+                if number is not None:
+                    chapter, article, article_label, amends, paragraph, in_schedule = number, None, None, None, None, False
+                elif kind == "act" and in_schedule and int(match.group(1)) < article:
+                    paragraph = int(match.group(1))
+                else:
+                    article, article_label = int(match.group(1)), match.group(1) + match.group(2)
+                    in_schedule = kind == "act" and "schedule" in title.lower()
+                    paragraph = None
+                    if kind == "act":
+                        amended = AMENDS_REGEX.search(title)
+                        amends = (int(amended.group(1)), amended.group(1) + amended.group(2)) if amended else None
+                clause = None
+        else:
+            clause_match = CLAUSE_REGEX.match(text)
+            if clause_match is not None:
+                clause = int(clause_match.group(1))
+
+        for piece in split_long(text, chunk_size):
+            if parts and length + 2 + len(piece) > chunk_size:
+                flush(carry=True)
+                if parts and length + 2 + len(piece) > chunk_size:
+                    # shorten the overlap so a full-size piece still fits
+                    room = chunk_size - 2 - len(piece)
+                    tail = overlap_tail(parts[0], room) if room > 0 else ""
+                    parts = [tail] if tail else []
+                    length = len(tail)
+            if block_page is not None:
+                page = block_page
+            if not parts:
+                metadata = position()
+            parts.append(piece)
+            length += len(piece) + (2 if len(parts) > 1 else 0)
+            end_page = page
+
+        yield from chunks
+        chunks.clear()
+
+    flush(carry=False)
+    yield from chunks
+
+
+def split_structured_text(text: str) -> List[Chunk]:
+    return list(chunk_blocks(blocks_from_text(text)))
+
+
+def chunk_document(document: dict) -> List[Chunk]:
+    return list(chunk_blocks(blocks_from_docling(document)))
+
+
+def chunk_articles(chunks: list[str]) -> list[int | None]:
+    """Article number each chunk belongs to, from the `## N.` heading that opened its section.
+
+    Only needed for chunks stored before article numbers were kept as metadata.
+    """
+    heading_regex = re.compile(r"^##\s+(\d+)\. ")
+    articles = []
+    current = None
+    for chunk in chunks:
+        match = heading_regex.match(chunk)
+        if match:
+            current = int(match.group(1))
+        articles.append(current)
+    return articles
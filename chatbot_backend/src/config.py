@@ -1,10 +1,106 @@
 # config.py
 
+import os
 from pathlib import Path
 
 CHROMA_HOST = "vector-db"
 CHROMA_PORT = 8000
 COLLECTION_NAME = "uganda_law_and_land_docs"
 
+# keep-alive pool shared by every request to the vector db
+CHROMA_MAX_CONNECTIONS = int(os.getenv("CHROMA_MAX_CONNECTIONS", "32"))
+CHROMA_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("CHROMA_MAX_KEEPALIVE_CONNECTIONS", "16"))
+CHROMA_KEEPALIVE_SECS = float(os.getenv("CHROMA_KEEPALIVE_SECS", "60"))
+
 PDF_INPUT_DIR = Path("./documents/inputs")
 TEXT_OUTPUT_DIR = Path("./documents/outputs")
+
+# uploads are streamed to disk in chunks and rejected past this size
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_KB", "1024")) * 1024
+# a whole upload request, all of its files together; refused before the body is read
+MAX_UPLOAD_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_MB", "200")) * 1024 * 1024
+
+# Groq admission control: concurrent completions, queued waiters, and how long a waiter may queue
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_QUEUE_TIMEOUT_SECS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECS", "30"))
+
+# chat history sqlite store
+HISTORY_DB_PATH = Path(os.getenv("HISTORY_DB_PATH", "chat_history.db"))
+HISTORY_POOL_SIZE = int(os.getenv("HISTORY_POOL_SIZE", "4"))
+# most finished turns written by the history writer in one transaction
+HISTORY_WRITE_BATCH = int(os.getenv("HISTORY_WRITE_BATCH", "64"))
+
+# semantic answer cache
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+SEMANTIC_CACHE_TTL_SECS = float(os.getenv("SEMANTIC_CACHE_TTL_SECS", "86400"))
+
+# ingestion process pool; each worker keeps its own docling converter loaded
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+
+# chunks per embed/upsert round trip, capped by the server's max batch size
+INGESTION_BATCH_SIZE = int(os.getenv("INGESTION_BATCH_SIZE", "128"))
+CHECKPOINT_DIR = Path(os.getenv("CHECKPOINT_DIR", "./documents/checkpoints"))
+MANIFEST_DIR = Path(os.getenv("MANIFEST_DIR", "./documents/manifests"))
+CONVERSION_CACHE_DIR = Path(os.getenv("CONVERSION_CACHE_DIR", "./documents/conversion_cache"))
+
+# hybrid retrieval: candidates taken from each retriever before reciprocal-rank fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# prompt context assembly
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1800"))
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "8"))
+
+# conversation memory: verbatim turns kept in the prompt, older turns are summarized
+MEMORY_RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", "4"))
+MEMORY_MESSAGE_MAX_CHARS = int(os.getenv("MEMORY_MESSAGE_MAX_CHARS", "1500"))
+MEMORY_REWRITE_QUERIES = os.getenv("MEMORY_REWRITE_QUERIES", "1") == "1"
+
+# durable ingestion job queue, shared by the web app and the worker process
+JOBS_DB_PATH = Path(os.getenv("JOBS_DB_PATH", "./documents/jobs.db"))
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_SECS = float(os.getenv("JOB_RETRY_BASE_SECS", "10"))
+JOB_LEASE_SECS = float(os.getenv("JOB_LEASE_SECS", "300"))
+JOB_POLL_SECS = float(os.getenv("JOB_POLL_SECS", "1"))
+# run the worker loop inside the web process instead of a separate container
+JOB_WORKER_EMBEDDED = os.getenv("JOB_WORKER_EMBEDDED", "0") == "1"
+# how often the web app checks whether a worker changed the collection
+COLLECTION_POLL_SECS = float(os.getenv("COLLECTION_POLL_SECS", "5"))
+
+# batch question answering: questions per multi-query retrieval and concurrent LLM calls
+BATCH_QUERY_SIZE = int(os.getenv("BATCH_QUERY_SIZE", "32"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+
+# embedding model served in-process; "default" is chroma's ONNX all-MiniLM-L6-v2,
+# anything else is loaded with sentence-transformers. Bump the version to force re-embedding.
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "default")
+EMBEDDING_MODEL_VERSION = os.getenv("EMBEDDING_MODEL_VERSION", "1")
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+
+# optional cross-encoder reranking of retrieved chunks (needs sentence-transformers)
+RERANKER_ENABLED = os.getenv("RERANKER_ENABLED", "0") == "1"
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# candidates fetched for reranking; scoring goes RERANK_BATCH_SIZE at a time and stops early
+RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", "24"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "8"))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "4"))
+# chunks scoring this far (in logits) below the best one are left out of the prompt
+RERANK_SCORE_MARGIN = float(os.getenv("RERANK_SCORE_MARGIN", "4.0"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+
+# web processes (uvicorn/fastapi --workers); only one of them leads startup ingestion
+WEB_WORKERS = max(1, int(os.getenv("WEB_WORKERS", "1")))
+LEADER_LOCK_PATH = Path(os.getenv("LEADER_LOCK_PATH", "./documents/leader.lock"))
+LEADER_POLL_SECS = float(os.getenv("LEADER_POLL_SECS", "5"))
+# per-process metric snapshots that /metrics adds up when there are several web processes;
+# local to the container and cleared when it starts
+METRICS_DIR = Path(os.getenv("METRICS_DIR", "/tmp/chatbot_metrics"))
+METRICS_PUBLISH_SECS = float(os.getenv("METRICS_PUBLISH_SECS", "5"))
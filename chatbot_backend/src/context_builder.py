@@ -0,0 +1,117 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+from src.chunking import CHUNK_OVERLAP
+
+# shorter shared runs are more likely coincidence than splitter overlap
+MIN_OVERLAP = 20
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English legal text; good enough for budgeting
+    return math.ceil(len(text) / 4)
+
+
+def overlap_length(previous: str, following: str, max_overlap: int = CHUNK_OVERLAP * 2) -> int:
+    """Length of the longest suffix of `previous` that is also a prefix of `following`."""
+    limit = min(len(previous), len(following), max_overlap)
+    for size in range(limit, MIN_OVERLAP - 1, -1):
+        if previous.endswith(following[:size]):
+            return size
+    return 0
+
+
+class Segment:
+    __slots__ = ("source", "start", "end", "text", "rank")
+
+    def __init__(self, source: Optional[str], index: Optional[int], text: str, rank: int):
+        self.source = source
+        self.start = index
+        self.end = index
+        self.text = text
+        self.rank = rank
+
+
+class ContextBuilder:
+    """Turns ranked retrieval hits into a prompt context within a token budget.
+
+    Hits from the same source with consecutive chunk indices are merged into one
+    segment with the splitter overlap removed; segments are then added in order
+    of their best hit's rank until the budget is used up.
+    """
+
+    def __init__(self, token_budget: int):
+        self.token_budget = token_budget
+        self._stats = {"requests": 0, "tokens_in": 0, "tokens_out": 0, "tokens_saved": 0, "chunks_dropped": 0}
+
+    def _segments(self, documents: List[str], metadatas: List[dict]) -> List[Segment]:
+        seen = set()
+        hits: List[Segment] = []
+        for rank, (document, metadata) in enumerate(zip(documents, metadatas)):
+            if document in seen:
+                continue
+            seen.add(document)
+            metadata = metadata or {}
+            index = metadata.get("chunk_index")
+            hits.append(Segment(metadata.get("source_file"), None if index is None else int(index), document, rank))
+
+        # merge runs of consecutive chunks from the same source
+        positioned = sorted(
+            (hit for hit in hits if hit.start is not None),
+            key=lambda hit: (hit.source or "", hit.start)
+        )
+        merged: List[Segment] = []
+        for hit in positioned:
+            last = merged[-1] if merged else None
+            if last is not None and last.source == hit.source and hit.start == last.end + 1:
+                overlap = overlap_length(last.text, hit.text)
+                # chunks starting a new article carry no overlap; keep them a paragraph apart
+                last.text += hit.text[overlap:] if overlap else "\n\n" + hit.text
+                last.end = hit.start
+                last.rank = min(last.rank, hit.rank)
+            else:
+                merged.append(hit)
+        merged.extend(hit for hit in hits if hit.start is None)
+        return sorted(merged, key=lambda segment: segment.rank)
+
+    def build(self, documents: List[str], metadatas: List[dict]) -> Tuple[str, Dict[str, int]]:
+        naive_tokens = estimate_tokens("\n\n".join(documents))
+        parts: List[str] = []
+        used = 0
+        dropped = 0
+        for segment in self._segments(documents, metadatas):
+            tokens = estimate_tokens(segment.text)
+            if used + tokens > self.token_budget:
+                if not parts:
+                    # always give the model something: trim the best segment to fit
+                    parts.append(segment.text[: self.token_budget * 4])
+                    used = self.token_budget
+                dropped += 1
+                continue
+            parts.append(segment.text)
+            used += tokens
+
+        context = "\n\n".join(parts)
+        context_tokens = estimate_tokens(context)
+        stats = {
+            "chunks": len(documents),
+            "segments": len(parts),
+            "dropped_segments": dropped,
+            "naive_tokens": naive_tokens,
+            "context_tokens": context_tokens,
+            "tokens_saved": max(naive_tokens - context_tokens, 0),
+        }
+        self._stats["requests"] += 1
+        self._stats["tokens_in"] += naive_tokens
+        self._stats["tokens_out"] += context_tokens
+        self._stats["tokens_saved"] += stats["tokens_saved"]
+        self._stats["chunks_dropped"] += dropped
+        return context, stats
+
+    def stats(self) -> dict:
+        requests = self._stats["requests"]
+        return {
+            **self._stats,
+            "token_budget": self.token_budget,
+            "mean_tokens_saved": self._stats["tokens_saved"] / requests if requests else 0.0,
+        }
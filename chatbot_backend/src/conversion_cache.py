@@ -0,0 +1,65 @@
+# Content-addressed cache of docling output, keyed on the PDF's SHA-256 and the
+# docling version that produced it. Imported by the ingestion workers, so it
+# must stay free of chromadb/fastapi imports.
+import json
+import time
+from functools import lru_cache
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Optional
+
+from src.config import CONVERSION_CACHE_DIR
+
+
+@lru_cache(maxsize=1)
+def converter_version() -> str:
+    try:
+        return f"docling-{version('docling')}"
+    except PackageNotFoundError:
+        return "docling-unknown"
+
+
+def entry_dir(file_hash: str) -> Path:
+    return CONVERSION_CACHE_DIR / f"{file_hash}-{converter_version()}"
+
+
+def has(file_hash: str) -> bool:
+    """Whether the current converter version has a complete entry for this PDF."""
+    return (entry_dir(file_hash) / "meta.json").exists()
+
+
+def load_text(file_hash: str) -> Optional[str]:
+    text_path = entry_dir(file_hash) / "text.txt"
+    if not text_path.exists():
+        return None
+    return text_path.read_text(encoding="utf-8")
+
+
+def load_document(file_hash: str) -> Optional[dict]:
+    """Docling's structured output (export_to_dict) for a PDF, if cached."""
+    document_path = entry_dir(file_hash) / "document.json"
+    if not document_path.exists():
+        return None
+    return json.loads(document_path.read_text(encoding="utf-8"))
+
+
+def save(file_hash: str, source_file: str, document: dict, text: str):
+    directory = entry_dir(file_hash)
+    tmp_dir = directory.with_name(directory.name + ".tmp")
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    (tmp_dir / "document.json").write_text(json.dumps(document), encoding="utf-8")
+    (tmp_dir / "text.txt").write_text(text, encoding="utf-8")
+    (tmp_dir / "meta.json").write_text(json.dumps({
+        "file_hash": file_hash,
+        "source_file": source_file,
+        "converter_version": converter_version(),
+        "created_at": time.time(),
+    }))
+    # publish the entry atomically so readers never see a half-written cache
+    if directory.exists():
+        for path in tmp_dir.iterdir():
+            path.replace(directory / path.name)
+        tmp_dir.rmdir()
+    else:
+        tmp_dir.rename(directory)
+
@@ -0,0 +1,178 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.logging_config import get_logger
+from src.config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_MODEL_VERSION,
+    EMBEDDING_BATCH_WINDOW_MS,
+    EMBEDDING_MAX_BATCH,
+    EMBEDDING_CACHE_SIZE
+)
+
+logger = get_logger("embeddings")
+
+Vector = List[float]
+
+
+def load_embedding_function(model_name: str):
+    if model_name == "default":
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+        return DefaultEmbeddingFunction()
+    # optional dependency, only needed for non-default models
+    from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+    return SentenceTransformerEmbeddingFunction(model_name=model_name)
+
+
+class EmbeddingService:
+    """The one embedding model of the backend, loaded once per process.
+
+    Query embeddings requested within `window` seconds of each other are
+    computed in a single model call, and identical questions share one
+    in-flight computation. Question vectors are kept in an LRU cache so the
+    semantic cache and retrieval never embed the same question twice.
+    Document batches for ingestion go straight to the model, uncached.
+    """
+
+    def __init__(self, model_name: str, version: str, window: float, max_batch: int, cache_size: int):
+        self.model_name = model_name
+        self.version = f"{model_name}@{version}"
+        self.window = window
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self._function = None
+        self._load_lock = threading.Lock()
+        self._cache: "OrderedDict[str, Vector]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._batches: Set[asyncio.Task] = set()
+        self._stats = {
+            "queries": 0,
+            "cache_hits": 0,
+            "coalesced": 0,
+            "query_batches": 0,
+            "query_batch_items": 0,
+            "document_batches": 0,
+            "documents": 0,
+            "model_seconds": 0.0,
+            "errors": 0,
+        }
+
+    def use(self, function, version: str):
+        """Swap in an already-built embedding function, e.g. the offline one used by benchmarks."""
+        self._function = function
+        self.version = version
+        self._cache.clear()
+
+    def _load_function(self):
+        started = time.perf_counter()
+        self._function = load_embedding_function(self.model_name)
+        logger.info("Embedding model loaded", extra={"model": self.version, "seconds": round(time.perf_counter() - started, 2)})
+
+    def _embed_sync(self, texts: List[str]) -> List[Vector]:
+        if self._function is None:
+            # the background warm-up and an early request may both get here
+            with self._load_lock:
+                if self._function is None:
+                    self._load_function()
+        started = time.perf_counter()
+        vectors = [list(map(float, vector)) for vector in self._function(texts)]
+        self._stats["model_seconds"] += time.perf_counter() - started
+        return vectors
+
+    async def load(self):
+        """Load the model and run it once so the first request doesn't pay for it."""
+        await asyncio.to_thread(self._embed_sync, ["warm up"])
+
+    def _remember(self, key: str, vector: Vector):
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def embed_query(self, text: str) -> Vector:
+        self._stats["queries"] += 1
+        key = text.strip()
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
+            self._stats["cache_hits"] += 1
+            return vector
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self._stats["coalesced"] += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            self._pending.append((key, future))
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+        # shield: one caller going away must not cancel the vector for the others
+        return await asyncio.shield(future)
+
+    async def embed_queries(self, texts: List[str]) -> List[Vector]:
+        return list(await asyncio.gather(*(self.embed_query(text) for text in texts)))
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        self._stats["query_batches"] += 1
+        self._stats["query_batch_items"] += len(batch)
+        try:
+            vectors = await asyncio.to_thread(self._embed_sync, [key for key, _ in batch])
+        except Exception as e:
+            self._stats["errors"] += 1
+            for key, future in batch:
+                self._in_flight.pop(key, None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (key, future), vector in zip(batch, vectors):
+            self._in_flight.pop(key, None)
+            self._remember(key, vector)
+            if not future.done():
+                future.set_result(vector)
+
+    async def embed_documents(self, texts: List[str]) -> List[Vector]:
+        self._stats["document_batches"] += 1
+        self._stats["documents"] += len(texts)
+        return await asyncio.to_thread(self._embed_sync, texts)
+
+    def stats(self) -> dict:
+        batches = self._stats["query_batches"]
+        queries = self._stats["queries"]
+        return {
+            **self._stats,
+            "model_seconds": round(self._stats["model_seconds"], 3),
+            "model": self.version,
+            "loaded": self._function is not None,
+            "cache_entries": len(self._cache),
+            "cache_hit_rate": round(self._stats["cache_hits"] / queries, 4) if queries else None,
+            "avg_query_batch": round(self._stats["query_batch_items"] / batches, 2) if batches else None,
+            "window_ms": self.window * 1000,
+        }
+
+
+embedding_service = EmbeddingService(
+    EMBEDDING_MODEL,
+    EMBEDDING_MODEL_VERSION,
+    EMBEDDING_BATCH_WINDOW_MS / 1000,
+    EMBEDDING_MAX_BATCH,
+    EMBEDDING_CACHE_SIZE
+)
+
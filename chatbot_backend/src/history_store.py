@@ -0,0 +1,434 @@
+import asyncio
+import base64
+import json
+import queue
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA foreign_keys=ON",
+)
+
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS chat_history (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        chat_id TEXT NOT NULL,
+        role TEXT NOT NULL CHECK(role IN ('system', 'human', 'ai')),
+        message TEXT NOT NULL,
+        timestamp TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_user_chat ON chat_history(user_id, chat_id)
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chat_memory (
+        user_id TEXT NOT NULL,
+        chat_id TEXT NOT NULL,
+        summary TEXT NOT NULL,
+        summarized_turns INTEGER NOT NULL,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (user_id, chat_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chats (
+        user_id TEXT NOT NULL,
+        chat_id TEXT NOT NULL,
+        title TEXT NOT NULL,
+        message_count INTEGER NOT NULL,
+        created_at TEXT NOT NULL,
+        last_activity TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        PRIMARY KEY (user_id, chat_id)
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_chats_activity ON chats(user_id, last_activity DESC, chat_id DESC)
+    ''',
+)
+
+TITLE_MAX_CHARS = 80
+
+# chats written before the summary table existed
+BACKFILL_CHATS = '''
+    INSERT OR IGNORE INTO chats (user_id, chat_id, title, message_count, created_at, last_activity, version)
+    SELECT
+        user_id,
+        chat_id,
+        COALESCE(
+            (SELECT substr(first.message, 1, ?) FROM chat_history AS first
+             WHERE first.user_id = history.user_id AND first.chat_id = history.chat_id AND first.role = 'human'
+             ORDER BY first.rowid LIMIT 1),
+            'New chat'
+        ),
+        COUNT(*),
+        MIN(timestamp),
+        MAX(timestamp),
+        1
+    FROM chat_history AS history
+    GROUP BY user_id, chat_id
+'''
+
+
+def encode_cursor(position) -> Optional[str]:
+    """Opaque keyset cursor for API responses."""
+    if position is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+
+class HistoryStore:
+    """Pooled WAL-mode SQLite store for chat history.
+
+    Queries run on a small thread pool so the event loop never blocks on disk,
+    and each worker thread borrows a long-lived connection from the pool.
+    """
+
+    def __init__(self, db_path: Path, pool_size: int = 4):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._created = 0
+        self._create_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        if self._created == 0:
+            # other web worker processes may be setting up the same file right now
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                has_chats = conn.execute(
+                    '''SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chats' '''
+                ).fetchone()
+                for statement in SCHEMA:
+                    conn.execute(statement)
+                if has_chats is None:
+                    conn.execute(BACKFILL_CHATS, (TITLE_MAX_CHARS,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._create_lock:
+                if self._created < self.pool_size:
+                    conn = self._open()
+                    self._created += 1
+                else:
+                    conn = None
+            if conn is None:
+                conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="history")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        self._created = 0
+
+    # --- sync queries, executed on the pool threads ---
+
+    def _insert_turn(
+        self,
+        conn: sqlite3.Connection,
+        user_id: str,
+        chat_id: str,
+        messages: List[Tuple[str, str, str]],
+        system_prompt: Optional[str]
+    ):
+        if system_prompt is not None:
+            exists = conn.execute(
+                '''SELECT 1 FROM chat_history WHERE user_id = ? AND chat_id = ? LIMIT 1''',
+                (user_id, chat_id)
+            ).fetchone()
+            if exists is None:
+                timestamp = messages[0][2] if messages else datetime.now().isoformat()
+                messages = [("system", system_prompt, timestamp)] + list(messages)
+        conn.executemany(
+            '''INSERT INTO chat_history (id, user_id, chat_id, role, message, timestamp)
+               VALUES (?, ?, ?, ?, ?, ?)''',
+            [
+                (str(uuid.uuid4()), user_id, chat_id, role, message, timestamp)
+                for role, message, timestamp in messages
+            ]
+        )
+        if messages:
+            title = next((message for role, message, _ in messages if role == "human"), "New chat")
+            conn.execute(
+                '''INSERT INTO chats (user_id, chat_id, title, message_count, created_at, last_activity, version)
+                   VALUES (?, ?, ?, ?, ?, ?, 1)
+                   ON CONFLICT(user_id, chat_id) DO UPDATE SET
+                       message_count = message_count + excluded.message_count,
+                       last_activity = excluded.last_activity,
+                       version = version + 1''',
+                (
+                    user_id,
+                    chat_id,
+                    title[:TITLE_MAX_CHARS],
+                    len(messages),
+                    messages[0][2],
+                    messages[-1][2]
+                )
+            )
+
+    def _save_turn(self, user_id: str, chat_id: str, messages: List[Tuple[str, str, str]], system_prompt: Optional[str]):
+        with self.transaction() as conn:
+            self._insert_turn(conn, user_id, chat_id, messages, system_prompt)
+
+    def _save_turns(self, turns: List[Tuple[str, str, List[Tuple[str, str, str]]]], system_prompt: Optional[str]):
+        with self.transaction() as conn:
+            for user_id, chat_id, messages in turns:
+                self._insert_turn(conn, user_id, chat_id, messages, system_prompt)
+
+    def _get_chat_history(
+        self,
+        user_id: str,
+        chat_id: str,
+        limit: int,
+        after: Optional[int] = None
+    ) -> Tuple[List[Dict], Optional[int]]:
+        """One page of messages in insertion order, and the cursor for the next page."""
+        with self.connection() as conn:
+            cursor = conn.execute(
+                '''SELECT rowid, role, message, timestamp FROM chat_history
+                   WHERE user_id = ? AND chat_id = ? AND rowid > ?
+                   ORDER BY rowid ASC
+                   LIMIT ?''',
+                (user_id, chat_id, after or 0, limit + 1)
+            )
+            rows = cursor.fetchall()
+        page = rows[:limit]
+        next_cursor = page[-1][0] if len(rows) > limit else None
+        return [
+            {"role": row[1], "message": row[2], "timestamp": row[3]}
+            for row in page
+        ], next_cursor
+
+    def _get_chat_version(self, user_id: str, chat_id: str) -> Optional[Tuple[str, int]]:
+        with self.connection() as conn:
+            row = conn.execute(
+                '''SELECT created_at, version FROM chats WHERE user_id = ? AND chat_id = ?''',
+                (user_id, chat_id)
+            ).fetchone()
+            return (row[0], row[1]) if row else None
+
+    def _list_user_chats(
+        self,
+        user_id: str,
+        limit: int,
+        before: Optional[Tuple[str, str]] = None
+    ) -> Tuple[List[Dict], Optional[Tuple[str, str]]]:
+        """Chats by most recent activity; `before` is the (last_activity, chat_id) of the previous page's last chat."""
+        with self.connection() as conn:
+            if before is None:
+                rows = conn.execute(
+                    '''SELECT chat_id, title, message_count, created_at, last_activity, version FROM chats
+                       WHERE user_id = ?
+                       ORDER BY last_activity DESC, chat_id DESC
+                       LIMIT ?''',
+                    (user_id, limit + 1)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    '''SELECT chat_id, title, message_count, created_at, last_activity, version FROM chats
+                       WHERE user_id = ? AND (last_activity, chat_id) < (?, ?)
+                       ORDER BY last_activity DESC, chat_id DESC
+                       LIMIT ?''',
+                    (user_id, before[0], before[1], limit + 1)
+                ).fetchall()
+        page = rows[:limit]
+        next_cursor = (page[-1][4], page[-1][0]) if len(rows) > limit else None
+        return [
+            {
+                "chat_id": row[0],
+                "title": row[1],
+                "message_count": row[2],
+                "created_at": row[3],
+                "last_activity": row[4],
+                "version": row[5],
+            }
+            for row in page
+        ], next_cursor
+
+    def _delete_chat(self, user_id: str, chat_id: str):
+        with self.transaction() as conn:
+            conn.execute(
+                '''DELETE FROM chat_history WHERE user_id = ? AND chat_id = ?''',
+                (user_id, chat_id)
+            )
+            conn.execute(
+                '''DELETE FROM chat_memory WHERE user_id = ? AND chat_id = ?''',
+                (user_id, chat_id)
+            )
+            conn.execute(
+                '''DELETE FROM chats WHERE user_id = ? AND chat_id = ?''',
+                (user_id, chat_id)
+            )
+
+    def _load_memory(self, user_id: str, chat_id: str, recent_turns: int) -> Dict:
+        with self.connection() as conn:
+            memory = conn.execute(
+                '''SELECT summary, summarized_turns FROM chat_memory WHERE user_id = ? AND chat_id = ?''',
+                (user_id, chat_id)
+            ).fetchone()
+            total_turns = conn.execute(
+                '''SELECT COUNT(*) FROM chat_history WHERE user_id = ? AND chat_id = ? AND role = 'human' ''',
+                (user_id, chat_id)
+            ).fetchone()[0]
+            rows = conn.execute(
+                '''SELECT role, message FROM chat_history
+                   WHERE user_id = ? AND chat_id = ? AND role IN ('human', 'ai')
+                   ORDER BY rowid DESC
+                   LIMIT ?''',
+                (user_id, chat_id, recent_turns * 2)
+            ).fetchall()
+        return {
+            "summary": memory[0] if memory else "",
+            "summarized_turns": memory[1] if memory else 0,
+            "total_turns": total_turns,
+            "recent": [(role, message) for role, message in reversed(rows)],
+        }
+
+    def _get_turn_messages(self, user_id: str, chat_id: str, start_turn: int, end_turn: int) -> List[Tuple[str, str]]:
+        # turns are stored as human/ai pairs, so turn n starts at message 2n
+        with self.connection() as conn:
+            rows = conn.execute(
+                '''SELECT role, message FROM chat_history
+                   WHERE user_id = ? AND chat_id = ? AND role IN ('human', 'ai')
+                   ORDER BY rowid ASC
+                   LIMIT ? OFFSET ?''',
+                (user_id, chat_id, (end_turn - start_turn) * 2, start_turn * 2)
+            ).fetchall()
+        return [(role, message) for role, message in rows]
+
+    def _save_memory(self, user_id: str, chat_id: str, summary: str, summarized_turns: int):
+        with self.transaction() as conn:
+            conn.execute(
+                '''INSERT INTO chat_memory (user_id, chat_id, summary, summarized_turns, updated_at)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(user_id, chat_id) DO UPDATE SET
+                       summary = excluded.summary,
+                       summarized_turns = excluded.summarized_turns,
+                       updated_at = excluded.updated_at''',
+                (user_id, chat_id, summary, summarized_turns, datetime.now().isoformat())
+            )
+
+    # --- async API ---
+
+    async def save_turn(
+        self,
+        user_id: str,
+        chat_id: str,
+        messages: List[Tuple[str, str, str]],
+        system_prompt: Optional[str] = None
+    ):
+        """Write a turn's (role, message, timestamp) rows in one transaction.
+
+        When `system_prompt` is given it is prepended if the chat has no rows yet.
+        """
+        await self.run(self._save_turn, user_id, chat_id, messages, system_prompt)
+
+    async def save_turns(
+        self,
+        turns: List[Tuple[str, str, List[Tuple[str, str, str]]]],
+        system_prompt: Optional[str] = None
+    ):
+        """`save_turn` for many (user_id, chat_id, messages) turns in a single transaction."""
+        await self.run(self._save_turns, turns, system_prompt)
+
+    async def get_chat_history(
+        self,
+        user_id: str,
+        chat_id: str,
+        limit: int,
+        after: Optional[int] = None
+    ) -> Tuple[List[Dict], Optional[int]]:
+        return await self.run(self._get_chat_history, user_id, chat_id, limit, after)
+
+    async def get_chat_version(self, user_id: str, chat_id: str) -> Optional[Tuple[str, int]]:
+        """(created_at, version) of a chat, None when it does not exist.
+
+        The version is bumped on every write but starts over when a deleted
+        chat id is reused, so only the pair identifies a state of the chat.
+        """
+        return await self.run(self._get_chat_version, user_id, chat_id)
+
+    async def list_user_chats(
+        self,
+        user_id: str,
+        limit: int,
+        before: Optional[Tuple[str, str]] = None
+    ) -> Tuple[List[Dict], Optional[Tuple[str, str]]]:
+        return await self.run(self._list_user_chats, user_id, limit, before)
+
+    async def delete_chat(self, user_id: str, chat_id: str):
+        await self.run(self._delete_chat, user_id, chat_id)
+
+    async def load_memory(self, user_id: str, chat_id: str, recent_turns: int) -> Dict:
+        """Rolling summary, turn counts and the last `recent_turns` turns of a chat."""
+        return await self.run(self._load_memory, user_id, chat_id, recent_turns)
+
+    async def get_turn_messages(self, user_id: str, chat_id: str, start_turn: int, end_turn: int) -> List[Tuple[str, str]]:
+        return await self.run(self._get_turn_messages, user_id, chat_id, start_turn, end_turn)
+
+    async def save_memory(self, user_id: str, chat_id: str, summary: str, summarized_turns: int):
+        await self.run(self._save_memory, user_id, chat_id, summary, summarized_turns)
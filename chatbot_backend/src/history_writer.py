@@ -0,0 +1,104 @@
+import asyncio
+import contextvars
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.history_store import HistoryStore
+from src.logging_config import get_logger
+from src.metrics import CHAT_STAGE_SECONDS
+
+logger = get_logger("history_writer")
+
+ChatKey = Tuple[str, str]
+
+
+class HistoryWriter:
+    """Batched persistence of finished chat turns.
+
+    Turns are queued and written by one background task, everything queued so
+    far in a single transaction, so concurrent chats share their commits. The
+    queue lives in this process only, so the chat endpoints wait for their
+    turn's future before the response completes; otherwise a history read
+    served by another web worker could miss the turn. A turn cut short by a
+    disconnect is queued without waiting. Anything here that reads a chat
+    first waits for that chat's queued turns (`wait`), and `shutdown` writes
+    out whatever is left.
+    """
+
+    def __init__(
+        self,
+        store: HistoryStore,
+        system_prompt: Optional[str],
+        max_batch: int,
+        on_saved: Optional[Callable[[str, str], None]] = None
+    ):
+        self.store = store
+        self.system_prompt = system_prompt
+        self.max_batch = max_batch
+        self.on_saved = on_saved
+        self._queue: List[Tuple[str, str, List[Tuple[str, str, str]], asyncio.Future]] = []
+        # the future of the latest queued turn of each chat
+        self._pending: Dict[ChatKey, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"queued": 0, "written": 0, "batches": 0, "failed": 0, "largest_batch": 0}
+
+    def submit(self, user_id: str, chat_id: str, messages: List[Tuple[str, str, str]]) -> asyncio.Future:
+        """Queue a turn's (role, message, timestamp) rows; the future resolves to whether they were stored."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((user_id, chat_id, messages, future))
+        self._pending[(user_id, chat_id)] = future
+        self._stats["queued"] += 1
+        if self._task is None:
+            # a fresh context keeps the writes out of the submitting request's spans
+            self._task = asyncio.create_task(self._drain(), context=contextvars.Context())
+        return future
+
+    async def wait(self, user_id: str, chat_id: Optional[str] = None):
+        """Return once the queued turns of a chat, or of all a user's chats, are stored."""
+        futures = [
+            future for (user, chat), future in self._pending.items()
+            if user == user_id and (chat_id is None or chat == chat_id)
+        ]
+        if futures:
+            # shielded so a cancelled reader doesn't cancel the write
+            await asyncio.shield(asyncio.gather(*futures))
+
+    async def _write(self, batch: list) -> List[bool]:
+        turns = [(user_id, chat_id, messages) for user_id, chat_id, messages, _ in batch]
+        try:
+            await self.store.save_turns(turns, system_prompt=self.system_prompt)
+            return [True] * len(batch)
+        except Exception:
+            if len(batch) == 1:
+                logger.exception("Failed to store chat turn", extra={"chat_id": batch[0][1]})
+                return [False]
+        # one bad turn shouldn't lose the rest of the batch
+        return [(await self._write([item]))[0] for item in batch]
+
+    async def _drain(self):
+        try:
+            while self._queue:
+                batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+                started = time.perf_counter()
+                stored = await self._write(batch)
+                CHAT_STAGE_SECONDS.observe(time.perf_counter() - started, stage="history_write_behind")
+                self._stats["batches"] += 1
+                self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+                for (user_id, chat_id, _, future), ok in zip(batch, stored):
+                    self._stats["written" if ok else "failed"] += 1
+                    future.set_result(ok)
+                    if self._pending.get((user_id, chat_id)) is future:
+                        del self._pending[(user_id, chat_id)]
+                    if ok and self.on_saved is not None:
+                        self.on_saved(user_id, chat_id)
+        finally:
+            self._task = None
+
+    async def shutdown(self):
+        """Store everything still queued."""
+        while self._task is not None:
+            await self._task
+        logger.info("History writer flushed", extra=self.stats())
+
+    def stats(self) -> dict:
+        return {**self._stats, "backlog": len(self._queue), "chats_pending": len(self._pending)}
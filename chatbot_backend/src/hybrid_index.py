@@ -0,0 +1,166 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.chunking import chapter_number
+
+TOKEN_REGEX = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by does for from has have how in is it of on or say says "
+    "shall that the their this to was what when where which who will with".split()
+)
+# "Article 102", "art. 102"; section numbers belong to a single Act, so they are not references
+REFERENCE_REGEX = re.compile(r"\b(?:articles?|art\.)\s*(\d+)\b", flags=re.IGNORECASE)
+
+# "chapter 4", "Chapter Four"
+CHAPTER_REFERENCE_REGEX = re.compile(r"\bchapter\s+(?:\d+|[a-z]+)\b", flags=re.IGNORECASE)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_REGEX.findall(text.lower()) if token not in STOPWORDS]
+
+
+def parse_references(question: str) -> List[int]:
+    return [int(number) for number in REFERENCE_REGEX.findall(question)]
+
+
+def parse_chapters(question: str) -> Set[int]:
+    chapters = {chapter_number(match) for match in CHAPTER_REFERENCE_REGEX.findall(question)}
+    chapters.discard(None)
+    return chapters
+
+
+def parse_scope(question: str) -> Dict[str, int]:
+    """Metadata filters implied by the question, e.g. {"chapter": 4} for "... in chapter four"."""
+    chapters = parse_chapters(question)
+    return {"chapter": chapters.pop()} if len(chapters) == 1 else {}
+
+
+def matches(metadata: dict, filters: Optional[dict]) -> bool:
+    return not filters or all(metadata.get(key) == value for key, value in filters.items())
+
+
+class IndexContents:
+    """The chunks, postings and article lookups of one version of the index.
+
+    Filled once by `add` before it is published and never changed after, so
+    a search running in a worker thread can't see it change under it.
+    """
+
+    def __init__(self):
+        self.documents: Dict[str, str] = {}
+        self.metadatas: Dict[str, dict] = {}
+        self.lengths: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.articles: Dict[int, set] = defaultdict(set)
+        self.amendments: Dict[int, set] = defaultdict(set)
+        self.total_length = 0
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[dict]):
+        for id_, document, metadata in zip(ids, documents, metadatas):
+            if id_ in self.documents:
+                continue
+            counts = Counter(tokenize(document))
+            for term, count in counts.items():
+                self.postings[term][id_] = count
+            length = sum(counts.values())
+            self.documents[id_] = document
+            self.metadatas[id_] = metadata
+            self.lengths[id_] = length
+            self.total_length += length
+            # only Constitution chunks are articles; Act sections count for the article they amend
+            if metadata.get("document_kind") == "constitution" and metadata.get("article") is not None:
+                self.articles[int(metadata["article"])].add(id_)
+            if metadata.get("amends_article") is not None:
+                self.amendments[int(metadata["amends_article"])].add(id_)
+
+
+class HybridIndex:
+    """In-process BM25 inverted index plus an article number -> chunk id lookup.
+
+    Mirrors the chunks written to Chroma so lexical and exact-reference queries
+    can be answered without a vector round trip. Only Constitution chunks are
+    indexed by article; sections of amendment Acts are indexed by the article
+    they amend. Searches run in worker threads, so the contents are never
+    modified in place: `load` builds new contents off to the side and swaps
+    them in with one assignment, and every read works on the contents it
+    started with.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.loaded = False
+        self._contents = IndexContents()
+
+    def __len__(self) -> int:
+        return len(self._contents.documents)
+
+    def load(self, ids: List[str], documents: List[str], metadatas: List[dict]):
+        """Replace the whole index with these chunks."""
+        contents = IndexContents()
+        contents.add(ids, documents, metadatas)
+        self._contents = contents
+        self.loaded = True
+
+    def clear(self):
+        self._contents = IndexContents()
+
+    def search(self, query: str, limit: int, filters: Optional[dict] = None) -> List[Tuple[str, float]]:
+        contents = self._contents
+        if not contents.documents:
+            return []
+        total = len(contents.documents)
+        average_length = contents.total_length / total if total else 0.0
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = contents.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for id_, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * contents.lengths[id_] / (average_length or 1.0))
+                scores[id_] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        if filters:
+            scores = {id_: score for id_, score in scores.items() if matches(contents.metadatas[id_], filters)}
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def lookup_articles(self, articles: List[int]) -> List[str]:
+        """Chunks of the given Constitution articles, then the Act sections amending them."""
+        contents = self._contents
+        ids = []
+        for index in (contents.articles, contents.amendments):
+            for article in articles:
+                ids.extend(sorted(
+                    index.get(article, ()),
+                    key=lambda id_: (contents.metadatas[id_].get("source_file", ""), contents.metadatas[id_].get("chunk_index", 0))
+                ))
+        return ids
+
+    def get(self, id_: str) -> Optional[Tuple[str, dict]]:
+        contents = self._contents
+        if id_ not in contents.documents:
+            return None
+        return contents.documents[id_], contents.metadatas[id_]
+
+    def stats(self) -> dict:
+        contents = self._contents
+        return {
+            "loaded": self.loaded,
+            "chunks": len(contents.documents),
+            "terms": len(contents.postings),
+            "articles": sum(1 for ids in contents.articles.values() if ids),
+            "amended_articles": sum(1 for ids in contents.amendments.values() if ids),
+        }
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int) -> List[Tuple[str, float]]:
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking):
+            scores[id_] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+hybrid_index = HybridIndex()
@@ -0,0 +1,167 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from src.chroma_handler import chroma, compute_file_hash, store_chunks
+from src.config import INGESTION_WORKERS, PDF_INPUT_DIR, TEXT_OUTPUT_DIR
+from src.ingestion_state import clear_all, list_manifests, source_name
+from src.ingestion_worker import init_worker, convert_and_split, split_cached
+from src import conversion_cache
+from src.logging_config import get_logger
+from src.metrics import ingestion_span
+
+logger = get_logger("ingestion")
+
+STATUSES = ("queued", "converting", "embedding", "done", "failed")
+
+
+class IngestionPipeline:
+    """Runs PDF conversion and chunking in a process pool.
+
+    Workers are started once and keep their docling converter loaded, so
+    independent PDFs convert in parallel without blocking the event loop.
+    Progress for every file seen since startup is kept in `files`. The job
+    worker drives it; the web process only enqueues jobs.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.files: Dict[str, dict] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+            )
+        return self._executor
+
+    def _update(self, source_file: str, status: str, **fields) -> dict:
+        entry = self.files.setdefault(source_file, {"file": source_file, "queued_at": time.time()})
+        entry["status"] = status
+        entry.update(fields)
+        return entry
+
+    async def ingest(
+        self,
+        file_path: Path,
+        doc_hash: str,
+        on_update: Optional[Callable[[dict], Awaitable[None]]] = None
+    ) -> dict:
+        """Convert, chunk and store one PDF; failures are re-raised so the job can be retried."""
+        started = time.time()
+        source_file = await asyncio.to_thread(source_name, file_path)
+
+        async def update(status: str, **fields):
+            entry = self._update(source_file, status, **fields)
+            if on_update is not None:
+                await on_update(dict(entry))
+
+        try:
+            await update("converting", started_at=started)
+            loop = asyncio.get_running_loop()
+            with ingestion_span("convert"):
+                extracted_text, chunks, cached = await loop.run_in_executor(
+                    self._pool(), convert_and_split, str(file_path), doc_hash, source_file
+                )
+            if cached:
+                logger.info("Reused cached conversion", extra={"file": source_file})
+
+            TEXT_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+            output_path = TEXT_OUTPUT_DIR / f"{Path(source_file).stem}.txt"
+            await asyncio.to_thread(output_path.write_text, extracted_text, encoding="utf-8")
+
+            await update("embedding", chunks=len(chunks), conversion_cached=cached)
+            with ingestion_span("store"):
+                changes = await store_chunks(source_file, doc_hash, chunks)
+            await update("done", finished_at=time.time(), seconds=round(time.time() - started, 2), **changes)
+            logger.info("Embedding complete", extra={"file": source_file, "path": file_path.name, "seconds": round(time.time() - started, 2)})
+            return {"chunks": len(chunks), "conversion_cached": cached, **changes}
+
+        except Exception as e:
+            self._update(source_file, "failed", finished_at=time.time(), error=str(e))
+            logger.exception("Failed embedding", extra={"file": source_file, "path": file_path.name})
+            raise
+
+    @staticmethod
+    def _rebuild_plan(directory: Path) -> Dict[str, dict]:
+        """The current version of every ingested or waiting document, by source name."""
+        documents = {
+            manifest["source_file"]: {"file_hash": manifest["file_hash"], "path": None}
+            for manifest in list_manifests()
+        }
+        # a PDF on disk is newer than its manifest, or was never ingested at all
+        for path in sorted(directory.glob("*.pdf")):
+            documents[source_name(path)] = {"file_hash": compute_file_hash(path), "path": path}
+        for document in documents.values():
+            document["cached"] = conversion_cache.has(document["file_hash"])
+        return documents
+
+    async def rebuild_from_cache(self, directory: Path = PDF_INPUT_DIR) -> dict:
+        """Recreate the collection, restoring documents from their cached conversions.
+
+        Documents without a cache entry for the current docling version (e.g.
+        ingested before the cache existed, or after a docling upgrade) come back
+        in `needs_ingest` with their PDF, for the caller to queue a full ingest.
+        If any of them has no PDF either, nothing is dropped and they are
+        reported in `missing` instead.
+        """
+        documents = await asyncio.to_thread(self._rebuild_plan, directory)
+        missing = sorted(source for source, document in documents.items() if not document["cached"] and document["path"] is None)
+        if missing:
+            logger.warning("Refusing to rebuild, documents have neither a cached conversion nor a PDF", extra={"missing": missing})
+            return {"rebuilt": False, "missing": missing}
+
+        entries = [{"source_file": source, **document} for source, document in documents.items() if document["cached"]]
+        needs_ingest = [document["path"] for document in documents.values() if not document["cached"]]
+        logger.info("Rebuilding collection from conversion cache", extra={"documents": len(entries), "needs_ingest": len(needs_ingest)})
+        await chroma.recreate_collection()
+        await asyncio.to_thread(clear_all)
+
+        async def rebuild(entry: dict):
+            source = entry["source_file"]
+            started = time.time()
+            try:
+                self._update(source, "embedding", started_at=started, conversion_cached=True)
+                loop = asyncio.get_running_loop()
+                chunks = await loop.run_in_executor(self._pool(), split_cached, entry["file_hash"])
+                changes = await store_chunks(source, entry["file_hash"], chunks)
+                self._update(source, "done", finished_at=time.time(), seconds=round(time.time() - started, 2), chunks=len(chunks), **changes)
+            except Exception as e:
+                self._update(source, "failed", finished_at=time.time(), error=str(e))
+                logger.exception("Failed rebuilding", extra={"file": source})
+
+        await asyncio.gather(*(rebuild(entry) for entry in entries))
+        return {
+            "rebuilt": True,
+            "documents": len(entries),
+            "needs_ingest": [str(path) for path in needs_ingest],
+            "converter_version": conversion_cache.converter_version(),
+        }
+
+    async def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def status(self) -> dict:
+        counts = {status: 0 for status in STATUSES}
+        for entry in self.files.values():
+            counts[entry["status"]] += 1
+        pending = sum(counts[s] for s in ("queued", "converting", "embedding"))
+        return {
+            "workers": self.workers,
+            "total": len(self.files),
+            "pending": pending,
+            "counts": counts,
+            "files": sorted(self.files.values(), key=lambda entry: entry["queued_at"]),
+        }
+
+
+pipeline = IngestionPipeline(INGESTION_WORKERS)
+
@@ -0,0 +1,126 @@
+import json
+import time
+from pathlib import Path
+from typing import List, Optional, Set
+
+from src.config import CHECKPOINT_DIR, MANIFEST_DIR
+
+
+def _write_json(path: Path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(data))
+    tmp_path.replace(path)
+
+
+def checkpoint_path(doc_hash: str) -> Path:
+    return CHECKPOINT_DIR / f"{doc_hash}.json"
+
+
+def load_checkpoint(doc_hash: str) -> Set[str]:
+    """Chunk ids already upserted by an unfinished ingestion of this document."""
+    path = checkpoint_path(doc_hash)
+    if not path.exists():
+        return set()
+    return set(json.loads(path.read_text()).get("upserted_ids", []))
+
+
+def save_checkpoint(doc_hash: str, upserted_ids: List[str]):
+    _write_json(checkpoint_path(doc_hash), {
+        "upserted_ids": upserted_ids,
+        "updated_at": time.time(),
+    })
+
+
+def manifest_path(source_file: str) -> Path:
+    return MANIFEST_DIR / f"{source_file}.json"
+
+
+def hash_index_path(file_hash: str) -> Path:
+    return MANIFEST_DIR / "by_hash" / f"{file_hash}.json"
+
+
+def load_manifest(source_file: str) -> Optional[dict]:
+    """Last ingested file hash and chunk ids for a source file, if any."""
+    path = manifest_path(source_file)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def list_manifests() -> List[dict]:
+    return [json.loads(path.read_text()) for path in sorted(MANIFEST_DIR.glob("*.json"))]
+
+
+# manifests written before the embedding model was recorded used chroma's default model
+LEGACY_EMBEDDING_MODEL = "default@1"
+# ... and before the chunker was versioned, the recursive character splitter
+LEGACY_CHUNKER = "recursive-1"
+
+
+def manifest_embedding_model(manifest: dict) -> str:
+    return manifest.get("embedding_model", LEGACY_EMBEDDING_MODEL)
+
+
+def manifest_chunker(manifest: dict) -> str:
+    return manifest.get("chunker", LEGACY_CHUNKER)
+
+
+def save_manifest(source_file: str, file_hash: str, chunk_ids: List[str], embedding_model: str, chunker: str):
+    _write_json(manifest_path(source_file), {
+        "source_file": source_file,
+        "file_hash": file_hash,
+        "chunk_ids": chunk_ids,
+        "embedding_model": embedding_model,
+        "chunker": chunker,
+        "updated_at": time.time(),
+    })
+    _write_json(hash_index_path(file_hash), {"source_file": source_file})
+
+
+def source_record_path(file_path: Path) -> Path:
+    return file_path.parent / ".sources" / f"{file_path.name}.json"
+
+
+def record_source_name(file_path: Path, source_file: str):
+    """Remember the name a stored upload was uploaded under."""
+    _write_json(source_record_path(file_path), {"source_file": source_file})
+
+
+def forget_source_name(file_path: Path):
+    source_record_path(file_path).unlink(missing_ok=True)
+
+
+def source_name(file_path: Path) -> str:
+    """The logical source a stored file is ingested as: its upload name, else its own name.
+
+    Uploads are stored under a content-addressed name, so each revision of a
+    document gets a new path; manifests, chunk ids and the `source_file`
+    metadata are keyed by this name instead, so a revision replaces the
+    previous version rather than being added next to it.
+    """
+    path = source_record_path(file_path)
+    if not path.exists():
+        return file_path.name
+    return json.loads(path.read_text())["source_file"]
+
+
+def find_source_by_hash(file_hash: str) -> Optional[str]:
+    """Source file whose current embedded version has this content hash, if any."""
+    path = hash_index_path(file_hash)
+    if not path.exists():
+        return None
+    source_file = json.loads(path.read_text())["source_file"]
+    manifest = load_manifest(source_file)
+    # the source may have been re-ingested with different content since
+    if manifest is None or manifest["file_hash"] != file_hash:
+        return None
+    return source_file
+
+
+def clear_all():
+    """Forget every manifest and checkpoint, e.g. after the collection was recreated."""
+    for directory in (CHECKPOINT_DIR, MANIFEST_DIR, MANIFEST_DIR / "by_hash"):
+        if directory.exists():
+            for path in directory.glob("*.json"):
+                path.unlink()
@@ -0,0 +1,49 @@
+# Runs inside the ingestion process pool. Kept free of chromadb/fastapi imports
+# so spawning a worker only pays for docling and the chunker.
+from pathlib import Path
+from typing import Optional
+
+from src import conversion_cache
+from src.chunking import Chunk, chunk_document, split_structured_text
+
+_converter = None
+
+
+def init_worker():
+    global _converter
+    from docling.document_converter import DocumentConverter
+    _converter = DocumentConverter()
+
+
+def convert(file_path: str, file_hash: str, source_file: str) -> tuple[str, Optional[dict], bool]:
+    """Extracted text and docling document dict for a PDF, and whether they came from the conversion cache."""
+    cached = conversion_cache.load_text(file_hash)
+    if cached is not None:
+        return cached, conversion_cache.load_document(file_hash), True
+
+    if _converter is None:
+        init_worker()
+    result = _converter.convert(Path(file_path))
+    extracted_text = result.document.export_to_text()
+    document = result.document.export_to_dict()
+    conversion_cache.save(file_hash, source_file, document, extracted_text)
+    return extracted_text, document, False
+
+
+def chunk(extracted_text: str, document: Optional[dict]) -> list[Chunk]:
+    # the structured output carries page numbers; plain text is the fallback
+    if document is not None and document.get("body"):
+        return chunk_document(document)
+    return split_structured_text(extracted_text)
+
+
+def convert_and_split(file_path: str, file_hash: str, source_file: str) -> tuple[str, list[Chunk], bool]:
+    extracted_text, document, cached = convert(file_path, file_hash, source_file)
+    return extracted_text, chunk(extracted_text, document), cached
+
+
+def split_cached(file_hash: str) -> list[Chunk]:
+    extracted_text = conversion_cache.load_text(file_hash)
+    if extracted_text is None:
+        raise FileNotFoundError(f"No cached conversion for {file_hash}")
+    return chunk(extracted_text, conversion_cache.load_document(file_hash))
@@ -0,0 +1,245 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from src.config import JOBS_DB_PATH, JOB_MAX_ATTEMPTS, JOB_RETRY_BASE_SECS, JOB_LEASE_SECS
+
+PRIORITY_UPLOAD = 10
+PRIORITY_ADMIN = 5
+PRIORITY_STARTUP = 0
+
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL CHECK(status IN ('queued', 'running', 'succeeded', 'failed')),
+        priority INTEGER NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        run_after REAL NOT NULL,
+        dedupe_key TEXT,
+        progress TEXT,
+        result TEXT,
+        error TEXT,
+        worker TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        heartbeat_at REAL
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(status, priority DESC, run_after, created_at)
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs(dedupe_key, status)
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS collection_state (
+        id INTEGER PRIMARY KEY CHECK(id = 1),
+        version INTEGER NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    ''',
+)
+
+JSON_FIELDS = ("payload", "progress", "result")
+
+
+class JobQueue:
+    """Persistent priority queue of ingestion jobs in a local SQLite table.
+
+    The web app enqueues and reads jobs; worker processes claim them with a
+    lease, report progress, and either complete them or fail them into a retry
+    with exponential backoff. A running job whose heartbeat is older than
+    `lease_secs` is taken back on the next claim by any worker, or failed if it
+    has no attempts left. Calls are blocking; use them via asyncio.to_thread.
+    """
+
+    def __init__(self, db_path: Path, max_attempts: int, retry_base: float, lease_secs: float):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.lease_secs = lease_secs
+        self._local = threading.local()
+        self._initialised = False
+        self._init_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            with self._init_lock:
+                if not self._initialised:
+                    for statement in SCHEMA:
+                        conn.execute(statement)
+                    self._initialised = True
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _row(row: Optional[sqlite3.Row]) -> Optional[Dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        for field in JSON_FIELDS:
+            if job[field] is not None:
+                job[field] = json.loads(job[field])
+        return job
+
+    def enqueue(self, kind: str, payload: dict, priority: int = 0, dedupe_key: Optional[str] = None) -> Dict:
+        """Add a job, or return the still-queued job that already has `dedupe_key`.
+
+        Running jobs don't count: a file re-uploaded mid-ingestion needs another pass.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            if dedupe_key is not None:
+                existing = conn.execute(
+                    '''SELECT * FROM jobs WHERE dedupe_key = ? AND status = 'queued' LIMIT 1''',
+                    (dedupe_key,)
+                ).fetchone()
+                if existing is not None:
+                    return self._row(existing)
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                '''INSERT INTO jobs (id, kind, payload, status, priority, max_attempts, run_after, dedupe_key, created_at)
+                   VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?)''',
+                (job_id, kind, json.dumps(payload), priority, self.max_attempts, now, dedupe_key, now)
+            )
+            return self._row(conn.execute('''SELECT * FROM jobs WHERE id = ?''', (job_id,)).fetchone())
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                '''SELECT id FROM jobs WHERE status = 'queued' AND run_after <= ?
+                   ORDER BY priority DESC, run_after ASC, created_at ASC LIMIT 1''',
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                '''UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?,
+                       started_at = ?, heartbeat_at = ?, error = NULL
+                   WHERE id = ?''',
+                (worker, now, now, row["id"])
+            )
+            return self._row(conn.execute('''SELECT * FROM jobs WHERE id = ?''', (row["id"],)).fetchone())
+
+    def heartbeat(self, job_id: str, progress: Optional[dict] = None):
+        with self._transaction() as conn:
+            if progress is None:
+                conn.execute('''UPDATE jobs SET heartbeat_at = ? WHERE id = ?''', (time.time(), job_id))
+            else:
+                conn.execute(
+                    '''UPDATE jobs SET heartbeat_at = ?, progress = ? WHERE id = ?''',
+                    (time.time(), json.dumps(progress), job_id)
+                )
+
+    def complete(self, job_id: str, result: Optional[dict] = None):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                '''UPDATE jobs SET status = 'succeeded', result = ?, finished_at = ?, heartbeat_at = ? WHERE id = ?''',
+                (json.dumps(result or {}), now, now, job_id)
+            )
+
+    def fail(self, job_id: str, error: str) -> Dict:
+        """Schedule a retry with exponential backoff, or mark the job failed when out of attempts."""
+        now = time.time()
+        with self._transaction() as conn:
+            job = conn.execute('''SELECT attempts, max_attempts FROM jobs WHERE id = ?''', (job_id,)).fetchone()
+            if job["attempts"] < job["max_attempts"]:
+                delay = self.retry_base * 2 ** (job["attempts"] - 1)
+                conn.execute(
+                    '''UPDATE jobs SET status = 'queued', error = ?, run_after = ?, worker = NULL WHERE id = ?''',
+                    (error, now + delay, job_id)
+                )
+            else:
+                conn.execute(
+                    '''UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?''',
+                    (error, now, job_id)
+                )
+            return self._row(conn.execute('''SELECT * FROM jobs WHERE id = ?''', (job_id,)).fetchone())
+
+    def _expire_leases(self, conn: sqlite3.Connection, now: float) -> int:
+        """Take back running jobs whose worker stopped heartbeating (crash, container restart)."""
+        expired = now - self.lease_secs
+        failed = conn.execute(
+            '''UPDATE jobs SET status = 'failed', error = 'Lease expired after the last attempt',
+                   finished_at = ?, worker = NULL
+               WHERE status = 'running' AND heartbeat_at < ? AND attempts >= max_attempts''',
+            (now, expired)
+        ).rowcount
+        requeued = conn.execute(
+            '''UPDATE jobs SET status = 'queued', worker = NULL, run_after = ?
+               WHERE status = 'running' AND heartbeat_at < ?''',
+            (now, expired)
+        ).rowcount
+        return failed + requeued
+
+    def requeue_stale(self) -> int:
+        with self._transaction() as conn:
+            return self._expire_leases(conn, time.time())
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._connection().execute('''SELECT * FROM jobs WHERE id = ?''', (job_id,)).fetchone()
+        return self._row(row)
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        conn = self._connection()
+        if status is None:
+            rows = conn.execute('''SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?''', (limit,)).fetchall()
+        else:
+            rows = conn.execute(
+                '''SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?''',
+                (status, limit)
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._connection().execute('''SELECT status, COUNT(*) FROM jobs GROUP BY status''').fetchall()
+        counts = {"queued": 0, "running": 0, "succeeded": 0, "failed": 0}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
+
+    def collection_version(self) -> int:
+        row = self._connection().execute('''SELECT version FROM collection_state WHERE id = 1''').fetchone()
+        return row[0] if row else 0
+
+    def bump_collection_version(self) -> int:
+        with self._transaction() as conn:
+            conn.execute(
+                '''INSERT INTO collection_state (id, version, updated_at) VALUES (1, 1, ?)
+                   ON CONFLICT(id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at''',
+                (time.time(),)
+            )
+            return conn.execute('''SELECT version FROM collection_state WHERE id = 1''').fetchone()[0]
+
+
+job_queue = JobQueue(JOBS_DB_PATH, JOB_MAX_ATTEMPTS, JOB_RETRY_BASE_SECS, JOB_LEASE_SECS)
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Set
+
+from src.chroma_handler import check_if_already_embedded
+from src.config import PDF_INPUT_DIR, JOB_LEASE_SECS, JOB_POLL_SECS
+from src.ingestion import pipeline
+from src.job_queue import JobQueue, PRIORITY_ADMIN, PRIORITY_STARTUP
+from src.logging_config import get_logger
+
+logger = get_logger("jobs")
+
+Handler = Callable[["JobWorker", Dict], Awaitable[dict]]
+
+
+async def handle_ingest(worker: "JobWorker", job: Dict) -> dict:
+    file_path = Path(job["payload"]["path"])
+    if not file_path.exists():
+        # a newer upload of the same source replaced this one while it was queued
+        return {"skipped": True, "reason": "superseded"}
+    # the file may have been embedded by an earlier attempt or a duplicate upload;
+    # uploads are content-addressed, so the hash computed while receiving still holds
+    doc_hash = await check_if_already_embedded(file_path, job["payload"].get("file_hash"))
+    if doc_hash is None:
+        return {"skipped": True}
+
+    async def on_update(entry: dict):
+        await asyncio.to_thread(worker.queue.heartbeat, job["id"], entry)
+
+    result = await pipeline.ingest(file_path, doc_hash, on_update)
+    # even metadata-only changes need the lexical indexes reloaded
+    await asyncio.to_thread(worker.queue.bump_collection_version)
+    return result
+
+
+async def handle_scan_directory(worker: "JobWorker", job: Dict) -> dict:
+    directory = Path(job["payload"].get("directory", PDF_INPUT_DIR))
+    queued = []
+    for file_path in sorted(directory.glob("*.pdf")):
+        if await check_if_already_embedded(file_path) is None:
+            continue
+        queued.append((await asyncio.to_thread(
+            worker.queue.enqueue,
+            "ingest",
+            {"path": str(file_path)},
+            PRIORITY_STARTUP,
+            f"ingest:{file_path.name}"
+        ))["id"])
+    logger.info("Directory scan finished", extra={"directory": str(directory), "queued": len(queued)})
+    return {"queued_jobs": queued}
+
+
+async def handle_rebuild(worker: "JobWorker", job: Dict) -> dict:
+    result = await pipeline.rebuild_from_cache()
+    if not result["rebuilt"]:
+        return result
+    await asyncio.to_thread(worker.queue.bump_collection_version)
+    # documents without a usable cached conversion go through a full ingest
+    result["queued_jobs"] = [(await asyncio.to_thread(
+        worker.queue.enqueue,
+        "ingest",
+        {"path": path},
+        PRIORITY_ADMIN,
+        f"ingest:{Path(path).name}"
+    ))["id"] for path in result["needs_ingest"]]
+    return result
+
+
+HANDLERS: Dict[str, Handler] = {
+    "ingest": handle_ingest,
+    "scan_directory": handle_scan_directory,
+    "rebuild": handle_rebuild,
+}
+
+
+class JobWorker:
+    """Claims jobs from the queue and runs up to `concurrency` of them at once.
+
+    A heartbeat keeps each running job's lease fresh; jobs left running by a
+    worker that died are taken back by the next claim once their lease expires.
+    """
+
+    def __init__(self, queue: JobQueue, concurrency: int, poll_interval: float = JOB_POLL_SECS):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.name = f"{socket.gethostname()}-{os.getpid()}"
+        self._running: Set[asyncio.Task] = set()
+
+    async def run(self, stop: asyncio.Event):
+        # claims take back expired leases too; this just reports what a crash left behind
+        requeued = await asyncio.to_thread(self.queue.requeue_stale)
+        if requeued:
+            logger.info("Requeued stale jobs", extra={"jobs": requeued})
+        logger.info("Job worker started", extra={"worker": self.name, "concurrency": self.concurrency})
+
+        slots = asyncio.Semaphore(self.concurrency)
+        while not stop.is_set():
+            await slots.acquire()
+            job = await asyncio.to_thread(self.queue.claim, self.name)
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(stop.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(self._execute(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+        # finish what was claimed; anything cut short is taken back by a claim once its lease expires
+        await asyncio.gather(*self._running, return_exceptions=True)
+        await pipeline.shutdown()
+        logger.info("Job worker stopped", extra={"worker": self.name})
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECS / 3)
+            await asyncio.to_thread(self.queue.heartbeat, job_id)
+
+    async def _execute(self, job: Dict):
+        handler = HANDLERS.get(job["kind"])
+        started = time.time()
+        logger.info("Job started", extra={"job_id": job["id"], "kind": job["kind"], "attempt": job["attempts"]})
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+            result = await handler(self, job)
+        except Exception as e:
+            updated = await asyncio.to_thread(self.queue.fail, job["id"], str(e))
+            logger.exception("Job failed", extra={"job_id": job["id"], "kind": job["kind"], "status": updated["status"]})
+        else:
+            await asyncio.to_thread(self.queue.complete, job["id"], result)
+            logger.info("Job finished", extra={"job_id": job["id"], "kind": job["kind"], "seconds": round(time.time() - started, 2)})
+        finally:
+            heartbeat.cancel()
@@ -0,0 +1,58 @@
+import asyncio
+import fcntl
+import os
+from pathlib import Path
+from typing import Optional
+
+from src.config import LEADER_LOCK_PATH, LEADER_POLL_SECS
+from src.logging_config import get_logger
+
+logger = get_logger("leader")
+
+
+class LeaderLock:
+    """Leader election between the web processes of one host, through an flock.
+
+    The process holding the lock runs the once-per-deployment startup work.
+    The kernel drops the lock when its holder exits, however it exits, so a
+    follower waiting in `wait` takes over without any cleanup.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        # the pid is informational only; the flock is what counts
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        logger.info("Elected leader", extra={"pid": os.getpid()})
+        return True
+
+    async def wait(self, interval: float = LEADER_POLL_SECS):
+        """Return once this process holds the lock."""
+        while not await asyncio.to_thread(self.try_acquire):
+            await asyncio.sleep(interval)
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+leader_lock = LeaderLock(LEADER_LOCK_PATH)
@@ -0,0 +1,78 @@
+import asyncio
+import math
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from src.config import LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT_SECS, WEB_WORKERS
+
+
+class LLMOverloadedError(Exception):
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMLimiter:
+    """Bounded concurrency in front of the Groq client.
+
+    At most `max_concurrency` completions run at once, up to `max_queue` callers
+    wait for a slot, and anyone beyond that (or waiting longer than
+    `queue_timeout`) is rejected with LLMOverloadedError.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._active = 0
+        self._waiting = 0
+        self._rejected = 0
+        self._completed = 0
+
+    def check_capacity(self):
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            self._rejected += 1
+            raise LLMOverloadedError("LLM queue is full, try again shortly.")
+
+    def has_spare_capacity(self) -> bool:
+        """True when a slot is free and nobody is queued, for work that can wait for a quieter moment."""
+        return not self._semaphore.locked() and self._waiting == 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        self.check_capacity()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except TimeoutError:
+            self._rejected += 1
+            raise LLMOverloadedError("Timed out waiting for an LLM slot.")
+        finally:
+            self._waiting -= 1
+
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "waiting": self._waiting,
+            "rejected": self._rejected,
+            "completed": self._completed,
+        }
+
+
+# the limits are for the whole deployment, so each web process gets its share of them
+llm_limiter = LLMLimiter(
+    math.ceil(LLM_MAX_CONCURRENCY / WEB_WORKERS),
+    math.ceil(LLM_MAX_QUEUE / WEB_WORKERS),
+    LLM_QUEUE_TIMEOUT_SECS
+)
@@ -0,0 +1,143 @@
+import asyncio
+from typing import Callable, Dict, List, Set
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from src.history_store import HistoryStore
+from src.llm_limiter import llm_limiter
+from src.logging_config import get_logger
+
+logger = get_logger("memory")
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "You maintain a running summary of a conversation between a user and a legal assistant. "
+     "Keep it under 200 words. Preserve article and section numbers, names, and anything the "
+     "user may refer back to."),
+    ("human", "Current summary:\n{summary}\n\nNew turns:\n{turns}\n\nWrite the updated summary.")
+])
+
+REWRITE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "Rewrite the user's latest question as a standalone question that can be understood "
+     "without the conversation. Resolve pronouns and references such as 'that article' or "
+     "'the second clause'. Reply with the question only."),
+    ("human", "Conversation summary:\n{summary}\n\nRecent turns:\n{turns}\n\nLatest question: {question}")
+])
+
+ROLE_LABELS = {"human": "User", "ai": "Assistant"}
+
+
+def format_turns(messages: List[tuple]) -> str:
+    return "\n".join(f"{ROLE_LABELS.get(role, role)}: {message}" for role, message in messages)
+
+
+class ChatLock:
+    """A chat's summary lock and how many updates hold or wait for it."""
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class ConversationMemory:
+    """Bounded per-chat memory: the last K turns verbatim plus a rolling summary.
+
+    The summary of turns that have left the window is stored in `chat_memory`
+    next to `chat_history` and is brought up to date in the background after
+    each turn, so prompt size per turn stays flat however long the chat gets.
+    """
+
+    def __init__(
+        self,
+        store: HistoryStore,
+        get_llm: Callable,
+        recent_turns: int,
+        max_chars: int,
+        rewrite_queries: bool = True
+    ):
+        self.store = store
+        self.get_llm = get_llm
+        self.recent_turns = recent_turns
+        self.max_chars = max_chars
+        self.rewrite_queries = rewrite_queries
+        # an entry lives while anything holds or waits for it, so all updates of a chat share one lock
+        self._locks: Dict[tuple, ChatLock] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _clip(self, message: str) -> str:
+        return message if len(message) <= self.max_chars else message[: self.max_chars] + " …"
+
+    async def load(self, user_id: str, chat_id: str) -> Dict:
+        return await self.store.load_memory(user_id, chat_id, self.recent_turns)
+
+    def as_messages(self, memory: Dict) -> List[BaseMessage]:
+        messages: List[BaseMessage] = []
+        if memory["summary"]:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{memory['summary']}"))
+        for role, message in memory["recent"]:
+            cls = HumanMessage if role == "human" else AIMessage
+            messages.append(cls(content=self._clip(message)))
+        return messages
+
+    async def rewrite_question(self, question: str, memory: Dict) -> str:
+        """Standalone version of a follow-up question, used for cache lookup and retrieval."""
+        if not self.rewrite_queries or not memory["recent"]:
+            return question
+        chain = REWRITE_PROMPT | self.get_llm()
+        try:
+            async with llm_limiter.slot():
+                response = await chain.ainvoke({
+                    "summary": memory["summary"] or "(none)",
+                    "turns": format_turns([(role, self._clip(message)) for role, message in memory["recent"]]),
+                    "question": question
+                })
+        except Exception as e:
+            logger.warning("Query rewrite failed, using the original question", extra={"error": str(e)})
+            return question
+        rewritten = str(response.content).strip()
+        return rewritten or question
+
+    def schedule_update(self, user_id: str, chat_id: str):
+        task = asyncio.create_task(self._update(user_id, chat_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _update(self, user_id: str, chat_id: str):
+        key = (user_id, chat_id)
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = ChatLock()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                memory = await self.store.load_memory(user_id, chat_id, 0)
+                # everything before the verbatim window belongs in the summary
+                target = memory["total_turns"] - self.recent_turns
+                if target <= memory["summarized_turns"]:
+                    return
+                # summaries are background work and must not take slots from user requests; a skipped
+                # update is caught up by the next turn of the chat, since the target is recomputed
+                if not llm_limiter.has_spare_capacity():
+                    logger.info("Skipped conversation summary, LLM is busy", extra={"chat_id": chat_id})
+                    return
+                messages = await self.store.get_turn_messages(user_id, chat_id, memory["summarized_turns"], target)
+                chain = SUMMARY_PROMPT | self.get_llm()
+                async with llm_limiter.slot():
+                    response = await chain.ainvoke({
+                        "summary": memory["summary"] or "(none)",
+                        "turns": format_turns([(role, self._clip(message)) for role, message in messages])
+                    })
+                await self.store.save_memory(user_id, chat_id, str(response.content).strip(), target)
+                logger.info("Updated conversation summary", extra={"chat_id": chat_id, "summarized_turns": target})
+        except Exception as e:
+            logger.warning("Memory summary update failed", extra={"chat_id": chat_id, "error": str(e)})
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                del self._locks[key]
+
+    async def shutdown(self):
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,204 @@
+# Minimal Prometheus-style metrics: counters and histograms with labels,
+# rendered in the text exposition format on /metrics, plus request-scoped
+# timing spans for the chat and ingestion hot paths.
+#
+# Every web process counts on its own. With several processes each one writes
+# a snapshot of its registry to a shared directory, and /metrics adds up the
+# snapshots of all of them, like Prometheus' multiprocess mode. Snapshots of
+# processes that have exited stay in, so counters never go backwards.
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def empty(self) -> "Counter":
+        return Counter(self.name, self.help)
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[key, value] for key, value in self._values.items()]
+
+    def merge(self, snapshot: list):
+        for key, value in snapshot:
+            self.inc(value, **dict(key))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series: Dict[LabelKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # per-bucket counts, then sum, then count
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def empty(self) -> "Histogram":
+        return Histogram(self.name, self.help, self.buckets)
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[key, list(series)] for key, series in self._series.items()]
+
+    def merge(self, snapshot: list):
+        with self._lock:
+            for key, counts in snapshot:
+                key = _label_key(dict(key))
+                series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+                if len(counts) == len(series):
+                    self._series[key] = [a + b for a, b in zip(series, counts)]
+
+    def means(self, label: str) -> Dict[str, Dict[str, float]]:
+        """Count and mean of the observations for each value of `label`, e.g. per stage."""
+        with self._lock:
+            return {
+                dict(key).get(label, ""): {"count": series[-1], "mean": series[-2] / series[-1]}
+                for key, series in self._series.items() if series[-1]
+            }
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(bound)))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str) -> Counter:
+        metric = Counter(name, help)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, directory: Path):
+        """Publish this process' values as `<pid>.json`, replaced atomically."""
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{os.getpid()}.json"
+        partial = path.with_suffix(".tmp")
+        partial.write_text(json.dumps({metric.name: metric.snapshot() for metric in self._metrics}))
+        os.replace(partial, path)
+
+    def render_all(self, directory: Path) -> str:
+        """The sum of every process' snapshot, this one's brought up to date first."""
+        self.write_snapshot(directory)
+        merged = Registry()
+        merged._metrics = [metric.empty() for metric in self._metrics]
+        for path in directory.glob("*.json"):
+            try:
+                snapshot = json.loads(path.read_text())
+            except (OSError, ValueError):
+                # a process may be gone or mid-write; skipping it for one scrape is fine
+                continue
+            for metric in merged._metrics:
+                metric.merge(snapshot.get(metric.name, []))
+        return merged.render()
+
+    async def publish(self, directory: Path, interval: float):
+        """Keep this process' snapshot fresh until cancelled."""
+        while True:
+            await asyncio.to_thread(self.write_snapshot, directory)
+            await asyncio.sleep(interval)
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter("chatbot_http_requests_total", "HTTP requests by route and status.")
+HTTP_SECONDS = registry.histogram("chatbot_http_request_seconds", "HTTP request duration including streamed bodies.")
+CHAT_STAGE_SECONDS = registry.histogram("chatbot_chat_stage_seconds", "Time spent in each stage of a chat request.")
+INGESTION_STAGE_SECONDS = registry.histogram("chatbot_ingestion_stage_seconds", "Time spent in each ingestion stage.")
+CHAT_REQUESTS = registry.counter("chatbot_chat_requests_total", "Chat requests by endpoint and outcome.")
+INGESTED_CHUNKS = registry.counter("chatbot_ingested_chunks_total", "Chunks added, kept or removed by ingestion.")
+SPECULATIVE_RETRIEVALS = registry.counter("chatbot_speculative_retrievals_total", "Retrievals started before the query rewrite, by whether they were used.")
+
+# spans recorded while handling the current request, keyed by stage
+request_spans: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("request_spans", default=None)
+
+
+def record_span(histogram: Histogram, stage: str, seconds: float):
+    histogram.observe(seconds, stage=stage)
+    spans = request_spans.get()
+    if spans is not None:
+        spans[stage] = round(spans.get(stage, 0.0) + seconds * 1000, 3)
+
+
+@contextmanager
+def span(stage: str, histogram: Histogram = CHAT_STAGE_SECONDS) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(histogram, stage, time.perf_counter() - start)
+
+
+def ingestion_span(stage: str):
+    return span(stage, INGESTION_STAGE_SECONDS)
@@ -0,0 +1,53 @@
+import time
+import uuid
+
+from src.logging_config import get_logger, request_id
+from src.metrics import HTTP_REQUESTS, HTTP_SECONDS, request_spans
+
+logger = get_logger("http")
+
+
+class RequestContextMiddleware:
+    """Tags each request with an id, collects its stage spans and logs one line when
+    the response, including a streamed body, has been fully sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        rid = headers.get(b"x-request-id", b"").decode("latin-1") or uuid.uuid4().hex
+        rid_token = request_id.set(rid)
+        spans_token = request_spans.set({})
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", rid.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(method=scope["method"], route=path, status=str(status))
+            HTTP_SECONDS.observe(elapsed, method=scope["method"], route=path)
+            if path != "/metrics":
+                logger.info("request completed", extra={
+                    "method": scope["method"],
+                    "route": path,
+                    "status": status,
+                    "duration_ms": round(elapsed * 1000, 3),
+                    "spans_ms": request_spans.get(),
+                })
+            request_spans.reset(spans_token)
+            request_id.reset(rid_token)
@@ -0,0 +1,163 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from src.logging_config import get_logger
+from src.config import (
+    RERANKER_ENABLED,
+    RERANKER_MODEL,
+    RERANK_MAX_CANDIDATES,
+    RERANK_BATCH_SIZE,
+    RERANK_TOP_N,
+    RERANK_SCORE_MARGIN,
+    RERANK_CACHE_SIZE
+)
+
+logger = get_logger("reranker")
+
+
+class Reranker:
+    """Optional cross-encoder pass over retrieved chunks, run on the CPU.
+
+    Candidates arrive in retrieval order and are scored a batch at a time.
+    Scoring stops once a whole batch lands below the current top-N cut-off,
+    since deeper candidates are unlikely to do better, so confident queries
+    cost one batch and ambiguous ones go deeper. Only the top N within
+    `margin` of the best score reach the prompt. Scores are cached per
+    (question, chunk id).
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_candidates: int,
+        batch_size: int,
+        top_n: int,
+        margin: float,
+        cache_size: int,
+        enabled: bool = True
+    ):
+        self.model_name = model_name
+        self.max_candidates = max_candidates
+        self.batch_size = batch_size
+        self.top_n = top_n
+        self.margin = margin
+        self.cache_size = cache_size
+        self.enabled = enabled
+        self._model = None
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._stats = {
+            "requests": 0,
+            "candidates": 0,
+            "scored": 0,
+            "cache_hits": 0,
+            "kept": 0,
+            "early_stops": 0,
+            "model_seconds": 0.0,
+            "errors": 0,
+        }
+
+    def _load_sync(self):
+        try:
+            # optional dependency: reranking stays off when it is missing
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            logger.warning("sentence-transformers is not installed, reranking disabled")
+            self.enabled = False
+            return
+        started = time.perf_counter()
+        self._model = CrossEncoder(self.model_name, device="cpu")
+        logger.info("Reranker loaded", extra={"model": self.model_name, "seconds": round(time.perf_counter() - started, 2)})
+
+    async def load(self):
+        if self.enabled and self._model is None:
+            await asyncio.to_thread(self._load_sync)
+
+    def _score_sync(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        started = time.perf_counter()
+        scores = self._model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        self._stats["model_seconds"] += time.perf_counter() - started
+        return [float(score) for score in scores]
+
+    async def _score(self, question: str, ids: List[str], documents: List[str]) -> List[float]:
+        scores: List[Optional[float]] = []
+        missing = []
+        for position, id_ in enumerate(ids):
+            score = self._cache.get((question, id_))
+            if score is None:
+                missing.append(position)
+            else:
+                self._cache.move_to_end((question, id_))
+                self._stats["cache_hits"] += 1
+            scores.append(score)
+        if missing:
+            computed = await asyncio.to_thread(self._score_sync, [(question, documents[position]) for position in missing])
+            self._stats["scored"] += len(missing)
+            for position, score in zip(missing, computed):
+                scores[position] = score
+                self._cache[(question, ids[position])] = score
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return scores
+
+    async def rerank(self, question: str, results: dict) -> dict:
+        """Best few chunks of a query result, in the same shape, with cross-encoder scores as distances."""
+        if not self.enabled or self._model is None:
+            return results
+        ids = results["ids"][0]
+        documents = results["documents"][0]
+        metadatas = results["metadatas"][0]
+        self._stats["requests"] += 1
+
+        scored: List[Tuple[float, int]] = []
+        try:
+            for start in range(0, min(len(ids), self.max_candidates), self.batch_size):
+                end = min(start + self.batch_size, len(ids), self.max_candidates)
+                batch = await self._score(question, ids[start:end], documents[start:end])
+                cutoff = sorted((score for score, _ in scored), reverse=True)[self.top_n - 1] if len(scored) >= self.top_n else None
+                scored.extend(zip(batch, range(start, end)))
+                if cutoff is not None and max(batch) < cutoff:
+                    self._stats["early_stops"] += 1
+                    break
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.warning("Reranking failed, keeping retrieval order", extra={"error": repr(e)})
+            return results
+
+        self._stats["candidates"] += len(scored)
+        # ties keep retrieval order
+        scored.sort(key=lambda pair: (-pair[0], pair[1]))
+        best = scored[0][0] if scored else 0.0
+        kept = [(score, position) for score, position in scored[:self.top_n] if score >= best - self.margin]
+        self._stats["kept"] += len(kept)
+        return {
+            "ids": [[ids[position] for _, position in kept]],
+            "documents": [[documents[position] for _, position in kept]],
+            "metadatas": [[metadatas[position] for _, position in kept]],
+            "distances": [[-score for score, _ in kept]],
+        }
+
+    def stats(self) -> Dict:
+        requests = self._stats["requests"]
+        return {
+            **self._stats,
+            "model_seconds": round(self._stats["model_seconds"], 3),
+            "enabled": self.enabled,
+            "loaded": self._model is not None,
+            "model": self.model_name,
+            "cache_entries": len(self._cache),
+            "avg_depth": round(self._stats["candidates"] / requests, 2) if requests else None,
+            "avg_kept": round(self._stats["kept"] / requests, 2) if requests else None,
+        }
+
+
+reranker = Reranker(
+    RERANKER_MODEL,
+    RERANK_MAX_CANDIDATES,
+    RERANK_BATCH_SIZE,
+    RERANK_TOP_N,
+    RERANK_SCORE_MARGIN,
+    RERANK_CACHE_SIZE,
+    enabled=RERANKER_ENABLED
+)
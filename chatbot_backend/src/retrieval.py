@@ -0,0 +1,187 @@
+import asyncio
+from collections import defaultdict
+from typing import List, Optional, Tuple
+
+from src.chroma_handler import load_all_chunks, query_documents, query_documents_many
+from src.chunking import chunk_articles, document_kind
+from src.config import HYBRID_CANDIDATES, RRF_K, COLLECTION_POLL_SECS
+from src.hybrid_index import hybrid_index, matches, parse_references, parse_scope, reciprocal_rank_fusion
+from src.job_queue import job_queue
+from src.semantic_cache import semantic_cache
+from src.logging_config import get_logger
+
+logger = get_logger("retrieval")
+
+
+def chunk_position(metadata: dict) -> int:
+    if "chunk_index" in metadata:
+        return int(metadata["chunk_index"])
+    # older chunks only carry "i of N"
+    return int(str(metadata.get("chunk", "0")).split(" of ")[0] or 0)
+
+
+def backfill_articles(documents: List[str], metadatas: List[dict]):
+    """Derive document kind and article numbers for chunks embedded before they were stored as metadata."""
+    by_source = defaultdict(list)
+    for position, metadata in enumerate(metadatas):
+        if "document_kind" not in metadata:
+            by_source[metadata.get("source_file")].append(position)
+    for positions in by_source.values():
+        positions.sort(key=lambda position: chunk_position(metadatas[position]))
+        texts = [documents[position] for position in positions]
+        kind = document_kind(texts)
+        # numbered headings of an Act are sections, which the exact lookup must not mistake for articles
+        articles = chunk_articles(texts) if kind == "constitution" else [None] * len(texts)
+        for position, article in zip(positions, articles):
+            metadata = {**metadatas[position], "document_kind": kind}
+            if article is not None and "article" not in metadata:
+                metadata["article"] = article
+            metadatas[position] = metadata
+
+
+async def load_index() -> None:
+    """Fill the lexical index from the chunks already in Chroma.
+
+    The new index is built in a thread and swapped in whole, so searches
+    running meanwhile keep using the previous one.
+    """
+    chunks = await load_all_chunks()
+    backfill_articles(chunks["documents"], chunks["metadatas"])
+    await asyncio.to_thread(hybrid_index.load, chunks["ids"], chunks["documents"], chunks["metadatas"])
+    logger.info("Hybrid index loaded", extra={"chunks": len(hybrid_index)})
+
+
+async def watch_collection(interval: float = COLLECTION_POLL_SECS) -> None:
+    """Reload the lexical index and drop cached answers whenever a worker changes the collection."""
+    seen = await asyncio.to_thread(job_queue.collection_version)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            version = await asyncio.to_thread(job_queue.collection_version)
+            if version != seen:
+                semantic_cache.invalidate()
+                await load_index()
+                seen = version
+                logger.info("Collection changed, reloaded index", extra={"version": version})
+        except Exception:
+            logger.exception("Failed to refresh after collection change")
+
+
+def exact_matches(question: str) -> List[str]:
+    """Chunks of the Constitution articles a question names, and of the Act sections amending them."""
+    references = parse_references(question)
+    return hybrid_index.lookup_articles(references) if references else []
+
+
+def exact_results(exact: List[str], top_k: int, filters: Optional[dict]) -> Optional[dict]:
+    """The exact-reference matches on their own, when they fill `top_k`; None when searching is needed.
+
+    Questions naming articles whose chunks already fill the result skip the
+    vector round trip and BM25: nothing a search finds would outrank a chunk
+    of the article the user asked about.
+    """
+    ids, documents, metadatas = [], [], []
+    for id_ in exact:
+        entry = hybrid_index.get(id_)
+        if entry is None or not matches(entry[1], filters):
+            continue
+        ids.append(id_)
+        documents.append(entry[0])
+        metadatas.append(entry[1])
+        if len(ids) == top_k:
+            # scored like a fused ranking, so callers can't tell the two apart
+            scores = [score for _, score in reciprocal_rank_fusion([ids], k=RRF_K)]
+            return {"ids": [ids], "documents": [documents], "metadatas": [metadatas], "distances": [scores]}
+    return None
+
+
+async def retrieve(question: str, top_k: int = 5, filters: Optional[dict] = None) -> dict:
+    """Hybrid retrieval: exact article references, BM25 and vector results fused by RRF.
+
+    `filters` (or a chapter named in the question) narrows the searches to
+    chunks with matching metadata; an empty narrowed result falls back to the
+    whole collection, e.g. for chunks stored before chapters were recorded.
+    When the exact matches alone fill `top_k`, they are the result.
+    """
+    if not hybrid_index.loaded:
+        return await query_documents(question, top_k=top_k, filters=filters)
+
+    exact = exact_matches(question)
+    filters = filters or parse_scope(question)
+    if filters:
+        results = await hybrid_search(question, top_k, filters, exact)
+        if results["ids"][0]:
+            return results
+        logger.info("No chunks match the retrieval filters, searching everything", extra={"filters": filters})
+    return await hybrid_search(question, top_k, None, exact)
+
+
+async def hybrid_search(question: str, top_k: int, filters: Optional[dict], exact: Optional[List[str]] = None) -> dict:
+    results = exact_results(exact or [], top_k, filters)
+    if results is not None:
+        return results
+    candidates = max(top_k, HYBRID_CANDIDATES)
+    vector_results, lexical = await asyncio.gather(
+        query_documents(question, top_k=candidates, filters=filters),
+        asyncio.to_thread(hybrid_index.search, question, candidates, filters)
+    )
+    return fuse_results(vector_results, 0, lexical, top_k, exact)
+
+
+def fuse_results(
+    vector_results: dict,
+    row: int,
+    lexical: List[Tuple[str, float]],
+    top_k: int,
+    exact: Optional[List[str]] = None
+) -> dict:
+    """RRF-merge row `row` of a collection.query result with a BM25 ranking and any exact-reference matches."""
+    vector_ids = vector_results["ids"][row]
+    fused: List[Tuple[str, float]] = reciprocal_rank_fusion(
+        [vector_ids, [id_ for id_, _ in lexical], exact or []], k=RRF_K
+    )
+
+    # anything the vector side returned that the index has not seen yet is kept from the query result
+    known = {
+        id_: (document, metadata)
+        for id_, document, metadata in zip(vector_ids, vector_results["documents"][row], vector_results["metadatas"][row])
+    }
+    ids, documents, metadatas, scores = [], [], [], []
+    for id_, score in fused:
+        entry = hybrid_index.get(id_) or known.get(id_)
+        if entry is None:
+            continue
+        ids.append(id_)
+        documents.append(entry[0])
+        metadatas.append(entry[1])
+        scores.append(score)
+        if len(ids) == top_k:
+            break
+    return {"ids": [ids], "documents": [documents], "metadatas": [metadatas], "distances": [scores]}
+
+
+def result_row(results: dict, row: int) -> dict:
+    return {key: [results[key][row]] for key in ("ids", "documents", "metadatas", "distances")}
+
+
+async def retrieve_many(questions: List[str], top_k: int = 5) -> List[dict]:
+    """`retrieve` for many questions, with one multi-query vector round trip for all of them."""
+    if not hybrid_index.loaded:
+        results = await query_documents_many(questions, top_k=top_k)
+        return [result_row(results, row) for row in range(len(questions))]
+
+    exact = [exact_matches(question) for question in questions]
+    results: List[Optional[dict]] = [exact_results(ids, top_k, None) for ids in exact]
+    pending = [position for position, result in enumerate(results) if result is None]
+    if not pending:
+        return results
+
+    candidates = max(top_k, HYBRID_CANDIDATES)
+    pending_questions = [questions[position] for position in pending]
+    vector_results, lexical = await asyncio.gather(
+        query_documents_many(pending_questions, top_k=candidates),
+        asyncio.to_thread(lambda: [hybrid_index.search(question, candidates) for question in pending_questions])
+    )
+    for row, position in enumerate(pending):
+        results[position] = fuse_results(vector_results, row, lexical[row], top_k, exact[position])
+    return results
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List, Literal
+from typing import Optional, List, Literal, Any, Dict
 
 
 class SchemaAskRequest(BaseModel):
@@ -8,6 +8,9 @@ class SchemaAskRequest(BaseModel):
     question: str
 
 
+SchemaStreamFormat = Literal["text", "ndjson", "sse"]
+
+
 class SchemaAskResponse(BaseModel):
     user_id: str
     chat_id: str
@@ -20,11 +23,48 @@ class SchemaChatMessage(BaseModel):
     timestamp: str
 
 
+class SchemaChatHistoryPage(BaseModel):
+    messages: List[SchemaChatMessage]
+    next_cursor: Optional[str] = None
+
+
+class SchemaChatSummary(BaseModel):
+    chat_id: str
+    title: str
+    message_count: int
+    created_at: str
+    last_activity: str
+    version: int
+
+
+class SchemaChatList(BaseModel):
+    chats: List[SchemaChatSummary]
+    next_cursor: Optional[str] = None
+
+
 class SchemaFileUploadStatus(BaseModel):
     filename: str
-    status: Literal["skipped", "started"]
+    status: Literal["skipped", "queued", "rejected"]
     message: str
+    stored_as: Optional[str] = None
+    job_id: Optional[str] = None
 
 
 class SchemaUploadResponse(BaseModel):
     results: List[SchemaFileUploadStatus]
+
+
+class SchemaJob(BaseModel):
+    id: str
+    kind: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    priority: int
+    attempts: int
+    max_attempts: int
+    payload: Dict[str, Any]
+    progress: Optional[Dict[str, Any]] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
@@ -0,0 +1,176 @@
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from src.embeddings import embedding_service
+from src.hybrid_index import parse_chapters, parse_references
+from src.logging_config import get_logger
+
+from src.config import (
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_TTL_SECS
+)
+
+logger = get_logger("semantic_cache")
+
+# width of the buckets used to report how close lookups came to the threshold
+SIMILARITY_BUCKET = 0.05
+
+References = Tuple[frozenset, frozenset]
+
+
+def question_references(question: str) -> References:
+    """The articles and chapters a question names; a cached answer is only reused for the same ones."""
+    return frozenset(parse_references(question)), frozenset(parse_chapters(question))
+
+
+class CacheEntry:
+    __slots__ = ("question", "answer", "context", "vector", "references", "created_at")
+
+    def __init__(self, question: str, answer: str, context: str, vector: np.ndarray):
+        self.question = question
+        self.answer = answer
+        self.context = context
+        self.vector = vector
+        self.references = question_references(question)
+        self.created_at = time.monotonic()
+
+
+class SemanticCache:
+    """Answer cache keyed on question embeddings.
+
+    A lookup returns the cached answer of the most similar earlier question when
+    its cosine similarity reaches `threshold` and it names the same articles
+    and chapters: "article 12" and "article 21" embed almost identically but
+    must not share an answer. Entries expire after `ttl` seconds
+    and the least recently used entry is evicted past `max_entries`. The whole
+    cache is dropped by `invalidate()` whenever the collection changes.
+    """
+
+    def __init__(self, threshold: float, max_entries: int, ttl: float, enabled: bool = True):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.generation = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[str] = []
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "reference_mismatches": 0,
+            "errors": 0,
+        }
+        self._hit_similarity_total = 0.0
+        self._similarity_buckets: Dict[str, int] = {}
+
+    async def embed(self, text: str) -> np.ndarray:
+        # shared with retrieval through the embedding service's question cache
+        vector = np.asarray(await embedding_service.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _drop(self, key: str):
+        del self._entries[key]
+        self._matrix = None
+
+    def _evict_expired(self):
+        cutoff = time.monotonic() - self.ttl
+        expired = [key for key, entry in self._entries.items() if entry.created_at < cutoff]
+        for key in expired:
+            self._drop(key)
+        self._stats["expirations"] += len(expired)
+
+    def _record_similarity(self, similarity: float):
+        bucket = min(int(max(similarity, 0.0) / SIMILARITY_BUCKET), int(1 / SIMILARITY_BUCKET) - 1)
+        label = f"{bucket * SIMILARITY_BUCKET:.2f}"
+        self._similarity_buckets[label] = self._similarity_buckets.get(label, 0) + 1
+
+    async def lookup(self, question: str) -> Tuple[Optional[CacheEntry], Optional[np.ndarray]]:
+        """Return (hit or None, question vector). The vector is reused by `put`."""
+        if not self.enabled:
+            return None, None
+        try:
+            vector = await self.embed(question)
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.warning("Semantic cache embedding failed", extra={"error": str(e)})
+            return None, None
+
+        self._stats["lookups"] += 1
+        self._evict_expired()
+        if not self._entries:
+            self._stats["misses"] += 1
+            return None, vector
+
+        if self._matrix is None:
+            self._keys = list(self._entries.keys())
+            self._matrix = np.stack([self._entries[key].vector for key in self._keys])
+        similarities = self._matrix @ vector
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        self._record_similarity(similarity)
+
+        references = question_references(question)
+        if similarity >= self.threshold and self._entries[self._keys[best]].references != references:
+            self._stats["reference_mismatches"] += 1
+            eligible = np.array([self._entries[key].references == references for key in self._keys])
+            similarities = np.where(eligible, similarities, -np.inf)
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+
+        if similarity < self.threshold:
+            self._stats["misses"] += 1
+            return None, vector
+
+        key = self._keys[best]
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        self._hit_similarity_total += similarity
+        return self._entries[key], vector
+
+    def put(self, vector: Optional[np.ndarray], question: str, answer: str, context: str, generation: int):
+        # skip answers computed against a collection that has since changed
+        if not self.enabled or vector is None or generation != self.generation:
+            return
+        self._entries[str(uuid.uuid4())] = CacheEntry(question, answer, context, vector)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+        self._matrix = None
+
+    def invalidate(self):
+        self._entries.clear()
+        self._matrix = None
+        self.generation += 1
+        self._stats["invalidations"] += 1
+
+    def stats(self) -> dict:
+        lookups = self._stats["lookups"]
+        hits = self._stats["hits"]
+        return {
+            **self._stats,
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "mean_hit_similarity": self._hit_similarity_total / hits if hits else None,
+            "best_similarity_histogram": dict(sorted(self._similarity_buckets.items())),
+        }
+
+
+semantic_cache = SemanticCache(
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_TTL_SECS,
+    enabled=SEMANTIC_CACHE_ENABLED
+)
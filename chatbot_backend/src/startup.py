@@ -0,0 +1,75 @@
+# Imported first by app.py, so its import time is the start of the boot.
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from src.logging_config import get_logger
+
+logger = get_logger("startup")
+
+STATES = ("pending", "loading", "ready", "failed", "disabled")
+
+
+class Startup:
+    """Readiness and timing of each subsystem the backend brings up.
+
+    Only `required` subsystems gate /readyz; the others warm up in the
+    background and the chat path falls back until they are ready (vector
+    search only, no reranking, the embedding model loading on first use).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ready_at: Optional[float] = None
+        self.subsystems: Dict[str, dict] = {}
+
+    def elapsed(self) -> float:
+        return round(time.perf_counter() - self.started, 3)
+
+    def register(self, name: str, required: bool = False):
+        self.subsystems.setdefault(name, {"state": "pending", "required": required, "seconds": None})
+
+    def mark(self, name: str, state: str, **fields):
+        self.register(name)
+        self.subsystems[name].update(state=state, **fields)
+
+    @asynccontextmanager
+    async def step(self, name: str, required: bool = False) -> AsyncIterator[None]:
+        """Time bringing up `name`; failures of optional subsystems are logged, not raised."""
+        self.register(name, required)
+        self.mark(name, "loading")
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.mark(name, "failed", seconds=round(time.perf_counter() - started, 3), error=str(e))
+            if required:
+                raise
+            logger.exception("Subsystem failed to start", extra={"subsystem": name})
+            return
+        self.mark(name, "ready", seconds=round(time.perf_counter() - started, 3), ready_after=self.elapsed())
+
+    def is_ready(self) -> bool:
+        return all(entry["state"] == "ready" for entry in self.subsystems.values() if entry["required"])
+
+    def serving(self):
+        self.ready_at = self.elapsed()
+        logger.info("Ready to serve", extra={"seconds": self.ready_at})
+
+    def report(self) -> dict:
+        return {
+            "ready": self.is_ready(),
+            "ready_after": self.ready_at,
+            "uptime": self.elapsed(),
+            "subsystems": {name: dict(entry) for name, entry in self.subsystems.items()},
+        }
+
+    def log_report(self):
+        logger.info("Startup report", extra={
+            "ready_after": self.ready_at,
+            "total": self.elapsed(),
+            **{name: entry["seconds"] if entry["state"] == "ready" else entry["state"] for name, entry in self.subsystems.items()},
+        })
+
+
+startup = Startup()
@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from fastapi import UploadFile
+from fastapi.responses import JSONResponse
+
+from src.config import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES
+from src.ingestion_state import find_source_by_hash, forget_source_name, record_source_name, source_name
+
+
+class UploadTooLargeError(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"File exceeds the {max_bytes / (1024 * 1024):g} MB upload limit.")
+        self.max_bytes = max_bytes
+
+
+class UploadLimitMiddleware:
+    """Refuses upload requests whose body is over `max_bytes` with a 413.
+
+    Starlette spools a multipart body to temp files before the endpoint runs,
+    so the per-file cap in `store_upload` comes too late to save disk or
+    bandwidth. A declared Content-Length over the limit is refused without
+    reading the body; a chunked body is counted as it arrives and cut off
+    once it passes the limit.
+    """
+
+    def __init__(self, app, paths: set[str], max_bytes: int):
+        self.app = app
+        self.paths = paths
+        self.max_bytes = max_bytes
+
+    async def reject(self, scope, receive, send):
+        detail = f"Upload exceeds the {self.max_bytes / (1024 * 1024):g} MB request limit."
+        await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope.get("headers") or []).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            await self.reject(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise UploadTooLargeError(self.max_bytes)
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            # whatever the app makes of the cut-off body is replaced by the 413
+            if exceeded:
+                return
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not started:
+            await self.reject(scope, receive, send)
+
+
+def content_addressed_name(filename: str, file_hash: str) -> str:
+    """`<stem>-<hash prefix>.pdf`: readable, but two different uploads never share a name."""
+    stem = re.sub(r"[^A-Za-z0-9._-]+", "_", Path(filename).stem).strip("._") or "document"
+    return f"{stem}-{file_hash[:12]}.pdf"
+
+
+def find_stored(directory: Path, file_hash: str) -> Path | None:
+    """An earlier upload of the same bytes, whatever name it was uploaded under."""
+    return next(directory.glob(f"*-{file_hash[:12]}.pdf"), None)
+
+
+def remove_superseded(directory: Path, source_file: str, keep: Path) -> list[str]:
+    """Delete older stored versions of a source, so a directory scan can't bring them back."""
+    removed = []
+    for path in directory.glob("*.pdf"):
+        if path != keep and source_name(path) == source_file:
+            path.unlink(missing_ok=True)
+            forget_source_name(path)
+            removed.append(path.name)
+    return removed
+
+
+async def store_upload(upload: UploadFile, directory: Path, max_bytes: int = MAX_UPLOAD_BYTES) -> dict:
+    """Stream an upload to disk, hashing it on the way, and file it under its content address.
+
+    Only one chunk is held in memory at a time. The bytes land in a temp file
+    in `directory` and are moved into place once the hash is known; when the
+    content is already embedded or already on disk the temp file is dropped.
+    A new file is recorded as a revision of the source named like the upload
+    and replaces that source's earlier stored versions.
+    """
+    partial_dir = directory / ".partial"
+    partial_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=partial_dir, suffix=".part")
+    tmp_path = Path(tmp_name)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(max_bytes)
+                digest.update(chunk)
+                await asyncio.to_thread(buffer.write, chunk)
+
+        file_hash = digest.hexdigest()
+        embedded_as = await asyncio.to_thread(find_source_by_hash, file_hash)
+        stored = await asyncio.to_thread(find_stored, directory, file_hash)
+        already_stored = stored is not None
+        target = stored or directory / content_addressed_name(upload.filename, file_hash)
+        superseded = []
+        if embedded_as is None and not already_stored:
+            await asyncio.to_thread(os.replace, tmp_path, target)
+            source_file = Path(upload.filename).name
+            await asyncio.to_thread(record_source_name, target, source_file)
+            superseded = await asyncio.to_thread(remove_superseded, directory, source_file, target)
+        return {
+            "path": target,
+            "source_file": await asyncio.to_thread(source_name, target),
+            "superseded": superseded,
+            "file_hash": file_hash,
+            "size": size,
+            "embedded_as": embedded_as,
+            "already_stored": already_stored,
+        }
+    finally:
+        tmp_path.unlink(missing_ok=True)
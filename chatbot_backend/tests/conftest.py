@@ -0,0 +1,34 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# src.config reads these at import, so they have to point somewhere disposable first
+_workdir = Path(tempfile.mkdtemp(prefix="chatbot-tests-"))
+for name in ("CHECKPOINT_DIR", "MANIFEST_DIR", "CONVERSION_CACHE_DIR"):
+    os.environ.setdefault(name, str(_workdir / name.lower()))
+for name in ("HISTORY_DB_PATH", "JOBS_DB_PATH"):
+    os.environ.setdefault(name, str(_workdir / f"{name.lower()}.db"))
+
+SAMPLE_TEXTS = BACKEND_DIR / "documents" / "outputs"
+
+
+@pytest.fixture
+def state_dirs(tmp_path, monkeypatch):
+    """Fresh manifest and checkpoint directories for one test."""
+    from src import ingestion_state
+    monkeypatch.setattr(ingestion_state, "MANIFEST_DIR", tmp_path / "manifests")
+    monkeypatch.setattr(ingestion_state, "CHECKPOINT_DIR", tmp_path / "checkpoints")
+    return tmp_path
+
+
+@pytest.fixture(scope="session")
+def sample_text():
+    def read(name: str) -> str:
+        return (SAMPLE_TEXTS / name).read_text(encoding="utf-8")
+    return read
@@ -0,0 +1,42 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("langchain_core")
+
+from src import chatbot
+
+
+@pytest.fixture
+def cached_answer(monkeypatch):
+    async def prepare_turn(user_id, chat_id, question):
+        return {"summary": "", "recent": []}, question, SimpleNamespace(answer=f"answer to {question}"), None, None
+
+    monkeypatch.setattr(chatbot, "prepare_turn", prepare_turn)
+
+
+def stored_messages(user_id: str, chat_id: str):
+    # straight from the database, as another web process would read it
+    messages, _ = asyncio.run(chatbot.history.get_chat_history(user_id, chat_id, 10))
+    return [m["message"] for m in messages if m["role"] != "system"]
+
+
+def test_chat_response_waits_for_its_turn_to_be_stored(cached_answer):
+    result = asyncio.run(chatbot.ask_with_context("chat-user", None, "q"))
+    assert stored_messages("chat-user", result["chat_id"]) == ["q", "answer to q"]
+
+
+def test_stream_is_done_only_once_its_turn_is_stored(cached_answer):
+    async def scenario():
+        stored_at_done = None
+        async for event in chatbot.stream_response("stream-user", "c", "q", "ndjson"):
+            event = json.loads(event)
+            if event["type"] == "done":
+                messages, _ = await chatbot.history.get_chat_history("stream-user", "c", 10)
+                stored_at_done = [m["message"] for m in messages if m["role"] != "system"]
+        return stored_at_done
+
+    assert asyncio.run(scenario()) == ["q", "answer to q"]
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("langchain_core")  # for benchmarks.stubs
+
+from benchmarks.stubs import AsyncEphemeralClient, HashEmbeddingFunction
+from src.chroma_handler import chroma, chunk_id, store_chunks
+from src.chunking import Chunk
+from src.embeddings import embedding_service
+from src.ingestion_state import load_checkpoint, load_manifest
+
+
+def article(number: int, text: str) -> Chunk:
+    return Chunk(text, {"document_kind": "constitution", "article": number})
+
+
+async def fresh_collection():
+    embedding_service.use(HashEmbeddingFunction(), "test-hash@1")
+    await chroma.attach(AsyncEphemeralClient(HashEmbeddingFunction()))
+    # in-process clients share one system, so start every test empty
+    await chroma.recreate_collection()
+
+
+async def stored_chunks() -> dict:
+    stored = await chroma.run(lambda collection: collection.get(include=["metadatas"]))
+    return dict(zip(stored["ids"], stored["metadatas"]))
+
+
+def test_chunk_ids_are_content_addressed_per_source():
+    assert chunk_id("a.pdf", "text") == chunk_id("a.pdf", "text")
+    assert chunk_id("a.pdf", "text") != chunk_id("a.pdf", "other text")
+    # the same paragraph in two documents is two chunks
+    assert chunk_id("a.pdf", "text") != chunk_id("b.pdf", "text")
+    assert len(chunk_id("a.pdf", "text")) == 32
+
+
+def test_store_chunks_only_embeds_what_changed(state_dirs):
+    first = [article(1, "Supremacy of the Constitution."), article(2, "Defence of the Constitution."), article(3, "Citizens of Uganda.")]
+    revised = [first[0], article(2, "Defence of the Constitution, as amended."), first[2], article(4, "Citizenship by registration.")]
+
+    async def scenario():
+        await fresh_collection()
+        added = await store_chunks("Constitution.pdf", "hash-1", first)
+        changed = await store_chunks("Constitution.pdf", "hash-2", revised)
+        return added, changed, await stored_chunks()
+
+    added, changed, stored = asyncio.run(scenario())
+    assert added == {"added": 3, "unchanged": 0, "removed": 0}
+    assert changed == {"added": 2, "unchanged": 2, "removed": 1}
+
+    ids = [chunk_id("Constitution.pdf", chunk.text) for chunk in revised]
+    assert set(stored) == set(ids)
+    # unchanged chunks get their new position
+    assert stored[ids[2]]["chunk_index"] == 2
+    assert stored[ids[2]]["chunk"] == "3 of 4"
+    assert stored[ids[3]]["source_file"] == "Constitution.pdf"
+
+    manifest = load_manifest("Constitution.pdf")
+    assert (manifest["file_hash"], manifest["chunk_ids"]) == ("hash-2", ids)
+    assert manifest["embedding_model"] == "test-hash@1"
+    assert load_checkpoint("hash-2") == set()
+
+
+def test_identical_chunks_collapse_and_sources_stay_apart(state_dirs):
+    chunks = [article(1, "Repeated text."), article(1, "Repeated text."), article(2, "Other text.")]
+
+    async def scenario():
+        await fresh_collection()
+        first = await store_chunks("a.pdf", "hash-a", chunks)
+        second = await store_chunks("b.pdf", "hash-b", chunks[:1])
+        return first, second, await stored_chunks()
+
+    first, second, stored = asyncio.run(scenario())
+    assert first["added"] == 2 and second["added"] == 1
+    assert sorted(metadata["source_file"] for metadata in stored.values()) == ["a.pdf", "a.pdf", "b.pdf"]
@@ -0,0 +1,131 @@
+import pytest
+
+from src.chunking import (
+    CHUNK_SIZE,
+    chunk_articles,
+    chunk_blocks,
+    blocks_from_text,
+    document_kind,
+    peek_kind,
+    split_structured_text,
+)
+
+CONSTITUTION = "Constitution of the Republic of Uganda.txt"
+AMENDMENT_NO_2 = "Constitution Amendment No.2 Act of 2005.txt"
+AMENDMENT_ACT = "Constitutional Amendment Act 2005.txt"
+
+
+@pytest.fixture(scope="module")
+def constitution(sample_text):
+    return split_structured_text(sample_text(CONSTITUTION))
+
+
+@pytest.fixture(scope="module")
+def amendment_no_2(sample_text):
+    return split_structured_text(sample_text(AMENDMENT_NO_2))
+
+
+def first(chunks, **metadata):
+    return next(chunk for chunk in chunks if all(chunk.metadata.get(k) == v for k, v in metadata.items()))
+
+
+@pytest.mark.parametrize("name", [CONSTITUTION, AMENDMENT_NO_2, AMENDMENT_ACT])
+def test_chunks_fit_the_chunk_size(sample_text, name):
+    chunks = split_structured_text(sample_text(name))
+    assert chunks
+    assert max(len(chunk.text) for chunk in chunks) <= CHUNK_SIZE
+
+
+def test_document_kind(sample_text):
+    assert document_kind([sample_text(CONSTITUTION)]) == "constitution"
+    assert document_kind([sample_text(AMENDMENT_NO_2)]) == "act"
+    assert document_kind([sample_text(AMENDMENT_ACT)]) == "act"
+
+
+def test_kind_is_detected_from_the_first_blocks(sample_text):
+    for name, kind in ((CONSTITUTION, "constitution"), (AMENDMENT_NO_2, "act"), (AMENDMENT_ACT, "act")):
+        detected, blocks = peek_kind(blocks_from_text(sample_text(name)))
+        assert detected == kind
+        assert list(blocks) == list(blocks_from_text(sample_text(name)))
+    late = [("text", None, False)] * 5 + [("BE IT ENACTED by Parliament", None, False)]
+    assert peek_kind(iter(late), limit=5)[0] == "constitution"
+    assert peek_kind(iter(late), limit=6)[0] == "act"
+
+
+def test_chunks_are_yielded_as_the_blocks_arrive():
+    pulled = []
+
+    def blocks():
+        for number in range(1, 1000):
+            pulled.append(number)
+            yield f"## {number}. Article {number}", None, True
+            yield "(1) Some text.", None, False
+
+    chunks = chunk_blocks(blocks(), kind="constitution")
+    assert next(chunks).metadata["article"] == 1
+    assert len(pulled) == 2
+
+
+def test_constitution_chunks_carry_chapter_and_article(constitution):
+    assert {chunk.metadata["document_kind"] for chunk in constitution} == {"constitution"}
+    article = first(constitution, article=5)
+    assert article.text.startswith("## 5. The Republic of Uganda.")
+    assert article.metadata["chapter"] == 2
+    assert article.metadata["article_label"] == "5"
+    assert not any("section" in chunk.metadata for chunk in constitution)
+
+
+def test_act_sections_record_the_article_they_amend(amendment_no_2):
+    assert {chunk.metadata["document_kind"] for chunk in amendment_no_2} == {"act"}
+    assert not any("article" in chunk.metadata for chunk in amendment_no_2)
+
+    section = first(amendment_no_2, section=2)
+    assert section.text.startswith("## 2. Amendment of article 5 of the Constitution")
+    assert section.metadata["amends_article"] == 5
+
+    inserted = first(amendment_no_2, section=5)
+    assert (inserted.metadata["amends_article"], inserted.metadata["amends_article_label"]) == (178, "178A")
+
+
+def test_schedule_numbering_becomes_paragraphs(amendment_no_2):
+    paragraph = first(amendment_no_2, paragraph=1)
+    assert paragraph.text.startswith("## 1. Name of regional governments")
+    assert paragraph.metadata["section"] == 8
+    assert "amends_article" not in paragraph.metadata
+
+
+def test_overlap_within_an_article_but_not_across_articles():
+    words = " ".join(f"word{i}" for i in range(30))
+    blocks = [
+        ("## CHAPTER ONE-THE CONSTITUTION.", 1, True),
+        ("## 1. Supremacy of the Constitution.", 1, True),
+        (f"(1) {words}.", 1, False),
+        (f"(2) {words}.", 2, False),
+        ("## 2. Defence of the Constitution.", 2, True),
+        ("(1) Nothing here.", 2, False),
+    ]
+    chunks = list(chunk_blocks(blocks, chunk_size=400, overlap=100))
+
+    first_article = [chunk for chunk in chunks if chunk.metadata.get("article") == 1]
+    assert len(first_article) == 2
+    # the second chunk of article 1 starts with the end of the first
+    overlap = first_article[1].text.split("\n\n")[0]
+    assert overlap.startswith("word") and first_article[0].text.endswith(overlap)
+    assert first_article[1].metadata["clause"] == 2
+    assert first_article[1].metadata["page_end"] == 2
+
+    second = first(chunks, article=2)
+    assert second.text.startswith("## 2. Defence of the Constitution.")
+    assert second.metadata == {
+        "document_kind": "constitution",
+        "chapter": 1,
+        "article": 2,
+        "article_label": "2",
+        "page": 2,
+        "page_end": 2,
+    }
+
+
+def test_chunk_articles_follows_headings():
+    chunks = ["Preamble", "## 3. Citizens.", "more about citizens", "## 4. Registration."]
+    assert chunk_articles(chunks) == [None, 3, 3, 4]
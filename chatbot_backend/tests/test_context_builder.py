@@ -0,0 +1,54 @@
+from src.context_builder import ContextBuilder, estimate_tokens, overlap_length
+
+OPENING = "Parliament shall have power to make laws on any matter for the peace, order, development and good governance of Uganda."
+OVERLAP = "order, development and good governance of Uganda."
+FOLLOWING = OVERLAP + " Except as provided in this Constitution, no person or body other than Parliament shall have power to make provisions."
+
+
+def at(source: str, index: int) -> dict:
+    return {"source_file": source, "chunk_index": index}
+
+
+def test_overlap_length():
+    assert overlap_length(OPENING, FOLLOWING) == len(OVERLAP)
+    assert overlap_length(OPENING, "2. Amendment of article 5 of the Constitution.") == 0
+    # shared runs shorter than MIN_OVERLAP are treated as coincidence
+    assert overlap_length("ends with Uganda.", "Uganda. starts") == 0
+
+
+def test_adjacent_chunks_merge_without_repeating_the_overlap():
+    context, stats = ContextBuilder(1000).build([FOLLOWING, OPENING], [at("c.pdf", 8), at("c.pdf", 7)])
+    assert context == OPENING + FOLLOWING[len(OVERLAP):]
+    assert stats["segments"] == 1
+    assert stats["tokens_saved"] > 0
+
+
+def test_chunks_without_overlap_stay_a_paragraph_apart():
+    article = "2. Amendment of article 5 of the Constitution."
+    context, _ = ContextBuilder(1000).build([OPENING, article], [at("c.pdf", 1), at("c.pdf", 2)])
+    assert context == OPENING + "\n\n" + article
+
+
+def test_only_consecutive_chunks_of_one_source_merge():
+    documents = ["first chunk", "third chunk", "other source", "no position"]
+    metadatas = [at("a.pdf", 1), at("a.pdf", 3), at("b.pdf", 2), {}]
+    context, stats = ContextBuilder(1000).build(documents, metadatas)
+    # kept in retrieval rank order
+    assert context.split("\n\n") == documents
+    assert stats["segments"] == 4
+
+
+def test_duplicates_are_dropped_and_the_budget_is_respected():
+    long = "x" * 400
+    documents = [long, long, "y" * 400, "z" * 40]
+    metadatas = [at("a.pdf", 1), at("a.pdf", 1), at("b.pdf", 5), at("c.pdf", 9)]
+    context, stats = ContextBuilder(120).build(documents, metadatas)
+    assert context == long + "\n\n" + "z" * 40
+    assert stats["dropped_segments"] == 1
+    assert estimate_tokens(context) <= 120
+
+
+def test_best_segment_is_trimmed_when_nothing_fits():
+    context, stats = ContextBuilder(10).build(["w" * 200], [at("a.pdf", 0)])
+    assert context == "w" * 40
+    assert stats["dropped_segments"] == 1
@@ -0,0 +1,79 @@
+import asyncio
+
+from src.embeddings import EmbeddingService
+
+
+class CountingFunction:
+    """Embeds a text as [length, number of words] and records every model call."""
+
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("model down")
+        return [[len(text), len(text.split())] for text in texts]
+
+
+def service(function, window=0.01, max_batch=8, cache_size=2):
+    embeddings = EmbeddingService("test", "1", window, max_batch, cache_size)
+    embeddings.use(function, "test@1")
+    return embeddings
+
+
+def test_queries_in_one_window_share_a_model_call():
+    function = CountingFunction()
+    embeddings = service(function)
+    vectors = asyncio.run(embeddings.embed_queries(["article 12", "section 3", "article 12"]))
+    assert vectors == [[10.0, 2.0], [9.0, 2.0], [10.0, 2.0]]
+    assert function.calls == [["article 12", "section 3"]]
+    stats = embeddings.stats()
+    assert (stats["query_batches"], stats["coalesced"], stats["avg_query_batch"]) == (1, 1, 2.0)
+
+
+def test_a_full_batch_is_flushed_before_the_window():
+    function = CountingFunction()
+    embeddings = service(function, window=60, max_batch=2)
+    vectors = asyncio.run(asyncio.wait_for(embeddings.embed_queries(["a", "bb"]), timeout=5))
+    assert vectors == [[1.0, 1.0], [2.0, 1.0]]
+    assert function.calls == [["a", "bb"]]
+
+
+def test_cache_is_lru_and_bounded():
+    function = CountingFunction()
+    embeddings = service(function, cache_size=2)
+
+    async def scenario():
+        for text in ("one", "two", "one", "three", "one", "two"):
+            await embeddings.embed_query(text)
+
+    asyncio.run(scenario())
+    # "two" was the least recently used when "three" came in
+    assert function.calls == [["one"], ["two"], ["three"], ["two"]]
+    stats = embeddings.stats()
+    assert (stats["cache_hits"], stats["cache_entries"]) == (2, 2)
+
+
+def test_a_failed_batch_reaches_every_caller_and_is_not_cached():
+    function = CountingFunction(fail=True)
+    embeddings = service(function)
+
+    async def scenario():
+        results = await asyncio.gather(embeddings.embed_query("x"), embeddings.embed_query("x"), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        function.fail = False
+        return await embeddings.embed_query("x")
+
+    assert asyncio.run(scenario()) == [1.0, 1.0]
+    assert embeddings.stats()["errors"] == 1
+    assert len(function.calls) == 2
+
+
+def test_swapping_the_model_clears_the_cache():
+    embeddings = service(CountingFunction())
+    asyncio.run(embeddings.embed_query("q"))
+    embeddings.use(CountingFunction(), "other@2")
+    assert embeddings.stats()["cache_entries"] == 0
+    assert embeddings.stats()["model"] == "other@2"
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from src.history_store import HistoryStore, decode_cursor, encode_cursor
+
+SYSTEM_PROMPT = "You are a legal assistant."
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(tmp_path / "history.db", pool_size=2)
+    yield store
+    store.close()
+
+
+def turn(question: str, answer: str, at: str):
+    return [("human", question, at), ("ai", answer, at)]
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_system_prompt_is_only_stored_for_new_chats(store):
+    run(store.save_turns([
+        ("u", "c", turn("q1", "a1", "2025-01-01T00:00:01")),
+        ("u", "c", turn("q2", "a2", "2025-01-01T00:00:02")),
+    ], system_prompt=SYSTEM_PROMPT))
+    messages, _ = run(store.get_chat_history("u", "c", 10))
+    assert [m["role"] for m in messages] == ["system", "human", "ai", "human", "ai"]
+    assert messages[0]["message"] == SYSTEM_PROMPT
+
+
+def test_chats_are_per_user(store):
+    run(store.save_turn("u", "c", turn("mine", "a", "2025-01-01T00:00:00")))
+    run(store.save_turn("other", "c", turn("theirs", "a", "2025-01-01T00:00:00")))
+    messages, _ = run(store.get_chat_history("u", "c", 10))
+    assert [m["message"] for m in messages] == ["mine", "a"]
+
+
+def test_delete_chat(store):
+    run(store.save_turn("u", "c", turn("q", "a", "2025-01-01T00:00:00")))
+    run(store.delete_chat("u", "c"))
+    assert run(store.get_chat_history("u", "c", 10)) == ([], None)
+
+
+def test_cursor_round_trip():
+    assert encode_cursor(None) is None
+    assert decode_cursor(encode_cursor(["2025-01-01", "chat"])) == ["2025-01-01", "chat"]
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+def test_history_pages(store):
+    for i in range(3):
+        run(store.save_turn("u", "c", turn(f"q{i}", f"a{i}", f"2025-01-01T00:00:0{i}")))
+    first, cursor = run(store.get_chat_history("u", "c", 4))
+    rest, end = run(store.get_chat_history("u", "c", 4, cursor))
+    assert [m["message"] for m in first + rest] == ["q0", "a0", "q1", "a1", "q2", "a2"]
+    assert end is None
+
+
+def test_chats_listed_by_latest_activity(store):
+    run(store.save_turn("u", "old", turn("first question", "a", "2025-01-01T00:00:00")))
+    run(store.save_turn("u", "new", turn("second question", "a", "2025-01-02T00:00:00")))
+    run(store.save_turn("other", "x", turn("not mine", "a", "2025-01-03T00:00:00")))
+
+    page, cursor = run(store.list_user_chats("u", 1))
+    assert [(c["chat_id"], c["title"], c["message_count"]) for c in page] == [("new", "second question", 2)]
+    rest, end = run(store.list_user_chats("u", 1, cursor))
+    assert [c["chat_id"] for c in rest] == ["old"] and end is None
+
+
+def test_chat_version_changes_on_writes_and_recreation(store):
+    assert run(store.get_chat_version("u", "c")) is None
+    run(store.save_turn("u", "c", turn("q1", "a1", "2025-01-01T00:00:01")))
+    first = run(store.get_chat_version("u", "c"))
+    run(store.save_turn("u", "c", turn("q2", "a2", "2025-01-01T00:00:02")))
+    second = run(store.get_chat_version("u", "c"))
+    assert first == ("2025-01-01T00:00:01", 1) and second == ("2025-01-01T00:00:01", 2)
+
+    # a chat recreated under a deleted chat's id must not look like the old one
+    run(store.delete_chat("u", "c"))
+    assert run(store.get_chat_version("u", "c")) is None
+    run(store.save_turn("u", "c", turn("q", "a", "2025-01-03T00:00:00")))
+    assert run(store.get_chat_version("u", "c")) not in (first, second)
+
+
+def test_memory_window_and_turn_messages(store):
+    for i in range(4):
+        run(store.save_turn("u", "c", turn(f"q{i}", f"a{i}", f"2025-01-01T00:00:0{i}"), system_prompt=SYSTEM_PROMPT))
+    run(store.save_memory("u", "c", "talked about q0", 1))
+    memory = run(store.load_memory("u", "c", 2))
+    assert memory["summary"] == "talked about q0"
+    assert (memory["summarized_turns"], memory["total_turns"]) == (1, 4)
+    assert memory["recent"] == [("human", "q2"), ("ai", "a2"), ("human", "q3"), ("ai", "a3")]
+    assert run(store.get_turn_messages("u", "c", 1, 2)) == [("human", "q1"), ("ai", "a1")]
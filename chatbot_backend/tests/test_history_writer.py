@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from src.history_store import HistoryStore
+from src.history_writer import HistoryWriter
+
+SYSTEM_PROMPT = "You are a legal assistant."
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(tmp_path / "history.db", pool_size=2)
+    yield store
+    store.close()
+
+
+def turn(question: str, answer: str, at: str):
+    return [("human", question, at), ("ai", answer, at)]
+
+
+def test_history_writer_batches_and_waits(store):
+    saved = []
+
+    async def scenario():
+        writer = HistoryWriter(store, SYSTEM_PROMPT, max_batch=10, on_saved=lambda user, chat: saved.append(chat))
+        futures = [writer.submit("u", chat, turn(f"q-{chat}", "a", "2025-01-01T00:00:00")) for chat in ("a", "b", "a")]
+        await writer.wait("u", "a")
+        results = await asyncio.gather(*futures)
+        await writer.shutdown()
+        return results, writer.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [True, True, True]
+    assert (stats["written"], stats["batches"], stats["chats_pending"]) == (3, 1, 0)
+    assert saved == ["a", "b", "a"]
+    messages, _ = asyncio.run(store.get_chat_history("u", "a", 10))
+    assert [m["message"] for m in messages] == [SYSTEM_PROMPT, "q-a", "a", "q-a", "a"]
+
+
+def test_history_writer_keeps_the_rest_of_a_failed_batch(store, monkeypatch):
+    original = store.save_turns
+
+    async def save_turns(turns, system_prompt=None):
+        if any(chat_id == "bad" for _, chat_id, _ in turns):
+            raise RuntimeError("boom")
+        await original(turns, system_prompt=system_prompt)
+
+    monkeypatch.setattr(store, "save_turns", save_turns)
+
+    async def scenario():
+        writer = HistoryWriter(store, None, max_batch=10)
+        futures = [writer.submit("u", chat, turn("q", "a", "2025-01-01T00:00:00")) for chat in ("good", "bad")]
+        results = await asyncio.gather(*futures)
+        await writer.shutdown()
+        return results, writer.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [True, False]
+    assert (stats["written"], stats["failed"]) == (1, 1)
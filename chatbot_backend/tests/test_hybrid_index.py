@@ -0,0 +1,100 @@
+import pytest
+
+from src.chunking import split_structured_text
+from src.hybrid_index import (
+    HybridIndex,
+    parse_references,
+    parse_scope,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+
+SOURCES = (
+    "Constitution of the Republic of Uganda.txt",
+    "Constitution Amendment No.2 Act of 2005.txt",
+    "Constitutional Amendment Act 2005.txt",
+)
+
+
+@pytest.fixture(scope="module")
+def index(sample_text):
+    ids, documents, metadatas = [], [], []
+    for name in SOURCES:
+        source_file = name.replace(".txt", ".pdf")
+        for i, chunk in enumerate(split_structured_text(sample_text(name))):
+            ids.append(f"{source_file}:{i}")
+            documents.append(chunk.text)
+            metadatas.append({"source_file": source_file, "chunk_index": i, **chunk.metadata})
+    index = HybridIndex()
+    index.load(ids, documents, metadatas)
+    return index
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("What does the Constitution say about Citizens?") == ["constitution", "about", "citizens"]
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("What does article 5 say?", [5]),
+    ("Compare Article 12 with art. 21", [12, 21]),
+    ("What does section 5 of the Act say?", []),
+    ("How old must a president be?", []),
+])
+def test_parse_references(question, expected):
+    assert parse_references(question) == expected
+
+
+def test_parse_scope():
+    assert parse_scope("rights in chapter four") == {"chapter": 4}
+    assert parse_scope("Chapter 7 on the executive") == {"chapter": 7}
+    # two chapters can't both be a filter
+    assert parse_scope("chapter 4 and chapter 5") == {}
+    assert parse_scope("who is a citizen") == {}
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c"], ["b"]], k=60)
+    assert [id_ for id_, _ in fused] == ["b", "c", "a"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61 + 1 / 61)
+
+
+def test_lookup_articles_is_scoped_to_the_constitution(index):
+    ids = index.lookup_articles([5])
+    kinds = [index.get(id_)[1]["document_kind"] for id_ in ids]
+    # the article itself first, then the Act sections that amend it
+    assert kinds[0] == "constitution"
+    assert kinds == sorted(kinds, key=lambda kind: kind != "constitution")
+    assert index.get(ids[0])[0].startswith("## 5. The Republic of Uganda.")
+
+    amending = [index.get(id_)[1] for id_ in ids if index.get(id_)[1]["document_kind"] == "act"]
+    assert amending and all(metadata["amends_article"] == 5 for metadata in amending)
+    # section 5 of an Act is not article 5
+    assert all(metadata["section"] != 5 for metadata in amending)
+
+
+def test_search_ranks_matching_chunks_and_applies_filters(index):
+    results = index.search("citizenship by registration", 5)
+    assert results
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+
+    filtered = index.search("citizenship by registration", 5, {"chapter": 3})
+    assert filtered
+    assert all(index.get(id_)[1]["chapter"] == 3 for id_, _ in filtered)
+
+
+def test_load_replaces_and_clear_empties():
+    index = HybridIndex()
+    index.load(["a"], ["parliament shall make laws"], [{"document_kind": "constitution", "article": 79}])
+    assert index.loaded and len(index) == 1
+    assert index.lookup_articles([79]) == ["a"]
+
+    index.load(["b"], ["the president is the head of state"], [{"document_kind": "constitution", "article": 98}])
+    assert index.get("a") is None
+    assert index.lookup_articles([79]) == []
+    assert [id_ for id_, _ in index.search("president", 5)] == ["b"]
+
+    index.clear()
+    assert len(index) == 0
+    assert index.search("president", 5) == []
+    assert index.stats()["chunks"] == 0
@@ -0,0 +1,57 @@
+from src.ingestion_state import (
+    LEGACY_CHUNKER,
+    LEGACY_EMBEDDING_MODEL,
+    clear_all,
+    find_source_by_hash,
+    list_manifests,
+    load_checkpoint,
+    load_manifest,
+    manifest_chunker,
+    manifest_embedding_model,
+    save_checkpoint,
+    save_manifest,
+)
+
+
+def test_manifest_round_trip(state_dirs):
+    assert load_manifest("Constitution.pdf") is None
+    save_manifest("Constitution.pdf", "hash-1", ["id-1", "id-2"], "model@1", "structured-2")
+    manifest = load_manifest("Constitution.pdf")
+    assert manifest["file_hash"] == "hash-1"
+    assert manifest["chunk_ids"] == ["id-1", "id-2"]
+    assert manifest_embedding_model(manifest) == "model@1"
+    assert manifest_chunker(manifest) == "structured-2"
+    assert [m["source_file"] for m in list_manifests()] == ["Constitution.pdf"]
+
+
+def test_manifests_from_before_models_and_chunkers_were_recorded():
+    legacy = {"source_file": "a.pdf", "file_hash": "h", "chunk_ids": []}
+    assert manifest_embedding_model(legacy) == LEGACY_EMBEDDING_MODEL
+    assert manifest_chunker(legacy) == LEGACY_CHUNKER
+
+
+def test_find_source_by_hash_follows_the_current_version(state_dirs):
+    save_manifest("Constitution.pdf", "hash-1", [], "model@1", "structured-2")
+    assert find_source_by_hash("hash-1") == "Constitution.pdf"
+    # a revised upload of the same source replaces the old content
+    save_manifest("Constitution.pdf", "hash-2", [], "model@1", "structured-2")
+    assert find_source_by_hash("hash-1") is None
+    assert find_source_by_hash("hash-2") == "Constitution.pdf"
+    assert find_source_by_hash("unknown") is None
+
+
+def test_checkpoints(state_dirs):
+    assert load_checkpoint("hash-1") == set()
+    save_checkpoint("hash-1", ["id-1", "id-2"])
+    assert load_checkpoint("hash-1") == {"id-1", "id-2"}
+
+
+def test_clear_all(state_dirs):
+    save_manifest("Constitution.pdf", "hash-1", ["id-1"], "model@1", "structured-2")
+    save_checkpoint("hash-2", ["id-2"])
+    clear_all()
+    assert load_manifest("Constitution.pdf") is None
+    assert find_source_by_hash("hash-1") is None
+    assert load_checkpoint("hash-2") == set()
+    assert list_manifests() == []
+
@@ -0,0 +1,94 @@
+import pytest
+
+from src.job_queue import JobQueue, PRIORITY_STARTUP, PRIORITY_UPLOAD
+
+LEASE_SECS = 30
+
+
+@pytest.fixture
+def queue(tmp_path) -> JobQueue:
+    return JobQueue(tmp_path / "jobs.db", max_attempts=2, retry_base=0.0, lease_secs=LEASE_SECS)
+
+
+def expire_lease(queue: JobQueue, job_id: str):
+    """Age a running job's heartbeat past its lease, as if its worker had died."""
+    queue._connection().execute(
+        '''UPDATE jobs SET heartbeat_at = heartbeat_at - ? WHERE id = ?''', (LEASE_SECS + 1, job_id)
+    )
+
+
+def test_claims_by_priority_then_age(queue):
+    scan = queue.enqueue("scan_directory", {}, PRIORITY_STARTUP)
+    first = queue.enqueue("ingest", {"path": "a.pdf"}, PRIORITY_UPLOAD)
+    second = queue.enqueue("ingest", {"path": "b.pdf"}, PRIORITY_UPLOAD)
+    claimed = [queue.claim("w")["id"] for _ in range(3)]
+    assert claimed == [first["id"], second["id"], scan["id"]]
+    assert queue.claim("w") is None
+
+
+def test_enqueue_dedupes_only_against_queued_jobs(queue):
+    job = queue.enqueue("ingest", {"path": "a.pdf"}, dedupe_key="ingest:a.pdf")
+    assert queue.enqueue("ingest", {"path": "a.pdf"}, dedupe_key="ingest:a.pdf")["id"] == job["id"]
+    queue.claim("w")
+    # a file re-uploaded while it is being ingested needs another pass
+    assert queue.enqueue("ingest", {"path": "a.pdf"}, dedupe_key="ingest:a.pdf")["id"] != job["id"]
+
+
+def test_complete_stores_the_result(queue):
+    job = queue.enqueue("ingest", {"path": "a.pdf"})
+    claimed = queue.claim("w")
+    assert (claimed["status"], claimed["attempts"], claimed["worker"]) == ("running", 1, "w")
+    queue.heartbeat(job["id"], {"status": "embedding"})
+    assert queue.get(job["id"])["progress"] == {"status": "embedding"}
+    queue.complete(job["id"], {"added": 3})
+    done = queue.get(job["id"])
+    assert (done["status"], done["result"]) == ("succeeded", {"added": 3})
+    assert queue.counts() == {"queued": 0, "running": 0, "succeeded": 1, "failed": 0}
+
+
+def test_fail_retries_until_out_of_attempts(queue):
+    job = queue.enqueue("ingest", {"path": "a.pdf"})
+    queue.claim("w")
+    assert queue.fail(job["id"], "boom")["status"] == "queued"
+    assert queue.claim("w")["attempts"] == 2
+    failed = queue.fail(job["id"], "boom again")
+    assert (failed["status"], failed["error"]) == ("failed", "boom again")
+
+
+def test_claim_takes_back_expired_leases(queue):
+    job = queue.enqueue("ingest", {"path": "a.pdf"})
+    queue.claim("crashed")
+    # still leased: nobody else gets it
+    assert queue.claim("w") is None
+
+    expire_lease(queue, job["id"])
+    reclaimed = queue.claim("w")
+    assert (reclaimed["id"], reclaimed["worker"], reclaimed["attempts"]) == (job["id"], "w", 2)
+
+
+def test_expired_lease_on_the_last_attempt_fails_the_job(queue):
+    job = queue.enqueue("ingest", {"path": "a.pdf"})
+    queue.claim("w")
+    queue.fail(job["id"], "boom")
+    queue.claim("w")
+    expire_lease(queue, job["id"])
+    assert queue.claim("w") is None
+    failed = queue.get(job["id"])
+    assert failed["status"] == "failed"
+    assert "Lease expired" in failed["error"]
+
+
+def test_heartbeat_keeps_the_lease(queue):
+    job = queue.enqueue("ingest", {"path": "a.pdf"})
+    queue.claim("w")
+    expire_lease(queue, job["id"])
+    queue.heartbeat(job["id"])
+    assert queue.requeue_stale() == 0
+    assert queue.get(job["id"])["status"] == "running"
+
+
+def test_collection_version(queue):
+    assert queue.collection_version() == 0
+    assert queue.bump_collection_version() == 1
+    assert queue.bump_collection_version() == 2
+    assert queue.collection_version() == 2
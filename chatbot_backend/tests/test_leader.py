@@ -0,0 +1,33 @@
+import asyncio
+import os
+
+from src.leader import LeaderLock
+
+
+def test_only_one_process_leads(tmp_path):
+    path = tmp_path / "locks" / "leader.lock"
+    first, second = LeaderLock(path), LeaderLock(path)
+    assert first.try_acquire()
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    assert (first.is_leader, second.is_leader) == (True, False)
+    assert path.read_text() == str(os.getpid())
+    first.release()
+    first.release()
+    assert second.try_acquire()
+    second.release()
+
+
+def test_follower_takes_over_when_the_leader_goes(tmp_path):
+    async def scenario(path):
+        leader, follower = LeaderLock(path), LeaderLock(path)
+        assert leader.try_acquire()
+        waiting = asyncio.create_task(follower.wait(interval=0.01))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        leader.release()
+        await asyncio.wait_for(waiting, timeout=5)
+        assert follower.is_leader
+        follower.release()
+
+    asyncio.run(scenario(tmp_path / "leader.lock"))
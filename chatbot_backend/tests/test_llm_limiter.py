@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from src.llm_limiter import LLMLimiter, LLMOverloadedError
+
+
+def test_callers_queue_for_a_slot():
+    limiter = LLMLimiter(max_concurrency=1, max_queue=2, queue_timeout=1)
+    order = []
+
+    async def call(name):
+        async with limiter.slot():
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        await asyncio.gather(call("a"), call("b"), call("c"))
+
+    asyncio.run(scenario())
+    assert order == ["a", "b", "c"]
+    assert limiter.stats()["completed"] == 3
+    assert limiter.stats()["rejected"] == 0
+
+
+def test_full_queue_is_rejected():
+    limiter = LLMLimiter(max_concurrency=1, max_queue=1, queue_timeout=1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert (limiter.stats()["active"], limiter.stats()["waiting"]) == (1, 1)
+        assert not limiter.has_spare_capacity()
+        with pytest.raises(LLMOverloadedError):
+            limiter.check_capacity()
+        with pytest.raises(LLMOverloadedError):
+            async with limiter.slot():
+                pass
+        release.set()
+        await asyncio.gather(holder, waiter)
+
+    asyncio.run(scenario())
+    assert limiter.stats()["rejected"] == 2
+    assert limiter.has_spare_capacity()
+
+
+def test_queue_timeout_is_rejected():
+    limiter = LLMLimiter(max_concurrency=1, max_queue=4, queue_timeout=0.01)
+
+    async def scenario():
+        async with limiter.slot():
+            with pytest.raises(LLMOverloadedError, match="Timed out"):
+                async with limiter.slot():
+                    pass
+
+    asyncio.run(scenario())
+    assert limiter.stats()["waiting"] == 0
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_overload_is_a_503_with_retry_after(monkeypatch):
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+
+    import app
+
+    class Saturated(LLMLimiter):
+        def check_capacity(self):
+            raise LLMOverloadedError("LLM queue is full, try again shortly.", retry_after=7)
+
+    monkeypatch.setattr(app, "llm_limiter", Saturated(1, 1, 1))
+    response = TestClient(app.app).post("/api/chat/stream", json={"user_id": "u", "chat_id": "c", "question": "q"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "7"
+    assert response.json() == {"detail": "LLM queue is full, try again shortly."}
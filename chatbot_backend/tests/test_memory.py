@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.language_models import FakeListChatModel
+
+import src.memory
+from src.history_store import HistoryStore
+from src.llm_limiter import LLMLimiter
+from src.memory import ConversationMemory
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(tmp_path / "history.db", pool_size=2)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = LLMLimiter(max_concurrency=1, max_queue=1, queue_timeout=1)
+    monkeypatch.setattr(src.memory, "llm_limiter", limiter)
+    return limiter
+
+
+def save_turns(store, count):
+    for i in range(count):
+        at = f"2025-01-01T00:00:0{i}"
+        asyncio.run(store.save_turn("u", "c", [("human", f"q{i}", at), ("ai", f"a{i}", at)]))
+
+
+def test_summary_covers_turns_outside_the_window(store, limiter):
+    save_turns(store, 3)
+    memory = ConversationMemory(store, lambda: FakeListChatModel(responses=["the summary"]), recent_turns=1, max_chars=100)
+    asyncio.run(memory._update("u", "c"))
+    state = asyncio.run(memory.load("u", "c"))
+    assert (state["summary"], state["summarized_turns"]) == ("the summary", 2)
+    assert memory._locks == {}
+
+
+def test_summary_is_skipped_while_the_llm_is_busy(store, limiter):
+    save_turns(store, 3)
+    memory = ConversationMemory(store, lambda: FakeListChatModel(responses=["the summary"]), recent_turns=1, max_chars=100)
+
+    async def scenario():
+        async with limiter.slot():
+            await memory._update("u", "c")
+        skipped = await memory.load("u", "c")
+        await memory._update("u", "c")
+        return skipped, await memory.load("u", "c")
+
+    skipped, updated = asyncio.run(scenario())
+    assert (skipped["summary"], skipped["summarized_turns"]) == ("", 0)
+    assert updated["summarized_turns"] == 2
+    assert limiter.stats()["completed"] == 2
@@ -0,0 +1,32 @@
+import json
+
+from src.metrics import Registry
+
+
+def registry_with(requests: float, seconds: float) -> Registry:
+    registry = Registry()
+    registry.counter("requests_total", "Requests.").inc(requests, route="/api/chat")
+    registry.histogram("request_seconds", "Durations.", buckets=(1.0,)).observe(seconds, route="/api/chat")
+    return registry
+
+
+def test_render_all_adds_up_every_process(tmp_path):
+    other = registry_with(2, 5.0)
+    (tmp_path / "1.json").write_text(json.dumps({metric.name: metric.snapshot() for metric in other._metrics}))
+    # unreadable snapshots are skipped rather than failing the scrape
+    (tmp_path / "2.json").write_text("{")
+
+    text = registry_with(3, 0.5).render_all(tmp_path)
+    assert 'requests_total{route="/api/chat"} 5.0' in text
+    assert 'request_seconds_bucket{route="/api/chat",le="1.0"} 1' in text
+    assert 'request_seconds_bucket{route="/api/chat",le="+Inf"} 2' in text
+    assert 'request_seconds_sum{route="/api/chat"} 5.5' in text
+
+
+def test_snapshots_replace_the_previous_one(tmp_path):
+    registry = registry_with(1, 0.1)
+    registry.write_snapshot(tmp_path)
+    registry._metrics[0].inc(route="/api/chat")
+    text = registry.render_all(tmp_path)
+    assert 'requests_total{route="/api/chat"} 2.0' in text
+    assert [path.suffix for path in tmp_path.iterdir()] == [".json"]
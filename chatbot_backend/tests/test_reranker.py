@@ -0,0 +1,75 @@
+import asyncio
+
+from src.reranker import Reranker
+
+
+class FakeCrossEncoder:
+    """Scores each document by the number in it and records how many pairs it saw."""
+
+    def __init__(self, fail: bool = False):
+        self.pairs = 0
+        self.fail = fail
+
+    def predict(self, pairs, batch_size, show_progress_bar):
+        if self.fail:
+            raise RuntimeError("model down")
+        self.pairs += len(pairs)
+        return [float(document.split()[-1]) for _, document in pairs]
+
+
+def results(scores):
+    ids = [f"c{i}" for i in range(len(scores))]
+    return {
+        "ids": [ids],
+        "documents": [[f"chunk {score}" for score in scores]],
+        "metadatas": [[{"id": id_} for id_ in ids]],
+        "distances": [[0.1] * len(scores)],
+    }
+
+
+def reranker(model, top_n=2, margin=100.0):
+    reranker = Reranker("fake", max_candidates=12, batch_size=3, top_n=top_n, margin=margin, cache_size=100)
+    reranker._model = model
+    return reranker
+
+
+def test_confident_queries_stop_after_the_first_batches():
+    model = FakeCrossEncoder()
+    ranked = asyncio.run(reranker(model).rerank("q", results([9, 8, 1, 2, 1, 0, 7, 7, 7, 7, 7, 7])))
+    # the second batch is below the top-2 cut-off of the first, so scoring stops there
+    assert model.pairs == 6
+    assert ranked["ids"] == [["c0", "c1"]]
+    assert ranked["distances"] == [[-9.0, -8.0]]
+
+
+def test_ambiguous_queries_go_deeper():
+    model = FakeCrossEncoder()
+    scorer = reranker(model)
+    ranked = asyncio.run(scorer.rerank("q", results([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12])))
+    assert model.pairs == 12
+    assert ranked["ids"] == [["c11", "c10"]]
+    assert scorer.stats()["early_stops"] == 0
+
+
+def test_margin_drops_weak_candidates():
+    ranked = asyncio.run(reranker(FakeCrossEncoder(), top_n=3, margin=2.0).rerank("q", results([9, 8, 1])))
+    assert ranked["ids"] == [["c0", "c1"]]
+
+
+def test_failures_and_disabled_keep_retrieval_order():
+    retrieved = results([1, 2, 3])
+    scorer = reranker(FakeCrossEncoder(fail=True))
+    assert asyncio.run(scorer.rerank("q", retrieved)) is retrieved
+    assert scorer.stats()["errors"] == 1
+
+    unloaded = Reranker("fake", 12, 3, 2, 1.0, 100)
+    assert asyncio.run(unloaded.rerank("q", retrieved)) is retrieved
+
+
+def test_scores_are_cached_per_question_and_chunk():
+    model = FakeCrossEncoder()
+    scorer = reranker(model)
+    asyncio.run(scorer.rerank("q", results([3, 2, 1])))
+    asyncio.run(scorer.rerank("q", results([3, 2, 1])))
+    assert model.pairs == 3
+    assert scorer.stats()["cache_hits"] == 3
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("chromadb")
+
+import src.retrieval
+from src.chunking import split_structured_text
+from src.hybrid_index import HybridIndex
+from src.retrieval import retrieve, retrieve_many
+
+CONSTITUTION = "Constitution of the Republic of Uganda"
+
+
+@pytest.fixture
+def index(sample_text, monkeypatch):
+    chunks = split_structured_text(sample_text(f"{CONSTITUTION}.txt"))
+    index = HybridIndex()
+    index.load(
+        [f"c:{i}" for i in range(len(chunks))],
+        [chunk.text for chunk in chunks],
+        [{"source_file": f"{CONSTITUTION}.pdf", "chunk_index": i, **chunk.metadata} for i, chunk in enumerate(chunks)]
+    )
+    monkeypatch.setattr(src.retrieval, "hybrid_index", index)
+    return index
+
+
+@pytest.fixture
+def vector_queries(monkeypatch):
+    queries = []
+
+    async def query_documents(question, top_k, filters=None):
+        queries.append(question)
+        return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+
+    async def query_documents_many(questions, top_k):
+        queries.extend(questions)
+        return {key: [[] for _ in questions] for key in ("ids", "documents", "metadatas", "distances")}
+
+    monkeypatch.setattr(src.retrieval, "query_documents", query_documents)
+    monkeypatch.setattr(src.retrieval, "query_documents_many", query_documents_many)
+    return queries
+
+
+def test_exact_matches_filling_top_k_skip_the_vector_search(index, vector_queries):
+    article = index.lookup_articles([21])
+    assert article
+    results = asyncio.run(retrieve("What does article 21 say?", top_k=len(article)))
+    assert results["ids"] == [article]
+    assert results["distances"][0] == sorted(results["distances"][0], reverse=True)
+    assert vector_queries == []
+
+
+def test_too_few_exact_matches_are_fused_with_the_searches(index, vector_queries):
+    article = index.lookup_articles([21])
+    results = asyncio.run(retrieve("What does article 21 say?", top_k=len(article) + 1))
+    assert vector_queries == ["What does article 21 say?"]
+    assert results["ids"][0][0] == article[0]
+    assert len(results["ids"][0]) == len(article) + 1
+
+
+def test_retrieve_many_only_queries_what_it_must(index, vector_queries):
+    top_k = len(index.lookup_articles([21]))
+    results = asyncio.run(retrieve_many(["article 21", "equality before the law"], top_k=top_k))
+    assert vector_queries == ["equality before the law"]
+    assert results[0]["ids"] == [index.lookup_articles([21])]
+    assert results[1]["ids"][0]
@@ -0,0 +1,67 @@
+import asyncio
+import string
+
+import numpy as np
+import pytest
+
+from src.semantic_cache import SemanticCache, question_references
+
+
+def letter_counts(text: str) -> np.ndarray:
+    """A crude embedding under which questions that only reorder digits are identical."""
+    alphabet = string.ascii_lowercase + string.digits
+    vector = np.array([text.lower().count(char) for char in alphabet], dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def cache() -> SemanticCache:
+    cache = SemanticCache(threshold=0.92, max_entries=10, ttl=60)
+
+    async def embed(text: str) -> np.ndarray:
+        return letter_counts(text)
+
+    cache.embed = embed
+    return cache
+
+
+def ask(cache: SemanticCache, question: str):
+    return asyncio.run(cache.lookup(question))
+
+
+def remember(cache: SemanticCache, question: str, answer: str):
+    _, vector = ask(cache, question)
+    cache.put(vector, question, answer, "", cache.generation)
+
+
+def test_question_references():
+    assert question_references("What does Article 12 say?") == (frozenset({12}), frozenset())
+    assert question_references("articles 3 and art. 4 of chapter four") == (frozenset({3, 4}), frozenset({4}))
+
+
+def test_similar_question_hits(cache):
+    remember(cache, "What does article 12 say?", "Article 12 answer")
+    hit, _ = ask(cache, "what does article 12 say")
+    assert hit is not None and hit.answer == "Article 12 answer"
+
+
+def test_different_article_does_not_hit(cache):
+    remember(cache, "What does article 12 say?", "Article 12 answer")
+    hit, _ = ask(cache, "What does article 21 say?")
+    assert hit is None
+    assert cache.stats()["reference_mismatches"] == 1
+
+
+def test_falls_back_to_entry_with_matching_references(cache):
+    remember(cache, "What does article 12 say?", "Article 12 answer")
+    remember(cache, "what does article 21 say", "Article 21 answer")
+    hit, _ = ask(cache, "What does article 21 say?")
+    assert hit is not None and hit.answer == "Article 21 answer"
+
+
+def test_invalidate_skips_stale_answers(cache):
+    _, vector = ask(cache, "What does article 12 say?")
+    generation = cache.generation
+    cache.invalidate()
+    cache.put(vector, "What does article 12 say?", "stale", "", generation)
+    assert ask(cache, "What does article 12 say?")[0] is None
@@ -0,0 +1,88 @@
+import asyncio
+import io
+
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi import FastAPI, Request, UploadFile
+from fastapi.testclient import TestClient
+
+from src.ingestion_state import record_source_name, source_name
+from src.uploads import UploadLimitMiddleware, UploadTooLargeError, content_addressed_name, store_upload
+
+
+def upload(name: str, content: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=name)
+
+
+def test_source_name_of_stored_uploads(tmp_path):
+    stored = tmp_path / "Constitution-0123456789ab.pdf"
+    stored.write_bytes(b"%PDF")
+    # files that were never uploaded are their own source
+    assert source_name(stored) == stored.name
+    record_source_name(stored, "Constitution.pdf")
+    assert source_name(stored) == "Constitution.pdf"
+
+
+def test_uploads_are_stored_under_their_content_address(tmp_path, state_dirs):
+    stored = asyncio.run(store_upload(upload("The Act.pdf", b"%PDF-1"), tmp_path))
+    assert stored["path"].name == content_addressed_name("The Act.pdf", stored["file_hash"])
+    assert stored["path"].read_bytes() == b"%PDF-1"
+    assert (stored["source_file"], stored["already_stored"]) == ("The Act.pdf", False)
+
+    again = asyncio.run(store_upload(upload("copy.pdf", b"%PDF-1"), tmp_path))
+    assert (again["path"], again["already_stored"]) == (stored["path"], True)
+
+
+def test_oversized_uploads_leave_nothing_behind(tmp_path, state_dirs):
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(store_upload(upload("big.pdf", b"x" * 100), tmp_path, max_bytes=10))
+    assert list(tmp_path.glob("*.pdf")) == []
+    assert list((tmp_path / ".partial").iterdir()) == []
+
+
+@pytest.fixture
+def limited_client():
+    inner = FastAPI()
+    bodies = []
+
+    @inner.post("/api/upload")
+    async def receive_upload(request: Request):
+        bodies.append(await request.body())
+        return {"ok": True}
+
+    client = TestClient(UploadLimitMiddleware(inner, paths={"/api/upload"}, max_bytes=100))
+    client.bodies = bodies
+    return client
+
+
+def test_declared_length_over_the_limit_is_refused_unread(limited_client):
+    response = limited_client.post("/api/upload", content=b"x" * 101)
+    assert response.status_code == 413
+    assert limited_client.bodies == []
+    assert limited_client.post("/api/upload", content=b"x" * 100).status_code == 200
+
+
+def test_chunked_body_is_cut_off_at_the_limit(limited_client):
+    def chunks():
+        for _ in range(10):
+            yield b"x" * 30
+
+    response = limited_client.post("/api/upload", content=chunks())
+    assert response.status_code == 413
+    assert limited_client.bodies == []
+
+
+def test_upload_endpoint_skips_non_pdfs():
+    import app
+
+    response = TestClient(app.app).post("/api/upload", files=[("files", ("notes.txt", b"hello", "text/plain"))])
+    assert response.status_code == 200
+    assert response.json()["results"][0]["status"] == "skipped"
+
+
+def test_upload_endpoint_is_behind_the_request_limit():
+    import app
+
+    limits = [m.kwargs for m in app.app.user_middleware if m.cls is UploadLimitMiddleware]
+    assert limits == [{"paths": {"/api/upload"}, "max_bytes": app.MAX_UPLOAD_REQUEST_BYTES}]
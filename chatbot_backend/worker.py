@@ -0,0 +1,29 @@
+# Ingestion worker: runs jobs queued by the web app. Start with `python worker.py`.
+import asyncio
+import signal
+
+from src.chroma_handler import chroma
+from src.embeddings import embedding_service
+from src.config import JOB_WORKER_CONCURRENCY
+from src.job_queue import job_queue
+from src.job_worker import JobWorker
+from src.logging_config import configure_logging
+
+
+async def main():
+    configure_logging()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await embedding_service.load()
+    await chroma.connect()
+    try:
+        await JobWorker(job_queue, JOB_WORKER_CONCURRENCY).run(stop)
+    finally:
+        await chroma.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
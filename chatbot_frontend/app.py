@@ -1,10 +1,58 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import uuid
 import os
+import json
+import time
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:8000")
 
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """One keep-alive connection pool to the backend, shared by every rerun and browser session."""
+    session = requests.Session()
+    # only idempotent requests are retried; a chat POST must never be sent twice
+    retries = Retry(total=2, backoff_factor=0.2, allowed_methods={"GET"}, status_forcelist=(502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Chat lists and histories are cached per revision: reruns reuse them, and the
+# revision is bumped after a new message or a delete so the next read refetches.
+@st.cache_data(ttl=600, max_entries=1000, show_spinner=False)
+def fetch_chats(user_id: str, revision: int) -> list:
+    response = get_session().get(f"{BACKEND_URL}/api/user/{user_id}/chats", params={"limit": 50}, timeout=10)
+    response.raise_for_status()
+    return response.json()["chats"]
+
+
+@st.cache_data(ttl=600, max_entries=1000, show_spinner=False)
+def fetch_history(user_id: str, chat_id: str, revision: int) -> list:
+    # walk the history pages; each request resumes after the previous page's last message
+    messages, cursor = [], None
+    while True:
+        params = {"limit": 200, "cursor": cursor} if cursor else {"limit": 200}
+        response = get_session().get(f"{BACKEND_URL}/api/history/{user_id}/{chat_id}", params=params, timeout=10)
+        response.raise_for_status()
+        page = response.json()
+        messages.extend(page["messages"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            return messages
+
+
+def chat_changed(chat_id: str):
+    st.session_state.chats_revision += 1
+    st.session_state.history_revisions[chat_id] = st.session_state.history_revisions.get(chat_id, 0) + 1
+
+
+session = get_session()
+
 st.set_page_config(layout="wide")
 st.title("_DMARV_ :blue[LLM Chatbot] :sunglasses:")
 
@@ -15,6 +63,10 @@ if "user_id" not in st.session_state:
 if "chat_id" not in st.session_state:
     st.session_state.chat_id = None
 
+if "chats_revision" not in st.session_state:
+    st.session_state.chats_revision = 0
+    st.session_state.history_revisions = {}
+
 # Sidebar navigation
 selected_tab = st.sidebar.radio("Navigation", ["Chat", "Upload Documents"])
 
@@ -34,15 +86,19 @@ if selected_tab == "Chat":
 
         # List chats
         try:
-            chat_ids = requests.get(f"{BACKEND_URL}/api/user/{st.session_state.user_id}/chats").json()
-            for cid in chat_ids:
+            chats = fetch_chats(st.session_state.user_id, st.session_state.chats_revision)
+            for chat in chats:
+                cid = chat["chat_id"]
                 cols = st.columns([3, 1])
                 with cols[0]:
-                    if st.button(f"Resume: {cid[:8]}"):
+                    if st.button(chat["title"][:40], key=f"resume_{cid}", help=f"{chat['message_count']} messages"):
                         st.session_state.chat_id = cid
                 with cols[1]:
                     if st.button("❌", key=f"del_{cid}"):
-                        requests.delete(f"{BACKEND_URL}/api/history/{st.session_state.user_id}/{cid}")
+                        session.delete(f"{BACKEND_URL}/api/history/{st.session_state.user_id}/{cid}", timeout=10)
+                        chat_changed(cid)
+                        if st.session_state.chat_id == cid:
+                            st.session_state.chat_id = None
                         st.rerun()
         except Exception as e:
             st.error(f"Error loading chats: {e}")
@@ -50,9 +106,11 @@ if selected_tab == "Chat":
     # Display messages if chat selected
     if st.session_state.chat_id:
         try:
-            messages = requests.get(
-                f"{BACKEND_URL}/api/history/{st.session_state.user_id}/{st.session_state.chat_id}"
-            ).json()
+            messages = fetch_history(
+                st.session_state.user_id,
+                st.session_state.chat_id,
+                st.session_state.history_revisions.get(st.session_state.chat_id, 0)
+            )
             for msg in messages:
                 if msg["role"] == "human":
                     with st.chat_message("user"):
@@ -69,28 +127,42 @@ if selected_tab == "Chat":
             st.markdown(prompt)
 
         try:
-            response = requests.post(
+            # the with block hands the connection back to the pool even if the stream breaks off
+            with session.post(
                 f"{BACKEND_URL}/api/chat/stream",
+                params={"format": "ndjson"},
                 json={
                     "user_id": st.session_state.user_id,
                     "chat_id": st.session_state.chat_id,
                     "question": prompt
                 },
                 stream=True
-            )
-
-            # Streaming response
-            answer = ""
-            with st.chat_message("assistant"):
-                message_box = st.empty()
-                for chunk in response.iter_lines():
-                    if chunk:
-                        decoded = chunk.decode("utf-8")
-                        answer += decoded
-                        message_box.markdown(answer)
+            ) as response:
+                response.raise_for_status()
+
+                # Streaming response: one JSON event per line, tokens keep their own newlines escaped
+                answer = ""
+                with st.chat_message("assistant"):
+                    message_box = st.empty()
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        if event["type"] == "start":
+                            st.session_state.chat_id = event["chat_id"]
+                        elif event["type"] == "token":
+                            answer += event["content"]
+                            message_box.markdown(answer + "▌")
+                        elif event["type"] == "error":
+                            st.error(f"Error: {event['message']}")
+                    message_box.markdown(answer)
 
         except Exception as e:
             st.error(f"Error: {e}")
+        finally:
+            # the turn (or whatever part of it was generated) is now in the backend's history
+            if st.session_state.chat_id:
+                chat_changed(st.session_state.chat_id)
 
 # ==============================
 # ------- Upload Tab -----------
@@ -103,13 +175,40 @@ elif selected_tab == "Upload Documents":
         with st.spinner("Uploading files to backend..."):
             files = [("files", (f.name, f, "application/pdf")) for f in uploaded_files]
             try:
-                res = requests.post(f"{BACKEND_URL}/api/upload", files=files)
+                res = session.post(f"{BACKEND_URL}/api/upload", files=files)
                 if res.status_code == 200:
                     result = res.json()
                     st.success("Upload complete!")
                     for status in result["results"]:
                         st.write(f"{status['filename']}: {status['message']}")
+                    st.session_state.upload_jobs = {
+                        status["job_id"]: status["filename"] for status in result["results"] if status.get("job_id")
+                    }
                 else:
                     st.error(f"Failed: {res.text}")
             except Exception as e:
                 st.error(f"Error: {e}")
+
+    # Poll the ingestion jobs started by the last upload until they finish
+    jobs = st.session_state.get("upload_jobs", {})
+    if jobs:
+        st.markdown("### ⏳ Processing")
+        pending = False
+        for job_id, filename in jobs.items():
+            try:
+                job = session.get(f"{BACKEND_URL}/api/jobs/{job_id}", timeout=10).json()
+            except Exception as e:
+                st.error(f"{filename}: {e}")
+                continue
+            stage = (job.get("progress") or {}).get("status", job["status"])
+            if job["status"] == "succeeded":
+                st.success(f"{filename}: embedded")
+            elif job["status"] == "failed":
+                st.error(f"{filename}: failed after {job['attempts']} attempts ({job['error']})")
+            else:
+                pending = True
+                retry = f", retrying after: {job['error']}" if job["error"] else ""
+                st.info(f"{filename}: {stage}{retry}")
+        if pending:
+            time.sleep(2)
+            st.rerun()